@@ -0,0 +1,165 @@
+"""
+Process-wide in-memory cache for upstream API responses.
+
+Streamlit re-executes app.py for every session and every rerun, but imported
+modules live for the whole process, so one ApiCache here is shared by all
+sessions. Entries are kept in LRU order under a byte budget, each entry can
+carry its own expiry, and concurrent misses on the same key are collapsed
+into a single upstream call.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = int(os.environ.get("JANNAHWAY_CACHE_MB", "64")) * 1024 * 1024
+
+
+def estimate_size(value):
+    """ Rough in-memory footprint, based on the JSON encoding of the value """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value).encode("utf-8"))
+
+
+def never_expires(value):
+    return None
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ApiCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def get(self, key):
+        """ Returns (found, value) without loading """
+        with self._lock:
+            return self._lookup(key)[:2]
+
+    def _lookup(self, key):
+        """
+        Returns (found, value, stale). Expired entries stay in place (still
+        subject to LRU eviction) so they can be served if the reload fails.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None, None
+        value, size, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            self.expirations += 1
+            return False, None, value
+        self._entries.move_to_end(key)
+        return True, value, None
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def put(self, key, value, expires_at=None):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, expiry=never_expires):
+        """
+        Returns the cached value for key, calling loader() on a miss. Only one
+        caller per key runs the loader; others wait for its result. None results
+        are not cached so failures are retried next time. If the loader fails
+        and an expired copy is still around, the expired copy is returned.
+        """
+        with self._lock:
+            found, value, stale = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            try:
+                flight.value = loader()
+            except Exception:
+                if stale is None:
+                    raise
+                flight.value = None
+            if flight.value is not None:
+                self.put(key, flight.value, expiry(flight.value))
+            elif stale is not None:
+                flight.value = stale
+                with self._lock:
+                    self.stale_served += 1
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+                "stale_served": self.stale_served,
+            }
+
+
+shared_cache = ApiCache()
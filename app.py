@@ -1,33 +1,149 @@
 import streamlit as st
 import requests
-import io
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from datetime import datetime
-
-BASE_URL = "https://api.alquran.cloud/v1"
-
-# Bookmark Storage
-if "bookmarks" not in st.session_state:
-    st.session_state.bookmarks = []
-
-# Fetch Surah List
+from datetime import datetime, timedelta
+
+import functools
+import os
+import time
+import uuid
+import bookmarks
+import content_registry
+import content_search
+import counter_store
+import dhikr_import
+import dhikr_log
+import dhikr_ranking
+import editions
+import gazetteer
+import http_client
+import jobs
+import pdf_report
+import prayer_times
+import quran_export
+import quran_nav
+import recitation
+import tasbeeh_component
+import timetable
+import quran_search
+import quran_store
+import verse_view
+from api_cache import shared_cache
+
+BASE_URL = quran_store.BASE_URL
+
+_run_started = time.perf_counter()
+
+# Fragments rerun on their own when their widgets change; the wrapper records
+# each run's server time next to the full-run time so the two can be compared
+def timed_fragment(func=None, *, run_every=None):
+    if func is None:
+        return functools.partial(timed_fragment, run_every=run_every)
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings = st.session_state.setdefault("run_timings", {})
+            timings[func.__name__] = round((time.perf_counter() - started) * 1000, 2)
+    return st.fragment(timed, run_every=run_every)
+
+# Per-user id, kept in the URL so a reload (or the same link on another device) finds the same data
+def get_user_id():
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = st.query_params.get("uid") or uuid.uuid4().hex
+    if st.query_params.get("uid") != st.session_state.user_id:
+        st.query_params["uid"] = st.session_state.user_id
+    return st.session_state.user_id
+
+# Fetch Surah List (shared cache -> local corpus store -> API)
 def fetch_surahs():
-    response = requests.get(f"{BASE_URL}/surah")
-    if response.status_code == 200:
-        return response.json()["data"]
-    return []
+    return shared_cache.get_or_load(("surahs",), lambda: quran_store.get_surahs() or None) or []
 
-# Fetch Surah Verses
-def fetch_surah_verses(surah_number):
-    response = requests.get(f"{BASE_URL}/surah/{surah_number}/editions/quran-uthmani,en.asad")
-    if response.status_code == 200:
-        return response.json()["data"]
-    return None
+# Fetch one edition of a surah as ayah texts (shared cache -> local corpus store -> API).
+# Each edition is cached on its own, so the Arabic base is shared by every choice of translations
+def fetch_edition(surah_number, edition_id):
+    return shared_cache.get_or_load(("edition", surah_number, edition_id),
+                                    lambda: editions.load_edition(surah_number, edition_id))
+
+# [(name, texts, rtl)] of the chosen editions that could be loaded
+def fetch_translations(surah_number, edition_ids):
+    loaded = []
+    for edition_id in edition_ids:
+        texts = fetch_edition(surah_number, edition_id)
+        if texts:
+            loaded.append((editions.label(edition_id), texts, editions.EDITIONS[edition_id].rtl))
+    return loaded
+
+# Translations, transliteration and tafsir shown under the Arabic; only the chosen ones are ever fetched
+def chosen_editions():
+    # Kept outside the widget key too, which Streamlit drops while another view is shown
+    if "editions" not in st.session_state:
+        st.session_state.editions = st.session_state.get("edition_choice", list(editions.DEFAULT_SELECTION))
+
+    def keep():
+        st.session_state.edition_choice = st.session_state.editions
+
+    return tuple(st.multiselect("Translations & tafsir:", editions.EXTRAS, key="editions",
+                                format_func=editions.label, on_change=keep))
+
+# Switches to the reader at the page holding an ayah; for resume reading and the bookmark list
+def open_ayah(surah_number, ayah):
+    page_size = st.session_state.get("verse_page_size", verse_view.DEFAULT_PAGE_SIZE)
+    st.session_state.current_view = "surah"
+    st.session_state.reader_mode = st.session_state.reader_mode_choice = "surah"
+    st.session_state.reader_surah = surah_number
+    st.session_state.verse_page_surah = surah_number
+    st.session_state.verse_page = (ayah - 1) // page_size + 1
+
+# Rendered verse pages, shared across sessions and reruns. Keyed on the editions that actually
+# loaded, so a page rendered while a translation was unreachable isn't served once it is back
+def render_verse_page(surah_number, page, page_size, dark_mode, edition_ids):
+    loaded = tuple(e for e in edition_ids if fetch_edition(surah_number, e))
+    return cached_verse_page(surah_number, page, page_size, dark_mode, loaded)
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def cached_verse_page(surah_number, page, page_size, dark_mode, edition_ids):
+    arabic = fetch_edition(surah_number, editions.BASE)
+    _, start, end = verse_view.page_bounds(len(arabic), page, page_size)
+    return verse_view.render_verses(arabic, fetch_translations(surah_number, edition_ids), start, end, dark_mode)
+
+# (surah, first ayah, last ayah) runs on one page of a juz, hizb, Madani page or ruku
+def unit_page_spans(division, number, page, page_size):
+    index = quran_nav.get_index()
+    positions = index.positions(division, number)
+    _, start, end = verse_view.page_bounds(len(positions), page, page_size)
+    return index.spans(division, number, positions[start:end])
+
+# Rendered page of a unit; only the surahs it spans are fetched. None, which isn't cached so the
+# next run retries, when one of them can't be loaded; cached under the editions that did load
+def render_unit_page(division, number, page, page_size, dark_mode, edition_ids):
+    surah_numbers = [surah_number for surah_number, _, _ in unit_page_spans(division, number, page, page_size)]
+    if not all(fetch_edition(surah_number, editions.BASE) for surah_number in surah_numbers):
+        return None
+    loaded = tuple(e for e in edition_ids if all(fetch_edition(surah_number, e) for surah_number in surah_numbers))
+    return cached_unit_page(division, number, page, page_size, dark_mode, loaded)
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def cached_unit_page(division, number, page, page_size, dark_mode, edition_ids):
+    surahs = fetch_surahs()
+    blocks = []
+    for surah_number, first, last in unit_page_spans(division, number, page, page_size):
+        arabic = fetch_edition(surah_number, editions.BASE)
+        name = surahs[surah_number - 1]["englishName"] if len(surahs) >= surah_number else f"Surah {surah_number}"
+        translations = fetch_translations(surah_number, edition_ids)
+        blocks.extend(verse_view.render_verse(f"{name} {surah_number}:{a}", arabic[a - 1],
+                                              [(n, texts[a - 1], rtl) for n, texts, rtl in translations], dark_mode)
+                      for a in range(first, last + 1))
+    return "".join(blocks)
+
+# Quran search index, mapped once per process
+@st.cache_resource(show_spinner=False)
+def load_search_index():
+    if not os.path.exists(quran_search.INDEX_PATH):
+        return None
+    return quran_search.QuranSearchIndex()
 
 # --------------- Config & Assets ---------------
 st.set_page_config(
@@ -43,6 +159,14 @@ menu = st.sidebar.radio(
     "📜 Select a Section",
     ["🏠 Home", "📖 Quran", "📿 Tasbeeh", "🤲 Duas & Wazaif", "🕌 Ramadan"]
 )
+# Cache counters for sizing the shared cache in production
+if os.environ.get("JANNAHWAY_SHOW_STATS"):
+    with st.sidebar.expander("⚙️ Cache stats"):
+        st.json(shared_cache.stats())
+        st.json(http_client.client.circuit_states())
+        st.caption("Server time of the last run, ms")
+        st.json(st.session_state.get("run_timings", {}))
+
 # --------------- Dark Mode Styling ---------------
 if dark_mode:
     st.markdown("""
@@ -158,268 +282,94 @@ def home_section():
     if 'asma_index' not in st.session_state:
         st.session_state.asma_index = 0
 
-    prophet_names_list = [
-    ("مُحَمَّدٌ", "The Praised One"),
-    ("أَحْمَدُ", "The Most Praiseworthy"),
-    ("طَهَ", "Pure, Clean"),
-    ("يٰسٓ", "O Human Being"),
-    ("الْمُصْطَفَى", "The Chosen One"),
-    ("الْمُرْتَضَى", "The One Pleasing to Allah"),
-    ("الْحَبِيبُ", "The Beloved"),
-    ("السَّاجِدُ", "The One Who Prostrates"),
-    ("الرَّاكِعُ", "The One Who Bows"),
-    ("النَّبِيُّ", "The Prophet"),
-    ("الرَّسُولُ", "The Messenger"),
-    ("الصِّدِّيقُ", "The Truthful"),
-    ("الأَمِينُ", "The Trustworthy"),
-    ("الشَّافِعُ", "The Intercessor"),
-    ("المُبَشِّرُ", "The Bringer of Good News"),
-    ("النَّذِيرُ", "The Warner"),
-    ("السِّرَاجُ الْمُنِيرُ", "The Illuminating Lamp"),
-    ("الرَّحْمَةُ", "The Mercy"),
-    ("الخَاتَمُ", "The Seal (of Prophets)"),
-    ("المُزَمِّلُ", "The Enshrouded One"),
-    ("المُدَّثِّرُ", "The Cloaked One"),
-    ("الْمُؤَيَّدُ", "The Supported One"),
-    ("الْمَاحِي", "The Eraser (of disbelief)"),
-    ("الْحَاشِرُ", "The Gatherer"),
-    ("الْعَاقِبُ", "The Successor"),
-    ("الفَاتِحُ", "The Conqueror"),
-    ("النَّاصِرُ", "The Helper"),
-    ("الرَّحِيمُ", "The Compassionate"),
-    ("التَّوَّابُ", "The Most Repentant"),
-    ("الشَّهِيدُ", "The Witness"),
-    ("الصَّادِقُ", "The Honest"),
-    ("المَشْفُوعُ", "The One with Intercession"),
-    ("الْمُقْتَدِي", "The Role Model"),
-    ("الْمُجْتَبَى", "The Selected One"),
-    ("الْمُحْسِنُ", "The Benevolent"),
-    ("الْمُعَلِّمُ", "The Teacher"),
-    ("السَّيِّدُ", "The Master"),
-    ("الْمُبَارَكُ", "The Blessed One"),
-    ("الْأُمِّيُّ", "The Unlettered Prophet"),
-    ("الْمُنْجِي", "The Rescuer"),
-    ("الرَّئُوفُ", "The Kind"),
-    ("الْمُجَاهِدُ", "The Struggler (in Allah’s cause)"),
-    ("الْمُتَوَاضِعُ", "The Humble One"),
-    ("الْمُتَوَكِّلُ", "The One Who Relies on Allah"),
-    ("الْكَافِي", "The Sufficient One"),
-    ("النَّبِيُّ الأَكْرَمُ", "The Most Honored Prophet"),
-    ("الصَّفِيُّ", "The Pure One"),
-    ("الشَّاكِرُ", "The Grateful One"),
-    ("الْحَلِيمُ", "The Forbearing One"),
-    ("الْمُحْتَسِبُ", "The One Who Seeks Reward from Allah"),
-    ("الْمُطْمَئِنُّ", "The Tranquil One"),
-    ("الْمُنِيرُ", "The Radiant One"),
-    ("الْمُبِينُ", "The Clear Expositor"),
-    ("الْمُعْجِزُ", "The Miraculous"),
-    ("الْمَأْمُونُ", "The Secured One"),
-    ("الْمُجْزِي", "The One Who Recompenses"),
-    ("الْمُتَضَرِّعُ", "The Supplicating One"),
-    ("الْمُحْتَرَمُ", "The Honored One"),
-    ("الْمَكْرُمُ", "The Noble One"),
-    ("الصَّبُورُ", "The Patient One"),
-    ("الْوَفِيُّ", "The Faithful One"),
-    ("الْمُوَقَّرُ", "The Revered One"),
-    ("المُحِبُّ", "The Loving One"),
-    ("الْمُبَارَكُ", "The Blessed One"),
-    ("السَّابِقُ", "The Forerunner"),
-    ("الْخَيِّرُ", "The Good One"),
-    ("الْهَادِي", "The Guide"),
-    ("الْمُبِينُ", "The Manifest One"),
-    ("الْمُخْتَارُ", "The Chosen One"),
-    ("الْمُتَفَكِّرُ", "The Thoughtful One"),
-    ("الْمُقَدَّمُ", "The One Who is Given Precedence"),
-    ("الْمُؤْمِنُ", "The Faithful One"),
-    ("الْمُعَظَّمُ", "The Highly Honored One"),
-    ("الْمُهْتَدِي", "The Rightly Guided One"),
-    ("السَّامِعُ", "The Listener"),
-    ("الْمُرَبِّي", "The One Who Nurtures"),
-    ("الْمُنِيبُ", "The One Who Turns to Allah"),
-    ("الْمُشَفَّعُ", "The One Whose Intercession is Accepted"),
-    ("المُجْتَهِدُ", "The Hardworking One"),
-    ("الْمُحِبُّ", "The Loving One"),
-    ("السَّالِمُ", "The Peaceful One"),
-    ("النُّورُ", "The Light"),
-    ("الْمُؤَيَّدُ", "The Supported One"),
-    ("الْمُسَدَّدُ", "The One Guided to Success"),
-    ("الْمُسْتَقِيمُ", "The Upright One")
-]
-
-    # Complete list of Asma ul Husna (first 5 for demo)
-    asma_list = [
-    ("ٱلْرَّحْمَـٰنُ", "The Most Merciful"),
-    ("ٱلْرَّحِيمُ", "The Especially Merciful"),
-    ("ٱلْمَلِكُ", "The King and Owner of Dominion"),
-    ("ٱلْقُدُّوسُ", "The Absolutely Pure"),
-    ("ٱلْسَّلَامُ", "The Source of Peace and Safety"),
-    ("ٱلْمُؤْمِنُ", "The Giver of Faith and Security"),
-    ("ٱلْمُهَيْمِنُ", "The Guardian"),
-    ("ٱلْعَزِيزُ", "The Almighty"),
-    ("ٱلْجَبَّارُ", "The Compeller"),
-    ("ٱلْمُتَكَبِّر", "The Supreme"),
-    ("ٱلْخَالِقُ", "The Creator"),
-    ("ٱلْبَارِئُ", "The Evolver"),
-    ("ٱلْمُصَوِّرُ", "The Fashioner"),
-    ("ٱلْغَفَّارُ", "The Constant Forgiver"),
-    ("ٱلْقَهَّارُ", "The All-Prevailing One"),
-    ("ٱلْوَهَّابُ", "The Supreme Bestower"),
-    ("ٱلْرَّزَّاقُ", "The Provider"),
-    ("ٱلْفَتَّاحُ", "The Supreme Solver"),
-    ("ٱلْعَلِيمُ", "The All-Knowing"),
-    ("ٱلْقَابِضُ", "The Withholder"),
-    ("ٱلْبَاسِطُ", "The Extender"),
-    ("ٱلْخَافِضُ", "The Reducer"),
-    ("ٱلْرَّافِعُ", "The Exalter"),
-    ("ٱلْمُعِزُّ", "The Honourer-Bestower"),
-    ("ٱلْمُذِلُّ", "The Dishonourer"),
-    ("ٱلْسَّمِيعُ", "The All-Hearing"),
-    ("ٱلْبَصِيرُ", "The All-Seeing"),
-    ("ٱلْحَكَمُ", "The Impartial Judge"),
-    ("ٱلْعَدْلُ", "The Just One"),
-    ("ٱلْلَّطِيفُ", "The Subtle One"),
-    ("ٱلْخَبِيرُ", "The All-Aware"),
-    ("ٱلْحَلِيمُ", "The Most Forbearing"),
-    ("ٱلْعَظِيمُ", "The Magnificent One"),
-    ("ٱلْغَفُورُ", "The Great Forgiver"),
-    ("ٱلْشَّكُورُ", "The Most Appreciative"),
-    ("ٱلْعَلِيُّ", "The Most High, The Exalted"),
-    ("ٱلْكَبِيرُ", "The Most Great"),
-    ("ٱلْحَفِيظُ", "The Preserver"),
-    ("ٱلْمُقِيتُ", "The Sustainer"),
-    ("ٱلْحسِيبُ", "The Reckoner"),
-    ("ٱلْجَلِيلُ", "The Majestic"),
-    ("ٱلْكَرِيمُ", "The Most Generous, the Most Esteemed"),
-    ("ٱلْرَّقِيبُ", "The Watchful"),
-    ("ٱلْمُجِيبُ", "The Responsive One"),
-    ("ٱلْوَاسِعُ", "The All-Encompassing, the Boundless"),
-    ("ٱلْحَكِيمُ", "The All-Wise"),
-    ("ٱلْوَدُودُ", "The Most Loving"),
-    ("ٱلْمَجِيدُ", "The Glorious, Most Honorable"),
-    ("ٱلْبَاعِثُ", "The Infuser of New Life"),
-    ("ٱلْشَّهِيدُ", "The All-and-Ever Witnessing"),
-    ("ٱلْحَقُ", "The Absolute Truth"),
-    ("ٱلْوَكِيلُ", "The Trustee"),
-    ("ٱلْقَوِيُ", "The All-Strong"),
-    ("ٱلْمَتِينُ", "The Firm One"),
-    ("ٱلْوَلِيُ", "The Solely Loyal"),
-    ("ٱلْحَمِيدُ", "The Most Praiseworthy"),
-    ("ٱلْمُحْصِيُ", "The All-Enumerating, the Counter"),
-    ("ٱلْمُبْدِئُ", "The Originator, the Initiator"),
-    ("ٱلْمُعِيدُ", "The Restorer, the Reinstater"),
-    ("ٱلْمُحْيِى", "The Giver of Life"),
-    ("ٱلْمُمِيتُ", "The Creator of Death"),
-    ("ٱلْحَيُ", "The Ever-Living"),
-    ("ٱلْقَيُّومُ", "The Sustainer, The Self-Subsisting"),
-    ("ٱلْوَاجِدُ", "The Perceiver"),
-    ("ٱلْمَاجِدُ", "The Glorious, Most Honorable"),
-    ("ٱلْوَاحِدُ", "The Only One"),
-    ("ٱلْأَحَدُ", "The Indivisible, The One"),
-    ("ٱلْصَّمَدُ", "The Self-Sufficient, The Impregnable"),
-    ("ٱلْقَادِرُ", "The Omnipotent"),
-    ("ٱلْمُقْتَدِرُ", "The Creator of All Power"),
-    ("ٱلْمُقَدِّمُ", "The Expediter"),
-    ("ٱلْمُؤَخِّرُ", "The Delayer"),
-    ("ٱلأوَّلُ", "The First"),
-    ("ٱلْآخِرُ", "The Last"),
-    ("ٱلْظَّاهِرُ", "The Manifest"),
-    ("ٱلْبَاطِنُ", "The Hidden One, Knower of the Hidden"),
-    ("ٱلْوَالِي", "The Sole Governor"),
-    ("ٱلْمُتَعَالِي", "The Self Exalted"),
-    ("ٱلْبَرُ", "The Source of All Goodness"),
-    ("ٱلْتَّوَابُ", "The Ever-Pardoning"),
-    ("ٱلْمُنْتَقِمُ", "The Just Requitor"),
-    ("ٱلْعَفُوُ", "The Supreme Pardoner"),
-    ("ٱلْرَّؤُفُ", "The Most Kind"),
-    ("مَالِكُ ٱلْمُلْكِ", "Master of the Kingdom, Owner of the Dominion"),
-    ("ذُوالْجَلَالِ وَالإكْرَامِ", "Possessor of Glory and Honor"),
-    ("ٱلْمُقْسِطُ", "The Just One"),
-    ("ٱلْجَامِعُ", "The Gatherer, the Uniter"),
-    ("ٱلْغَنيُ", "The Self-Sufficient, the Wealthy"),
-    ("ٱلْمُغْنِيُ", "The Enricher"),
-    ("ٱلْمَانِعُ", "The Withholder"),
-    ("ٱلْضَّارَ", "The Distresser"),
-    ("ٱلْنَّافِعُ", "The Propitious, the Benefactor"),
-    ("ٱلْنُّورُ", "The Light"),
-    ("ٱلْهَادِي", "The Guide"),
-    ("ٱلْبَدِيعُ", "Incomparable Originator"),
-    ("ٱلْبَاقِي", "The Ever-Surviving"),
-    ("ٱلْوَارِثُ", "The Inheritor"),
-    ("ٱلْرَّشِيدُ", "The Guide, Infallible Teacher, and Knower"),
-    ("ٱلْصَّبُورُ", "The Forbearing")
-]
-
-    # Navigation functions
-    def next_asma():
-        st.session_state.asma_index = (st.session_state.asma_index + 1) % len(asma_list)
-    
-    def prev_asma():
-        st.session_state.asma_index = (st.session_state.asma_index - 1) % len(asma_list)
-
-    def next_asma_nabi():
-        st.session_state.next_asma_nabi_index = (st.session_state.next_asma_nabi_index + 1) % len(prophet_names_list)
-    
-    def prev_asma_nabi():
-        st.session_state.next_asma_nabi_index = (st.session_state.next_asma_nabi_index - 1) % len(prophet_names_list)
+    registry = content_registry.get_registry()
+    prophet_names_list = registry.prophet_names
+    asma_list = registry.asma
 
-    # Main columns layout
+    # Main columns layout; each card is a fragment, so Previous/Next reruns only that card
     col1, col2 = st.columns([1, 1], gap="medium")
 
- 
     with col1:
-        # Asma ul Husna Card
-        st.markdown(f"""
-        <div class="asma-card">
-            <h3 style="color: #E5E5E5;">🕋 Asma ul Husna جَلَّ جَلَالُهُ</h3>
-            <div style="margin:20px 0">
-                <div class="arabic-text" style="font-size:32px; min-height: 60px; text-align: center;">
-                    <p>
-                    {asma_list[st.session_state.asma_index][0]}
-                    </p>
-                </div>
-                <p class="english-text" style="margin:15px 0; font-size:18px">
-                    {asma_list[st.session_state.asma_index][1]}
-                </p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-
-        # Button controls
-        btn_col1, btn_col2 = st.columns(2)
-        with btn_col1:
-            if st.button("← Previous", key="prev_btn"):
-                prev_asma()
-        with btn_col2:
-            if st.button("Next →", key="next_btn"):
-                next_asma()
- 
+        name_card("🕋 Asma ul Husna جَلَّ جَلَالُهُ", asma_list, "asma_index", "prev_btn", "next_btn")
+
     with col2:
-        # Asma ul Husna Card
-        st.markdown(f"""
-        <div class="asma-card">
-            <h3 style="color: #E5E5E5;">🕌 Asma un Nabi ﷺ</h3>
-            <div style="margin:20px 0">
-                <div class="arabic-text" style="font-size:32px; min-height: 60px; text-align: center;">
-                    <p>
-                    {prophet_names_list[st.session_state.next_asma_nabi_index][0]}
-                    </p>
-                </div>
-                <p class="english-text" style="margin:15px 0; font-size:18px">
-                    {prophet_names_list[st.session_state.next_asma_nabi_index][1]}
+        name_card("🕌 Asma un Nabi ﷺ", prophet_names_list, "next_asma_nabi_index", "prev_button", "next_button")
+
+    # Search across both lists of names
+    name_query = st.text_input("🔍 Search the names (Arabic or English):", key="name_search")
+    if name_query:
+        asma_hits = content_search.search(name_query, content_search.ASMA, limit=10)
+        nabi_hits = content_search.search(name_query, content_search.PROPHET_NAMES, limit=10)
+        if not asma_hits and not nabi_hits:
+            st.write("No matching names found.")
+        for hit in asma_hits:
+            arabic, english = asma_list[hit]
+            st.button(f"🕋 {arabic} — {english}", key=f"asma_hit_{hit}",
+                      on_click=lambda i=hit: st.session_state.update(asma_index=i))
+        for hit in nabi_hits:
+            arabic, english = prophet_names_list[hit]
+            st.button(f"🕌 {arabic} — {english}", key=f"nabi_hit_{hit}",
+                      on_click=lambda i=hit: st.session_state.update(next_asma_nabi_index=i))
+# Asma ul Husna / Asma un Nabi card with its own Previous/Next controls
+@timed_fragment
+def name_card(title, names, index_key, prev_key, next_key):
+    def step(delta):
+        st.session_state[index_key] = (st.session_state[index_key] + delta) % len(names)
+
+    arabic, english = names[st.session_state[index_key]]
+    st.markdown(f"""
+    <div class="asma-card">
+        <h3 style="color: #E5E5E5;">{title}</h3>
+        <div style="margin:20px 0">
+            <div class="arabic-text" style="font-size:32px; min-height: 60px; text-align: center;">
+                <p>
+                {arabic}
                 </p>
             </div>
+            <p class="english-text" style="margin:15px 0; font-size:18px">
+                {english}
+            </p>
         </div>
-        """, unsafe_allow_html=True)
-
-        # Button controls
-        btn_col1, btn_col2 = st.columns(2)
- 
-        with btn_col1:
-            if st.button("← Previous", key="prev_button"):
-                prev_asma_nabi()
-        with btn_col2:
-            if st.button("Next →", key="next_button"):
-                next_asma_nabi()            
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Button controls
+    btn_col1, btn_col2 = st.columns(2)
+    with btn_col1:
+        st.button("← Previous", key=prev_key, on_click=step, args=(-1,))
+    with btn_col2:
+        st.button("Next →", key=next_key, on_click=step, args=(1,))
+
+# Background jobs: the job id lives in session state, everything else in the jobs table
+def job_outcome(state_key, label, unit="items"):
+    """ Progress while the job in session_state[state_key] runs; the job once it has succeeded """
+    job_id = st.session_state.get(state_key)
+    job = jobs.get_queue().get(job_id) if job_id else None
+    if job is None:
+        return None
+    if not job.finished:
+        job_progress(job.id, label, unit)
+        return None
+    if job.status == jobs.FAILED:
+        st.error(f"⚠️ {label} failed: {job.message}")
+        return None
+    return job
+
+# Polls a running job; once it's done, one full rerun swaps the progress bar for the result
+@timed_fragment(run_every=1)
+def job_progress(job_id, label, unit):
+    job = jobs.get_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.fraction, text=f"{label}: {job.done} of {job.total} {unit}" if job.total else f"{label}...")
+
+def job_download(job, label):
+    data = jobs.get_queue().artifact(job)
+    if data is None:
+        st.info("This file has expired. Create it again to download it.")
+    else:
+        st.download_button(label, data, file_name=job.file_name, mime=job.mime, key=f"download_{job.id}")
+
 # --------------- Quran Section 📖 ---------------
 def quran_section():
 
@@ -442,113 +392,308 @@ def quran_section():
         st.session_state.current_view = "surah"
 
     # Navigation Buttons
-    col1, col2 = st.columns(2)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         if st.button("📜 Surah"):
             st.session_state.current_view = "surah"
     with col2:
         if st.button("📑 Bookmark"):
             st.session_state.current_view = "bookmark"
+    with col3:
+        if st.button("🔍 Search"):
+            st.session_state.current_view = "search"
+    with col4:
+        if st.button("🖨️ Export"):
+            st.session_state.current_view = "export"
 
-    # Handle Surah View
+    # Each view is a fragment: paging, searching or removing a bookmark reruns only that view
     if st.session_state.current_view == "surah":
-        surahs = fetch_surahs()
-        if surahs:
-            surah_names = [f"{s['number']}. {s['englishName']} ({s['name']})" for s in surahs]
-            selected_surah = st.selectbox("Choose Surah:", surah_names)
-            surah_number = int(selected_surah.split(".")[0])
-            
-            with st.spinner("Loading surah..."):
-                surah_data = fetch_surah_verses(surah_number)
-            
-            if surah_data:
-                st.markdown(f"### 📖 {surah_data[0]['englishName']} ({surah_data[0]['name']})")
-                st.markdown(f"**Number of Verses:** {len(surah_data[0]['ayahs'])}")
-                st.markdown(f"**Revelation Type:** {surah_data[0]['revelationType'].capitalize()}")
-                
-                if surah_number != 9 and surah_number != 1:
-                    st.markdown("<div dir='rtl' style='font-size:28px; text-align:center; margin:20px 0;'>بِسْمِ اللَّهِ الرَّحْمَٰنِ الرَّحِيمِ</div>", unsafe_allow_html=True)
-                for i, verse in enumerate(surah_data[0]["ayahs"]):
-                    eng_verse = surah_data[1]["ayahs"][i]  # انگریزی ترجمہ
-                    
-                    st.markdown(f"""
-                <div style='background-color: {"#333" if dark_mode else "#f8f9fa"}; 
-                           padding: 15px; 
-                           border-radius: 10px; 
-                           margin-bottom: 15px;'>
-                    <p style='font-weight: bold; margin-bottom: 5px; color: {"#FFD700" if dark_mode else "#0066cc"};'>
-                        Verse {verse['numberInSurah']}
-                    </p>
-                    <div dir='rtl' style='font-size: 24px; margin-bottom: 10px; color: {"white" if dark_mode else "black"};'>
-                        {verse['text']}  <!-- عربی متن -->
-                    </div>
-                    <div style='font-size: 16px; margin-top: 10px; color: {"#E5E5E5" if dark_mode else "#333"};'>
-                        {eng_verse['text']}  <!-- انگریزی ترجمہ -->
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-
-                # for i, verse in enumerate(surah_data[0]["ayahs"]):
-                #     eng_verse = surah_data[1]["ayahs"][i]
-                    
-                #     st.markdown(f"""
-                #     <div style='background-color: {"#333" if dark_mode else "#f8f9fa"}; 
-                #                padding: 15px; 
-                #                border-radius: 10px; 
-                #                margin-bottom: 15px;'>
-                #         <p style='font-weight: bold; margin-bottom: 5px; color: {"#FFD700" if dark_mode else "#0066cc"};'>
-                #             Verse {verse['numberInSurah']}
-                #         </p>
-                #         <div dir='rtl' style='font-size: 24px; margin-bottom: 10px; color:black;'>
-                #             {verse['text']}
-                #         </div>
-                #         <div style='font-size: 16px; margin-top: 10px; color: {"#E5E5E5" if dark_mode else "#333"};'>
-                #             {eng_verse['text']}
-                #         </div>
-                #     </div>
-                #     """, unsafe_allow_html=True)
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button(f"🔊 Listen to {surah_data[0]['englishName']}"):
-                        audio_url = f"https://server8.mp3quran.net/afs/{str(surah_number).zfill(3)}.mp3"
-                        st.audio(audio_url)
-                with col2:
-                    bookmark_name = f"Surah {surah_data[0]['englishName']}"
-                    if st.button(f"📑 Bookmark {bookmark_name}"):
-                        if bookmark_name not in st.session_state.bookmarks:
-                            st.session_state.bookmarks.append(bookmark_name)
-                            st.success("Bookmarked!")
-                        else:
-                            st.warning("Already bookmarked!")
-
-    # Handle Bookmarks View
+        surah_reader(dark_mode)
+    elif st.session_state.current_view == "search":
+        quran_search_panel(dark_mode)
     elif st.session_state.current_view == "bookmark":
-        st.markdown("### 📑 Your Bookmarks")
-        if st.session_state.bookmarks:
-            for bm in st.session_state.bookmarks:
-                col1, col2 = st.columns([4, 1])
-                with col1:
-                    st.write(f"✅ {bm}")
-                with col2:
-                    # if st.button("🗑️ Remove", key=f"remove_{bm}"):
-                    #     st.session_state.bookmarks.remove(bm)
-                    #     st.experimental_rerun()
-                    if st.button("🗑️ Remove", key=f"remove_{bm}"):
-                        st.session_state.bookmarks.remove(bm)
-                        st.rerun()
+        bookmarks_panel()
+    elif st.session_state.current_view == "export":
+        export_panel()
 
-            
-            # if st.button("Clear All Bookmarks"):
-            #     st.session_state.bookmarks = []
-            #     st.success("Bookmarks cleared!")
-            if st.button("Clear All Bookmarks"):
-                st.session_state.bookmarks = []
-                st.success("Bookmarks cleared!")
-                st.rerun()
+# Surah reader: surah choice, verse pages, listen and bookmark
+@timed_fragment
+def surah_reader(dark_mode):
+    surahs = fetch_surahs()
+    if surahs:
+        surah_label = lambda n: f"{n}. {surahs[n - 1]['englishName']} ({surahs[n - 1]['name']})"
+        marks = bookmarks.get_bookmarks()
+        user_id = get_user_id()
+        resume = marks.position(user_id)
+        if resume and (resume.surah, resume.ayah) != st.session_state.get("reader_shown"):
+            st.button(f"▶️ Resume reading at {surahs[resume.surah - 1]['englishName']} {resume.surah}:{resume.ayah}",
+                      key="resume_reading", on_click=open_ayah, args=(resume.surah, resume.ayah))
+        # Juz, hizb, page and ruku come from the navigation index; kept outside the widget key
+        # like the editions, so the choice survives a visit to another view
+        index = quran_nav.get_index()
+        if "reader_mode" not in st.session_state:
+            st.session_state.reader_mode = st.session_state.get("reader_mode_choice", "surah")
+
+        def keep_mode():
+            st.session_state.reader_mode_choice = st.session_state.reader_mode
+
+        mode = st.radio("Navigate by:", ["surah", *index.divisions], key="reader_mode", horizontal=True,
+                        format_func=lambda d: quran_nav.LABELS.get(d, "Surah"), on_change=keep_mode)
+        if mode != "surah":
+            unit_reader(index, mode, dark_mode)
+            return
 
+        surah_number = st.selectbox("Choose Surah:", range(1, len(surahs) + 1), format_func=surah_label,
+                                    key="reader_surah")
+        surah = surahs[surah_number - 1]
+        edition_ids = chosen_editions()
+
+        with st.spinner("Loading surah..."):
+            arabic = fetch_edition(surah_number, editions.BASE)
+            loaded = fetch_translations(surah_number, edition_ids)
+        if len(loaded) < len(edition_ids):
+            st.warning("⚠️ Some of the chosen translations could not be loaded; showing the rest.")
+
+        if arabic:
+            st.markdown(f"### 📖 {surah['englishName']} ({surah['name']})")
+            st.markdown(f"**Number of Verses:** {len(arabic)}")
+            st.markdown(f"**Revelation Type:** {surah['revelationType'].capitalize()}")
+
+            if surah_number != 9 and surah_number != 1:
+                st.markdown("<div dir='rtl' style='font-size:28px; text-align:center; margin:20px 0;'>بِسْمِ اللَّهِ الرَّحْمَٰنِ الرَّحِيمِ</div>", unsafe_allow_html=True)
+            # Only the current page of verses is rendered, as one cached HTML block
+            total_verses = len(arabic)
+            if st.session_state.get("verse_page_surah") != surah_number:
+                st.session_state.verse_page_surah = surah_number
+                st.session_state.verse_page = 1
+
+            page_size = st.selectbox("Verses per page:", verse_view.PAGE_SIZES,
+                                     index=verse_view.PAGE_SIZES.index(verse_view.DEFAULT_PAGE_SIZE),
+                                     key="verse_page_size")
+            pages = verse_view.page_count(total_verses, page_size)
+            st.session_state.verse_page = min(st.session_state.verse_page, pages)
+
+            def prev_page():
+                st.session_state.verse_page = max(1, st.session_state.verse_page - 1)
+
+            def next_page():
+                st.session_state.verse_page = min(pages, st.session_state.verse_page + 1)
+
+            nav1, nav2, nav3 = st.columns([1, 2, 1])
+            with nav1:
+                st.button("← Previous", key="verse_prev", on_click=prev_page,
+                          disabled=st.session_state.verse_page <= 1)
+            with nav2:
+                st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="verse_page")
+            with nav3:
+                st.button("Next →", key="verse_next", on_click=next_page,
+                          disabled=st.session_state.verse_page >= pages)
+
+            st.markdown(verse_view.VERSE_CSS, unsafe_allow_html=True)
+            st.markdown(render_verse_page(surah_number, st.session_state.verse_page, page_size, dark_mode, edition_ids),
+                        unsafe_allow_html=True)
+            _, first, last = verse_view.page_bounds(total_verses, st.session_state.verse_page, page_size)
+            where = index.locate(surah_number, first + 1)
+            st.caption(f"Showing verses {first + 1}–{last} of {total_verses} · "
+                       + " · ".join(f"{quran_nav.LABELS[d]} {where[d]}" for d in (quran_nav.JUZ, quran_nav.HIZB, quran_nav.PAGE)
+                                    if d in where))
+
+            # Remember the page being read, but not the default one shown on arrival,
+            # which would overwrite the position a returning reader wants to resume from
+            shown = (surah_number, first + 1)
+            if st.session_state.setdefault("reader_shown", shown) != shown:
+                marks.record_position(user_id, *shown)
+                st.session_state.reader_shown = shown
+
+            # Listening and bookmarking both work on the ayah picked here
+            ayah = st.selectbox("Ayah:", range(first + 1, last + 1), format_func=lambda a: f"{surah_number}:{a}")
+            col1, col2 = st.columns(2)
+            with col1:
+                # Recitations are downloaded once into the local audio cache, then played from there
+                reciter = st.selectbox("Reciter:", list(recitation.RECITERS), key="reciter",
+                                       format_func=lambda r: recitation.RECITERS[r].name)
+                audio_cache = recitation.get_cache()
+                audio = audio_cache.cached(reciter, surah_number)
+                if audio:
+                    st.session_state.pop("recitation_job", None)
+                    segments = audio_cache.segments(reciter, surah_number)
+                    start = segments[ayah - 1].start if segments else 0
+                    st.audio(audio, format="audio/mpeg", start_time=start)
+                    if segments:
+                        st.caption(f"▶️ Plays from {surah_number}:{ayah}")
+                else:
+                    def listen():
+                        job = recitation.start_fetch(reciter, surah_number, owner=user_id)
+                        if job:
+                            st.session_state.recitation_job = job.id
+
+                    st.button(f"🔊 Listen to {surah['englishName']}", on_click=listen)
+                    job_outcome("recitation_job", "Downloading the recitation", "ayahs")
+            with col2:
+                marked = marks.contains(user_id, surah_number, ayah)
+                st.button(f"🗑️ Remove bookmark {surah_number}:{ayah}" if marked else f"📑 Bookmark {surah_number}:{ayah}",
+                          on_click=marks.toggle, args=(user_id, surah_number, ayah))
+
+# Reading by juz, hizb, manzil, Madani page or ruku, across surah boundaries
+def unit_reader(index, division, dark_mode):
+    name = quran_nav.LABELS[division]
+    count = index.count(division)
+    units = st.session_state.setdefault("nav_units", {})
+    key = f"nav_{division}"
+    if key not in st.session_state:
+        st.session_state[key] = units.get(division, 1)
+
+    def keep_unit():
+        units[division] = st.session_state[key]
+
+    number = st.number_input(f"{name} (of {count})", min_value=1, max_value=count, key=key, on_change=keep_unit)
+    edition_ids = chosen_editions()
+    (first_surah, first_ayah), (last_surah, last_ayah) = index.bounds(division, number)
+    total = len(index.positions(division, number))
+    st.markdown(f"### 📖 {name} {number}: {first_surah}:{first_ayah} – {last_surah}:{last_ayah}")
+
+    if st.session_state.get("unit_page_of") != (division, number) or "unit_page" not in st.session_state:
+        st.session_state.unit_page_of = (division, number)
+        st.session_state.unit_page = 1
+    page_size = st.selectbox("Verses per page:", verse_view.PAGE_SIZES,
+                             index=verse_view.PAGE_SIZES.index(verse_view.DEFAULT_PAGE_SIZE), key="verse_page_size")
+    pages = verse_view.page_count(total, page_size)
+    st.session_state.unit_page = min(st.session_state.unit_page, pages)
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="unit_page")
+
+    with st.spinner(f"Loading {name.lower()} {number}..."):
+        rendered = render_unit_page(division, number, st.session_state.unit_page, page_size, dark_mode, edition_ids)
+    if rendered is None:
+        st.error("⚠️ Could not load this part of the Quran. Please check your connection and try again.")
+        return
+    st.markdown(verse_view.VERSE_CSS, unsafe_allow_html=True)
+    st.markdown(rendered, unsafe_allow_html=True)
+    _, start, end = verse_view.page_bounds(total, st.session_state.unit_page, page_size)
+    st.caption(f"Showing ayahs {start + 1}–{end} of {total} in {name.lower()} {number}")
+
+    # Reading progress is kept per ayah, so a unit counts like the surah pages it covers
+    shown = quran_nav.ref(index.positions(division, number)[start])
+    if st.session_state.setdefault("reader_shown", shown) != shown:
+        bookmarks.get_bookmarks().record_position(get_user_id(), *shown)
+        st.session_state.reader_shown = shown
+
+# Full-text search over the whole Quran
+@timed_fragment
+def quran_search_panel(dark_mode):
+    index = load_search_index()
+    if index is None or index.n_docs < quran_store.AYAH_TOTAL:
+        if index is None:
+            st.info("The search index has not been built yet. Building it downloads any surahs not saved locally.")
         else:
-            st.warning("No bookmarks yet. Start exploring to save some!")
+            st.warning(f"The search index covers only {index.n_docs} of {quran_store.AYAH_TOTAL} ayahs. "
+                       "Rebuild it to search the whole Quran.")
+        if st.button("⚙️ Build search index"):
+            st.session_state.index_job = jobs.get_queue().submit("search-index", {}, reuse=False).id
+        job = job_outcome("index_job", "Indexing the Quran", "ayahs")
+        if job:
+            del st.session_state.index_job
+            load_search_index.clear()
+            st.success(f"Indexed {job.summary['ayahs']} ayahs.")
+            st.rerun()
+        if index is None:
+            return
+
+    query = st.text_input("🔍 Search the Quran (Arabic or English):", key="quran_search_query",
+                          help='Use "quotes" for a phrase and * for a prefix, e.g. "straight path" or merc*')
+    edition_ids = chosen_editions()
+    if query:
+        results = index.search(query, limit=50)
+        st.caption(f"{len(results)} matching ayahs")
+        surahs = fetch_surahs()
+        blocks = []
+        for surah_number, ayah, _ in results:
+            arabic = fetch_edition(surah_number, editions.BASE)
+            if arabic:
+                name = surahs[surah_number - 1]["englishName"] if len(surahs) >= surah_number else f"Surah {surah_number}"
+                translations = [(n, texts[ayah - 1], rtl) for n, texts, rtl in fetch_translations(surah_number, edition_ids)]
+                blocks.append(verse_view.render_verse(f"{name} {surah_number}:{ayah}", arabic[ayah - 1], translations,
+                                                      dark_mode))
+        st.markdown(verse_view.VERSE_CSS, unsafe_allow_html=True)
+        st.markdown("".join(blocks), unsafe_allow_html=True)
+
+# Saved bookmarks
+@timed_fragment
+def bookmarks_panel():
+    st.markdown("### 📑 Your Bookmarks")
+    marks = bookmarks.get_bookmarks()
+    user_id = get_user_id()
+    surahs = fetch_surahs()
+    surah_name = lambda n: surahs[n - 1]["englishName"] if len(surahs) >= n else f"Surah {n}"
+
+    read, total = marks.progress(user_id)
+    resume = marks.position(user_id)
+    if resume:
+        st.progress(read / total, text=f"📖 Reading progress: {read} of {total} ayahs")
+        if st.button(f"▶️ Resume at {surah_name(resume.surah)} {resume.surah}:{resume.ayah}", key="resume_bookmarks"):
+            open_ayah(resume.surah, resume.ayah)
+            st.rerun()
+
+    saved = marks.list(user_id)
+    if saved:
+        for bm in saved:
+            col1, col2, col3 = st.columns([3, 1, 1])
+            with col1:
+                st.write(f"✅ {surah_name(bm.surah)} {bm.surah}:{bm.ayah}")
+            with col2:
+                if st.button("📖 Open", key=f"open_{bm.surah}_{bm.ayah}"):
+                    open_ayah(bm.surah, bm.ayah)
+                    st.rerun()
+            with col3:
+                if st.button("🗑️ Remove", key=f"remove_{bm.surah}_{bm.ayah}"):
+                    marks.remove(user_id, bm.surah, bm.ayah)
+                    st.rerun(scope="fragment")
+
+        if st.button("Clear All Bookmarks"):
+            marks.clear(user_id)
+            st.success("Bookmarks cleared!")
+            st.rerun(scope="fragment")
+
+    else:
+        st.warning("No bookmarks yet. Start exploring to save some!")
+
+# PDF export of a surah, juz, ayah range or the whole Quran, built in the background
+@timed_fragment
+def export_panel():
+    st.markdown("### 🖨️ Export to PDF")
+    st.caption("Arabic text with the Muhammad Asad translation, ready to print.")
+    surahs = fetch_surahs()
+    names = {s["number"]: f"{s['number']}. {s['englishName']} ({s['name']})" for s in surahs}
+    surah_label = lambda n: names.get(n, str(n))
+    surah_numbers = range(1, quran_store.SURAH_COUNT + 1)
+
+    kind = st.radio("Export:", ["Surah", "Juz", "Ayah range", "Whole Quran"], horizontal=True, key="export_kind")
+    if kind == "Surah":
+        selection = quran_export.surah_selection(st.selectbox("Surah:", surah_numbers, format_func=surah_label))
+    elif kind == "Juz":
+        selection = quran_export.juz_selection(st.selectbox("Juz:", range(1, len(quran_export.JUZ_STARTS) + 1)))
+    elif kind == "Ayah range":
+        col1, col2 = st.columns(2)
+        with col1:
+            first_surah = st.selectbox("From surah:", surah_numbers, format_func=surah_label)
+            first_ayah = st.number_input("From ayah:", 1, quran_store.AYAH_COUNTS[first_surah - 1], 1)
+        with col2:
+            last_surah = st.selectbox("To surah:", surah_numbers, index=first_surah - 1, format_func=surah_label)
+            last_count = quran_store.AYAH_COUNTS[last_surah - 1]
+            last_ayah = st.number_input("To ayah:", 1, last_count, last_count)
+        try:
+            selection = quran_export.range_selection((first_surah, int(first_ayah)), (last_surah, int(last_ayah)))
+        except ValueError as e:
+            st.error(f"⚠️ {e}")
+            return
+    else:
+        selection = quran_export.WHOLE_QURAN
+
+    if st.button(f"🖨️ Create PDF ({quran_export.ayah_count(selection)} ayahs)"):
+        st.session_state.export_job = quran_export.start_export(selection, owner=get_user_id()).id
+    job = job_outcome("export_job", "Preparing the PDF", "ayahs laid out")
+    if job:
+        job_download(job, f"⬇️ Download {job.params['title']}")
 
 # --------------- Tasbeeh Section 📿 ---------------
 def tasbeeh_section():
@@ -569,31 +714,121 @@ def tasbeeh_section():
     st.markdown("<h1 class='text-center' style='color: #1E563C; text-align: center;'>📿 Dhikr Counter</h1>", unsafe_allow_html=True)
     st.write("🔢 Click the buttons to count your dhikr.")
 
-    # List of 50 Adhkar
-    adhkar_list = [
-        "SubhanAllah (سبحان الله)", "Alhamdulillah (الحمد لله)", "Allahu Akbar (الله أكبر)", "La ilaha illallah (لا إله إلا الله)",
-        "Astaghfirullah (أستغفر الله)", "La hawla wa la quwwata illa billah (لا حول ولاقوة إلا بالله)", "Bismillah (بسم الله)",
-        "Hasbunallahu wa ni'mal wakeel (حسبنا الله ونعم الوكيل)", "Rabbi zidni ilma (ربي زدني علما)", "Allahumma inni as'aluka al-jannah (اللهم إني أسألك الجنة)",
-        "Allahumma ajirni min an-naar (اللهم أجرني من النار)", "Ya Hayyu Ya Qayyum (يا حي يا قيوم)", "Allahumma barik lana (اللهم بارك لنا)",
-        "Rabbighfir li (رب اغفر لي)", "Allahumma laka alhamd (اللهم لك الحمد)", "Allahumma anta as-salam (اللهم أنت السلام)",
-        "SubhanAllahi wa bihamdihi (سبحان الله وبحمده)", "SubhanAllahil azeem (سبحان الله العظيم)", "Ya Rahman, Ya Raheem (يا رحمن يا رحيم)",
-        "Rabbi la tadharni fardan (ربي لا تذرني فردا)", "Rabbi habli minas-salihin (رب هب لي من الصالحين)", "Allahumma rahmataka arju (اللهم رحمتك أرجو)",
-        "Rabbana atina fid-dunya hasanah (ربنا آتنا في الدنيا حسنة)", "Rabbi yassir wa la tu'assir (ربي يسر ولا تعسر)", "Allahumma inni dhalamtu nafsi (اللهم إني ظلمت نفسي)",
-        "Rabbi innee lima anzalta ilayya min khayrin faqir (ربي إني لما أنزلت إلي من خير فقير)", "Allahumma inni a'udhu bika min fitnatil qabri (اللهم إني أعوذ بك من فتنة القبر)",
-        "Allahumma ahdina siratal mustaqeem (اللهم اهدنا الصراط المستقيم)", "Rabbi jalni muqimas-salah (ربي اجعلني مقيم الصلاة)", "Rabbi inni maghloobun fantasir (ربي إني مغلوب فانتصر)",
-        "Rabbi awzi'ni an ashkura (ربي أوزعني أن أشكر)", "Rabbi la taj'alni ma'al qawmi dhalimeen (ربي لا تجعلني مع القوم الظالمين)", "Rabbi faghfir wa irham wa anta khayrur rahimeen (ربي اغفر وارحم وأنت خير الراحمين)",
-        "Ya Dhal-Jalali wal-Ikram (يا ذا الجلال والإكرام)", "Allahumma salli ala Muhammadin wa ala aali Muhammad (اللهم صل على محمد وعلى آل محمد)",
-        "Rabbi inni zalamtu nafsi faghfir li (ربي إني ظلمت نفسي فاغفر لي)", "Rabbi inni massaniyadh-dhurru wa anta arhamur-rahimeen (ربي إني مسني الضر وأنت أرحم الراحمين)",
-        "Rabbi adkhilni mudkhala sidqin wa akhrijni mukhraja sidqin (ربي أدخلني مدخل صدق وأخرجني مخرج صدق)", "Allahumma anta rabbi la ilaha illa anta (اللهم أنت ربي لا إله إلا أنت)",
-        "Rabbi a'udhu bika min hamazatish-shayateen (ربي أعوذ بك من همزات الشياطين)", "Rabbi la tuhammilni ma la taqata li bihi (ربي لا تحملني ما لا طاقة لي به)",
-        "Rabbi la tukhzini yawmal qiyamah (ربي لا تخزني يوم القيامة)", "Rabbi yassir lana umoorana (ربي يسر لنا أمورنا)", "Rabbi a'udhu bika min athabil qabr (ربي أعوذ بك من عذاب القبر)",
-        "Rabbi habli hukman wa alhiqni bis-salihin (ربي هب لي حكما وألحقني بالصالحين)", "Rabbi la tu'akhidhni bima nasitu (ربي لا تؤاخذني بما نسيت)", "Rabbi waqini adhab an-naar (ربي وقني عذاب النار)"
-    ]
-
-    # Store tasbeeh counts in session state
+    adhkar_list = content_registry.get_registry().adhkar
+
+    # Store tasbeeh counts in session state, backed by the persistent counter store
+    counters = counter_store.get_store()
+    dhikr_ranking.get_rankings()  # listens for updates from here on
+    user_id = get_user_id()
     if "tasbeeh_counts" not in st.session_state:
         st.session_state.tasbeeh_counts = {dhikr: 0 for dhikr in adhkar_list}
+        st.session_state.tasbeeh_counts.update(counters.counts(user_id))
+
+    def increment_dhikr(dhikr, amount=1):
+        st.session_state.tasbeeh_counts[dhikr] = st.session_state.tasbeeh_counts.get(dhikr, 0) + amount
+        counters.increment(user_id, dhikr, amount)
+        dhikr_log.get_log().record(user_id, dhikr, amount)
+
+    def set_dhikr(dhikr, value):
+        st.session_state.tasbeeh_counts[dhikr] = value
+        counters.set(user_id, dhikr, value)
+    
+    dhikr_board(adhkar_list, increment_dhikr, set_dhikr)
+
+    # Custom Tasbeeh input
+    st.markdown("---")
+    st.subheader("➕ Add Custom Dhikr")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        new_tasbeeh = st.text_input("Enter custom dhikr phrase:", key="custom_dhikr_input")
+    with col2:
+        if st.button("Add"):
+            if new_tasbeeh and new_tasbeeh not in st.session_state.tasbeeh_counts:
+                set_dhikr(new_tasbeeh, 0)
+                st.success(f"Added '{new_tasbeeh}' to your dhikr list!")
+                st.rerun()
+            elif new_tasbeeh in st.session_state.tasbeeh_counts:
+                st.error("This dhikr is already in your list!")
+            else:
+                st.warning("Please enter a dhikr phrase first.")
+    
+    # Add export/import functionality
+    st.markdown("---")
+    st.subheader("💾 Save & Restore")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        # Built as a background job; the same counts on the same day reuse the finished file
+        counted = sorted(((d, c) for d, c in st.session_state.tasbeeh_counts.items() if c > 0),
+                         key=lambda x: x[1], reverse=True)
+        if st.button("Export to PDF", disabled=not counted,
+                     help=None if counted else "No dhikr counts to export yet."):
+            st.session_state.dhikr_report_job = pdf_report.start_render(
+                "pdf_report:dhikr_report",
+                {"counts": dict(counted), "generated_on": datetime.now().strftime("%Y-%m-%d")},
+                f"dhikr_report_{datetime.now().strftime('%Y%m%d')}.pdf", owner=user_id).id
+        job = job_outcome("dhikr_report_job", "Building the report", "rows")
+        if job:
+            job_download(job, "⬇️ Download PDF report")
     
+    with col2:
+        st.markdown("**Import Data:**")
+        # Files are streamed by a background job, so exports of any size from other counter apps work
+        uploaded = st.file_uploader("Upload counts (dhikr:count text, CSV or JSON Lines):",
+                                    type=["txt", "csv", "jsonl", "ndjson", "json"])
+        import_text = st.text_area("...or paste your dhikr counts in format 'dhikr:count' (one per line):",
+                                   height=100, help="Example: SubhanAllah:33")
+        merge_modes = {"Add to my counts": "add", "Replace my counts": "replace", "Keep the higher count": "max"}
+        merge = st.radio("When a dhikr is already counted:", list(merge_modes), horizontal=True)
+
+        if st.button("Import"):
+            params = {"user_id": user_id, "mode": merge_modes[merge]}
+            if uploaded is not None:
+                first_line = uploaded.readline().decode("utf-8", errors="replace")
+                uploaded.seek(0)
+                params.update(format=dhikr_import.detect_format(uploaded.name, first_line),
+                              path=dhikr_import.save_upload(uploaded))
+            elif import_text:
+                params.update(format="text", text=import_text)
+            else:
+                params = None
+                st.warning("Please upload a file or paste data to import.")
+            if params:
+                st.session_state.import_job = jobs.get_queue().submit("dhikr-import", params, owner=user_id,
+                                                                      reuse=False).id
+        if st.session_state.get("import_job"):
+            job = job_outcome("import_job", "Importing", "bytes")
+            finished = jobs.get_queue().get(st.session_state.import_job)
+            if finished is not None and finished.finished:
+                del st.session_state.import_job
+                if job:
+                    # The job wrote to the counter store; pick the new counts up from there
+                    st.session_state.tasbeeh_counts.update(counters.counts(user_id))
+                    st.session_state.import_report = job.summary
+                    st.rerun()
+        report = st.session_state.pop("import_report", None)
+        if report:
+            st.success(f"Successfully imported {report['imported']} dhikr counts "
+                       f"from {report['lines']} lines in {report['seconds']} s!")
+            if report["skipped"]:
+                st.warning(f"{report['skipped']} lines were skipped.")
+                with st.expander("Skipped lines"):
+                    st.dataframe(report["errors"], hide_index=True)
+                    if report["skipped"] > len(report["errors"]):
+                        st.caption(f"Showing the first {len(report['errors'])}.")
+
+    # Option to reset all counts
+    if st.button("🗑️ Reset All Counts", key="reset_all"):
+        if st.session_state.tasbeeh_counts:
+            for dhikr in list(st.session_state.tasbeeh_counts):
+                set_dhikr(dhikr, 0)
+            st.success("All counts have been reset to zero.")
+            st.rerun()
+
+# Search, counters and statistics; a ➕ or 🔄 click reruns only this board
+@timed_fragment
+def dhikr_board(adhkar_list, increment_dhikr, set_dhikr):
     # Add search functionality
     search_query = st.text_input("🔍 Search for a dhikr:", "")
     
@@ -605,11 +840,16 @@ def tasbeeh_section():
     filtered_adhkar = adhkar_list
     
     if search_query:
-        filtered_adhkar = [dhikr for dhikr in adhkar_list if search_query.lower() in dhikr.lower()]
+        filtered_adhkar = content_search.search(search_query, content_search.ADHKAR)
     
+    # Ranked incrementally as counts change, instead of sorting every count on each rerun
+    rankings = dhikr_ranking.get_rankings()
+    user_id = get_user_id()
+
     if selected_category == "Most Used":
-        # Sort by most used and take top 10
-        filtered_adhkar = sorted(adhkar_list, key=lambda x: st.session_state.tasbeeh_counts.get(x, 0), reverse=True)[:10]
+        # Top 10, topped up from the list while fewer than 10 have been counted
+        filtered_adhkar = [dhikr for dhikr, _ in rankings.top(user_id, 10)]
+        filtered_adhkar += [d for d in adhkar_list if d not in filtered_adhkar][:10 - len(filtered_adhkar)]
     elif selected_category == "SubhanAllah variations":
         filtered_adhkar = [dhikr for dhikr in adhkar_list if "SubhanAllah" in dhikr]
     elif selected_category == "Rabbi prayers":
@@ -618,7 +858,7 @@ def tasbeeh_section():
         filtered_adhkar = [dhikr for dhikr in adhkar_list if "Allahumma" in dhikr]
     
     # Create tabs for different views
-    tab1, tab2 = st.tabs(["Card View", "List View"])
+    tab1, tab2, tab3 = st.tabs(["Card View", "List View", "🎯 Tap Counter"])
     
     with tab1:
         # Display Tasbeehs in a responsive grid layout
@@ -644,13 +884,9 @@ def tasbeeh_section():
                         
                         c1, c2 = st.columns(2)
                         with c1:
-                            if st.button(f"➕", key=f"inc_card_{tasbeeh}"):
-                                st.session_state.tasbeeh_counts[tasbeeh] += 1
-                                st.rerun()
+                            st.button(f"➕", key=f"inc_card_{tasbeeh}", on_click=increment_dhikr, args=(tasbeeh,))
                         with c2:
-                            if st.button(f"🔄", key=f"reset_card_{tasbeeh}"):
-                                st.session_state.tasbeeh_counts[tasbeeh] = 0
-                                st.rerun()
+                            st.button(f"🔄", key=f"reset_card_{tasbeeh}", on_click=set_dhikr, args=(tasbeeh, 0))
     
     with tab2:
         # Display Tasbeehs in a list view
@@ -661,154 +897,85 @@ def tasbeeh_section():
             with col1:
                 st.write(f"📿 **{tasbeeh}**: {count}")
             with col2:
-                if st.button(f"➕ Count", key=f"inc_list_{tasbeeh}"):
-                    st.session_state.tasbeeh_counts[tasbeeh] += 1
-                    st.rerun()
+                st.button(f"➕ Count", key=f"inc_list_{tasbeeh}", on_click=increment_dhikr, args=(tasbeeh,))
             with col3:
-                if st.button(f"🔄 Reset", key=f"reset_list_{tasbeeh}"):
-                    st.session_state.tasbeeh_counts[tasbeeh] = 0
-                    st.rerun()
+                st.button(f"🔄 Reset", key=f"reset_list_{tasbeeh}", on_click=set_dhikr, args=(tasbeeh, 0))
+
+    with tab3:
+        tap_counter_panel(list(st.session_state.tasbeeh_counts), increment_dhikr)
 
     # Add a section to display total counts and statistics
     st.markdown("---")
     st.subheader("📊 Statistics")
-    total_dhikr = sum(st.session_state.tasbeeh_counts.values())
+    total_dhikr = rankings.total(user_id)
     
     col1, col2 = st.columns(2)
     with col1:
         st.metric(label="Total Dhikr Count", value=total_dhikr)
     with col2:
         # Find the most recited dhikr
-        if total_dhikr > 0:
-            most_recited = max(st.session_state.tasbeeh_counts.items(), key=lambda x: x[1])
+        most_recited = rankings.argmax(user_id)
+        if most_recited:
             st.metric(label="Most Recited", value=most_recited[0], delta=most_recited[1])
-    
-    # Custom Tasbeeh input
-    st.markdown("---")
-    st.subheader("➕ Add Custom Dhikr")
-    
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        new_tasbeeh = st.text_input("Enter custom dhikr phrase:", key="custom_dhikr_input")
-    with col2:
-        if st.button("Add"):
-            if new_tasbeeh and new_tasbeeh not in st.session_state.tasbeeh_counts:
-                st.session_state.tasbeeh_counts[new_tasbeeh] = 0
-                st.success(f"Added '{new_tasbeeh}' to your dhikr list!")
-                st.rerun()
-            elif new_tasbeeh in st.session_state.tasbeeh_counts:
-                st.error("This dhikr is already in your list!")
-            else:
-                st.warning("Please enter a dhikr phrase first.")
-    
-    # Add export/import functionality
-    st.markdown("---")
-    st.subheader("💾 Save & Restore")
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("Export to PDF"):
-            try:
-                
-                # Create in-memory PDF
-                pdf_buffer = io.BytesIO()
-                doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-                styles = getSampleStyleSheet()
-                
-                # Create custom styles
-                title_style = ParagraphStyle(
-                    'Title',
-                    parent=styles['Heading1'],
-                    alignment=1,  # Center alignment
-                )
-                
-                # Build the document content
-                content = []
-                
-                # Add title and date
-                content.append(Paragraph("Dhikr Counter Report", title_style))
-                content.append(Spacer(1, 20))
-                content.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles["Normal"]))
-                content.append(Spacer(1, 20))
-                
-                # Create table data
-                data = [["Dhikr", "Count"]]
-                
-                # Add only dhikr that have been counted
-                for dhikr, count in sorted(st.session_state.tasbeeh_counts.items(), key=lambda x: x[1], reverse=True):
-                    if count > 0:  # Only include dhikr with counts > 0
-                        data.append([dhikr, str(count)])
-                
-                # Add total count
-                data.append(["Total", str(sum(st.session_state.tasbeeh_counts.values()))])
-                
-                # Create the table
-                if len(data) > 1:
-                    table = Table(data, colWidths=[400, 100])
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (1, 0), colors.lightgrey),
-                        ('TEXTCOLOR', (0, 0), (1, 0), colors.black),
-                        ('ALIGN', (0, 0), (1, 0), 'CENTER'),
-                        ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
-                        ('BOTTOMPADDING', (0, 0), (1, 0), 12),
-                        ('BACKGROUND', (0, -1), (1, -1), colors.lightgrey),
-                        ('FONTNAME', (0, -1), (1, -1), 'Helvetica-Bold'),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ]))
-                    content.append(table)
-                else:
-                    content.append(Paragraph("No dhikr counts to display.", styles["Normal"]))
-                
-                # Build the PDF
-                doc.build(content)
-                
-                # Prepare download button
-                pdf_data = pdf_buffer.getvalue()
-                st.download_button(
-                    label="Download PDF",
-                    data=pdf_data,
-                    file_name=f"dhikr_report_{datetime.now().strftime('%Y%m%d')}.pdf",
-                    mime="application/pdf"
-                )
-            except Exception as e:
-                st.error(f"Error generating PDF: {e}")
-                st.info("Make sure you have ReportLab installed. You can install it with 'pip install reportlab'")
-    
-    with col2:
-        st.markdown("**Import Data:**")
-        # Simpler approach for importing - using text input
-        import_text = st.text_area("Paste your dhikr counts in format 'dhikr:count' (one per line):", 
-                                height=100,
-                                help="Example: SubhanAllah:33")
-        
-        if st.button("Import"):
-            if import_text:
-                try:
-                    new_counts = {}
-                    for line in import_text.strip().split('\n'):
-                        if ':' in line:
-                            dhikr, count = line.split(':', 1)
-                            dhikr = dhikr.strip()
-                            count = int(count.strip())
-                            new_counts[dhikr] = count
-                    
-                    # Update session state with new counts
-                    st.session_state.tasbeeh_counts.update(new_counts)
-                    st.success(f"Successfully imported {len(new_counts)} dhikr counts!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error importing data: {e}")
-                    st.info("Make sure your format is correct (dhikr:count, one per line)")
-            else:
-                st.warning("Please enter data to import.")
-                
-    # Option to reset all counts
-    if st.button("🗑️ Reset All Counts", key="reset_all"):
-        if st.session_state.tasbeeh_counts:
-            st.session_state.tasbeeh_counts = {dhikr: 0 for dhikr in st.session_state.tasbeeh_counts}
-            st.success("All counts have been reset to zero.")
-            st.rerun()
+
+    with st.expander("🌍 Most recited by everyone"):
+        ranked = rankings.top_global(10)
+        if ranked:
+            st.dataframe([{"Dhikr": d, "Count": c} for d, c in ranked], hide_index=True)
+        else:
+            st.caption("Nothing has been counted yet.")
+
+    dhikr_trends(user_id)
+
+# Trends, streaks and per-dhikr history, read from the pre-summed rollups of the event log
+def dhikr_trends(user_id):
+    log = dhikr_log.get_log()
+    current, longest, active_days = log.streak(user_id)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("🔥 Current Streak", f"{current} days")
+    col2.metric("🏆 Longest Streak", f"{longest} days")
+    col3.metric("📅 Active Days", active_days)
+    if not active_days:
+        st.caption("Your daily trends appear here once you start counting.")
+        return
+
+    trend_tab, history_tab, hours_tab = st.tabs(["📈 Trend", "📿 Per Dhikr", "🕰️ Time of Day"])
+    with trend_tab:
+        period = st.radio("Show:", ["Last 30 days", "Last 26 weeks", "Last 3 years"], horizontal=True,
+                          key="trend_period")
+        if period == "Last 30 days":
+            series = log.series(user_id, dhikr_log.DAY, 30)
+        else:
+            series = log.series(user_id, dhikr_log.WEEK, 26 if period == "Last 26 weeks" else 156)
+        st.bar_chart({"Dhikr": {start.isoformat(): total for start, total in series}})
+    with history_tab:
+        names = log.dhikr_names(user_id)
+        dhikr = st.selectbox("Dhikr:", names, key="history_dhikr")
+        series = log.series(user_id, dhikr_log.WEEK, 52, dhikr=dhikr)
+        st.line_chart({dhikr: {start.isoformat(): total for start, total in series}})
+        st.caption("Weekly totals over the last year.")
+    with hours_tab:
+        st.bar_chart({"Dhikr": {f"{hour:02d}:00": total for hour, total in enumerate(log.hour_profile(user_id))}})
+        st.caption("When you recited over the last 90 days.")
+
+# Tap counter: taps are counted in the browser and synced in batches; as a
+# fragment, a sync reruns only this panel instead of the whole script
+@timed_fragment
+def tap_counter_panel(dhikr_options, increment_dhikr):
+    # Apply the latest batch before rendering so the component gets the new count and ack
+    tasbeeh_component.apply_batch(st.session_state.get("tap_counter"), st.session_state, increment_dhikr)
+
+    dhikr = st.selectbox("Choose a dhikr to count:", dhikr_options, key="tap_dhikr")
+    tasbeeh_component.tasbeeh_counter(
+        dhikr,
+        st.session_state.tasbeeh_counts.get(dhikr, 0),
+        acked_batch=st.session_state.get("tap_acked_batch"),
+        key="tap_counter",
+    )
+    taps = st.session_state.get("tap_total", 0)
+    if taps:
+        st.caption(f"{taps} taps synced in {st.session_state.tap_syncs} fragment reruns "
+                   f"(the ➕ buttons would have rerun the whole app {2 * taps} times)")
 
 # --------------- Duas & Wazaif Section 🤲 ---------------
 def duas_wazaif_section():
@@ -901,17 +1068,25 @@ def duas_wazaif_section():
     # Using the responsive heading class instead of h1
     st.markdown("<div class='responsive-heading'>🤲 Islamic Duas & Wazaif</div>", unsafe_allow_html=True)
 
+    # Category, search and the dua list rerun on their own as a fragment
+    duas_panel()
+
+    # Add a footer with mobile-friendly styling
+    st.markdown("""
+    <div style="text-align: center; margin-top: 30px; padding: 10px; font-size: 12px; color: #666;">
+        📱 This section is optimized for all devices including mobile phones and tablets.
+    </div>
+    """, unsafe_allow_html=True)
+    
+# Dua category/search controls and the matching duas
+@timed_fragment
+def duas_panel():
     # Create columns for mobile-friendly layout
     col1, col2 = st.columns([3, 1])
     
     # Dua Categories
-    categories = [
-        "🌅 Daily Life Duas",
-        "🛡️ Protection Duas",
-        "🕌 Ramadan Duas",
-        "🤲 Forgiveness & Mercy Duas",
-        "📖 Quranic & Special Duas"
-    ]
+    duas_collection = content_registry.get_registry().duas
+    categories = list(duas_collection)
 
     # Default: Show all duas
     with col1:
@@ -921,76 +1096,11 @@ def duas_wazaif_section():
     with col2:
         search_query = st.text_input("🔍 Search Duas", "")
 
-    # **DUAS COLLECTION**
-    duas_collection = {
-        "🌅 Daily Life Duas": [
-            ("Morning Dua", "اللهم بك أصبحنا وبك أمسينا وبك نحيا وبك نموت وإليك المصير"),
-            ("Evening Dua", "اللهم إني أمسيت أشهدك أنك أنت الله لا إله إلا أنت وحدك لا شريك لك"),
-            ("Before Sleeping", "بِسْمِكَ اللَّهُمَّ أَمُوتُ وَأَحْيَا"),
-            ("Waking Up", "الحمد لله الذي أحيانا بعد ما أماتنا وإليه النشور"),
-            ("Before Eating", "بِسْمِ اللَّهِ"),
-            ("After Eating", "الْحَمْدُ لِلَّهِ الَّذِي أَطْعَمَنَا وَسَقَانَا وَجَعَلَنَا مِنَ الْمُسْلِمِينَ"),
-            ("Before Entering Toilet", "اللهم إني أعوذ بك من الخبث والخبائث"),
-            ("After Leaving Toilet", "غفرانك"),
-            ("Before Traveling", "سُبْحَانَ الَّذِي سَخَّرَ لَنَا هَذَا وَمَا كُنَّا لَهُ مُقْرِنِينَ"),
-            ("Dua for Parents", "رَّبِّ ارْحَمْهُمَا كَمَا رَبَّيَانِي صَغِيرًا"),
-            ("Dua Before Studying", "اللهم إني أسألك فهم النبيين وحفظ المرسلين"),
-            ("Dua After Studying", "اللهم اجعلني من الفاهمين"),
-            ("Dua for Entering Home", "اللهم إني أسألك خير المولج وخير المخرج"),
-            ("Dua for Leaving Home", "بسم الله توكلت على الله ولا حول ولا قوة إلا بالله"),
-            ("Dua for Entering the Mosque", "اللهم افتح لي أبواب رحمتك"),
-            ("Dua for Leaving the Mosque", "اللهم إني أسألك من فضلك"),
-            ("Dua Before Wearing Clothes", "الحمد لله الذي كساني هذا الثوب"),
-            ("Dua for New Clothes", "اللهم لك الحمد كما كسوتنيه"),
-            ("Dua Before Entering a Market", "لا إله إلا الله وحده لا شريك له"),
-            ("Dua for Health", "اللهم اشفني شفاء لا يغادر سقما"),
-            ("Dua for Strength", "حسبنا الله ونعم الوكيل"),
-            ("Dua for Rizq", "اللهم ارزقني رزقا حلالا طيبا مباركا"),
-            ("Dua for Success", "اللهم لا سهل إلا ما جعلته سهلا"),
-            ("Dua for Marriage", "اللهم ارزقني الزوج الصالح"),
-            ("Dua for Children", "رَبِّ هَبْ لِي مِنَ الصَّالِحِينَ"),
-            ("Dua for Patience", "رَبِّ أَوْزِعْنِي أَنْ أَشْكُرَ نِعْمَتَكَ"),
-            ("Dua for Contentment", "اللهم اجعلني قانعا بما رزقتني"),
-            ("Dua for Protection from Arrogance", "اللهم إني أعوذ بك من الكبر والعجب"),
-        ],
-        "🛡️ Protection Duas": [
-            ("Seeking Allah's Protection", "أعوذ بكلمات الله التامات من شر ما خلق"),
-            ("Protection from Evil Eye", "اللهم بارك ولا تضر"),
-            ("Protection from Enemies", "اللهم اكفنيهم بما شئت"),
-            ("Protection from Anxiety & Depression", "اللهم إني أعوذ بك من الهم والحزن"),
-            ("Dua Against Harm", "اللهم إني أعوذ بك من البرص والجنون والجذام وسيئ الأسقام"),
-            ("Dua for Protection of Family", "اللهم احفظ لي أهلي وأحبتي من كل سوء"),
-        ],
-        "🕌 Ramadan Duas": [
-            ("Suhoor Dua", "وَبِصَوْمِ غَدٍ نَّوَيْتُ مِنْ شَهْرِ رَمَضَانَ"),
-            ("Iftar Dua", "اللهم إني لك صمت وبك آمنت وعليك توكلت وعلى رزقك أفطرت"),
-            ("Dua for Laylatul Qadr", "اللهم إنك عفو كريم تحب العفو فاعف عني"),
-            ("Dua for First Ashra (Mercy)", "اللهم ارحمنا برحمتك"),
-            ("Dua for Second Ashra (Forgiveness)", "اللهم اغفر لي ذنوبي"),
-            ("Dua for Third Ashra (Freedom from Hell)", "اللهم أجرني من النار"),
-        ],
-        "🤲 Forgiveness & Mercy Duas": [
-            ("Dua for Forgiveness", "رب اغفر لي وتب علي إنك أنت التواب الرحيم"),
-            ("Dua for Mercy", "اللهم ارحمني برحمتك الواسعة"),
-            ("Dua for Repentance", "اللهم إني ظلمت نفسي فاغفر لي"),
-            ("Dua for a Pure Heart", "اللهم طهر قلبي من النفاق"),
-            ("Dua for the Day of Judgment", "اللهم اجعل قبري روضة من رياض الجنة"),
-        ],
-        "📖 Quranic & Special Duas": [
-            ("Dua from Surah Al-Fatiha", "اهْدِنَا الصِّرَاطَ الْمُسْتَقِيمَ"),
-            ("Dua from Surah Al-Baqarah", "رَبَّنَا آتِنَا فِي الدُّنْيَا حَسَنَةً وَفِي الْآخِرَةِ حَسَنَةً وَقِنَا عَذَابَ النَّارِ"),
-            ("Dua from Surah Al-Kahf", "رَبِّ زِدْنِي عِلْمًا"),
-            ("Dua for Rizq", "اللهم ارزقني رزقا حلالا طيبا مباركا"),
-            ("Dua for the Hereafter", "اللهم اجعل قبري نورا"),
-        ]
-    }
+    # Duas matching the search query, looked up once per run
+    matching_keys = set(content_search.search(search_query, content_search.DUAS)) if search_query else None
 
-    # Function to check if dua matches search query
-    def dua_matches_search(title, dua, query):
-        if not query:
-            return True
-        query = query.lower()
-        return query in title.lower() or query in dua.lower()
+    def dua_matches_search(category, title, dua):
+        return matching_keys is None or (category, title, dua) in matching_keys
 
     # Display Duas
     if selected_category == "📜 Show All":
@@ -999,7 +1109,7 @@ def duas_wazaif_section():
             st.markdown(f"<div class='category-badge'>{category}</div>", unsafe_allow_html=True)
             
             # Filter duas by search query
-            matching_duas = [(title, dua) for title, dua in duas if dua_matches_search(title, dua, search_query)]
+            matching_duas = [(title, dua) for title, dua in duas if dua_matches_search(category, title, dua)]
             
             if not matching_duas:
                 st.write("No matching duas found in this category.")
@@ -1024,7 +1134,7 @@ def duas_wazaif_section():
         
         # Filter duas by search query
         matching_duas = [(title, dua) for title, dua in duas_collection[selected_category] 
-                        if dua_matches_search(title, dua, search_query)]
+                        if dua_matches_search(selected_category, title, dua)]
         
         if not matching_duas:
             st.write("No matching duas found in this category.")
@@ -1052,24 +1162,36 @@ def duas_wazaif_section():
                             <div class="dua-text">{dua}</div>
                         </div>
                         """, unsafe_allow_html=True)
-                    
-    # Add a footer with mobile-friendly styling
-    st.markdown("""
-    <div style="text-align: center; margin-top: 30px; padding: 10px; font-size: 12px; color: #666;">
-        📱 This section is optimized for all devices including mobile phones and tablets.
-    </div>
-    """, unsafe_allow_html=True)
-    
+
     # --------------- Ramadan Section 🕌 (Prayer Times) ---------------
-def get_prayer_times(country, city):
-    """ Fetches prayer times from API """
-    url = f"https://api.aladhan.com/v1/timingsByCity?city={city}&country={country}&method=2"
-    response = requests.get(url)
+def _geocode_city(country, city):
+    url = "https://api.aladhan.com/v1/timingsByCity"
+    response = http_client.get(url, params={"city": city, "country": country, "method": 2})
     if response.status_code == 200:
-        data = response.json()
-        return data["data"]["timings"]
-    else:
+        meta = response.json()["data"]["meta"]
+        return meta["latitude"], meta["longitude"], meta["timezone"]
+    return None
+
+def place_label(place):
+    label = f"{place.name}, {place.country}"
+    return f"{label} · pop. {place.population:,}" if place.population else label
+
+def lookup_city(country, city):
+    """ One API lookup per city per process, for names the gazetteer doesn't know """
+    key = ("city", country, city.strip().lower())
+    try:
+        found = shared_cache.get_or_load(key, lambda: _geocode_city(country, city))
+    except requests.RequestException:
+        return None
+    if not found:
         return None
+    latitude, longitude, tz = found
+    return gazetteer.Place(city.strip().title(), gazetteer.COUNTRY_CODES.get(country, ""), latitude, longitude, tz, 0)
+
+def get_prayer_times(place, method=prayer_times.DEFAULT_METHOD, asr="Standard"):
+    """ Today's prayer times at the place, computed locally """
+    return prayer_times.timings(prayer_times.local_date(place.timezone), place.latitude, place.longitude,
+                                place.timezone, method=method, asr=asr)
 
 # --------------- Ramadan Section 🕌 --------------
 
@@ -1127,14 +1249,32 @@ def ramadan_section():
     # Centering the whole section
     st.markdown("<div class='main-container'>", unsafe_allow_html=True)
 
+    # Inputs and results rerun on their own as a fragment
+    prayer_times_panel()
+
+    # Closing div for center alignment
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# City/country inputs and today's timings
+@timed_fragment
+def prayer_times_panel():
     # Input Section (Centered)
-    countries = ["Pakistan", "Saudi Arabia", "UAE", "USA", "UK", "India", "Bangladesh", "Egypt", "Turkey", "Malaysia"]
+    countries = ["Pakistan", "Saudi Arabia", "UAE", "USA", "UK", "India", "Bangladesh", "Egypt", "Turkey", "Malaysia",
+                 "Any country"]
     country = st.selectbox("🌍 Select your country:", countries)
     city = st.text_input("🏙️ Enter your city:")
+    # Matching places from the offline gazetteer, best first
+    places = gazetteer.get_gazetteer().suggest(city, gazetteer.COUNTRY_CODES.get(country), limit=8) if city else []
+    place = st.selectbox("📍 Choose the place:", places, format_func=place_label) if places else None
+    method = st.selectbox("🧭 Calculation method:", list(prayer_times.METHODS),
+                          format_func=lambda key: prayer_times.METHODS[key].name)
+    asr = st.selectbox("🕰️ Asr time:", list(prayer_times.ASR_FACTORS),
+                       format_func=lambda key: "Hanafi (later Asr)" if key == "Hanafi" else "Standard (Shafi'i, Maliki, Hanbali)")
 
     if st.button("🔍 Get Prayer Times"):
         if city:
-            timings = get_prayer_times(country, city)
+            place = place or lookup_city(country, city)
+            timings = get_prayer_times(place, method, asr) if place else None
             if timings:
                 st.markdown("""
                     <h3 style="
@@ -1166,8 +1306,54 @@ def ramadan_section():
         else:
             st.warning("⚠️ Please enter a city.")
 
-    # Closing div for center alignment
-    st.markdown("</div>", unsafe_allow_html=True)
+    with st.expander("📅 Monthly Timetable & Ramadan Calendar"):
+        timetable_view(place, country, method, asr)
+
+# Whole-month timings for the chosen place, or for the country's largest places at once
+def timetable_view(place, country, method, asr):
+    today = datetime.now().date()
+    next_month = timetable.month_dates(today.year, today.month)[-1] + timedelta(days=1)
+    ramadan_year = timetable.next_ramadan_year(today)
+    periods = {
+        f"Ramadan {ramadan_year} AH": timetable.ramadan_dates(ramadan_year),
+        today.strftime("%B %Y"): timetable.month_dates(today.year, today.month),
+        next_month.strftime("%B %Y"): timetable.month_dates(next_month.year, next_month.month),
+    }
+    period = st.selectbox("🗓️ Period:", list(periods))
+    code = gazetteer.COUNTRY_CODES.get(country)
+    scopes = ["Chosen place"] + ([f"Largest cities in {country}"] if code else [])
+    scope = st.radio("Places:", scopes, horizontal=True)
+
+    places = gazetteer.get_gazetteer().largest(code, limit=200) if scope != scopes[0] else [place] if place else []
+    if not places:
+        st.info("Enter a city above to see its timetable.")
+        return
+    days = periods[period]
+    times = timetable.compute(days, [p.latitude for p in places], [p.longitude for p in places],
+                              [p.timezone for p in places], method=method, asr=asr)
+    labels = [f"{p.name}, {p.country}" for p in places]
+    if len(places) == 1:
+        st.caption("Ramadan dates follow the tabular Hijri calendar and may shift by a day with the moon sighting.")
+        st.dataframe(dict(zip(timetable.CALENDAR_COLUMNS, zip(*timetable.calendar_rows(days, times[0])))),
+                     hide_index=True)
+    else:
+        st.caption(f"{len(places)} cities × {len(days)} days; download the full calendar below.")
+
+    name = f"prayer_times_{period.lower().replace(' ', '_')}_{labels[0].split(',')[0] if len(places) == 1 else country}"
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("⬇️ Download CSV", lambda: timetable.to_csv(labels, days, times),
+                           file_name=f"{name}.csv", mime="text/csv")
+    with col2:
+        if st.button("📄 Create PDF"):
+            inputs = {"title": f"Prayer Times, {period}", "days": [day.isoformat() for day in days],
+                      "places": [[label, p.latitude, p.longitude, p.timezone] for label, p in zip(labels, places)],
+                      "method": method, "asr": asr}
+            st.session_state.timetable_job = pdf_report.start_render("timetable:calendar_report", inputs,
+                                                                     f"{name}.pdf", owner=get_user_id()).id
+        job = job_outcome("timetable_job", "Building the PDF", "rows")
+        if job:
+            job_download(job, "⬇️ Download PDF")
 
 # --------------- Dynamic Page Content ---------------
 if menu == "🏠 Home":
@@ -1180,3 +1366,5 @@ elif menu == "🤲 Duas & Wazaif":
     duas_wazaif_section()
 elif menu == "🕌 Ramadan":
     ramadan_section()
+
+st.session_state.setdefault("run_timings", {})["full app run"] = round((time.perf_counter() - _run_started) * 1000, 2)
@@ -0,0 +1,211 @@
+"""
+Per-user Quran bookmarks and reading progress.
+
+Bookmarks are ayah positions (surah, ayah) with an optional note, stored
+in SQLite under the user id that app.py keeps in the URL, so they survive
+reloads and follow the same link to another device. Each user's bookmark
+positions are also held in a set once loaded, which makes "is this ayah
+bookmarked?" and toggling O(1) however many bookmarks a user keeps.
+
+Reading progress is the last ayah a user had on screen, for "resume
+reading", plus the furthest ayah reached in every surah, for an overall
+percentage. Recording an unchanged position writes nothing.
+
+    python bookmarks.py [bookmarks]     # list membership vs the store
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import quran_store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+BOOKMARKS_DB_PATH = os.environ.get("JANNAHWAY_BOOKMARKS", os.path.join(DATA_DIR, "bookmarks.sqlite3"))
+MAX_CACHED_USERS = 1000
+
+Bookmark = namedtuple("Bookmark", "surah ayah note created")
+Position = namedtuple("Position", "surah ayah updated")
+
+
+class BookmarkStore:
+    def __init__(self, path=BOOKMARKS_DB_PATH, max_cached_users=MAX_CACHED_USERS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_cached_users = max_cached_users
+        self._lock = threading.Lock()
+        self._marks = OrderedDict()      # user_id -> {(surah, ayah)}, least recently used first
+        self._positions = {}             # user_id -> (surah, ayah) last written
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS bookmarks (
+                user_id TEXT NOT NULL,
+                surah INTEGER NOT NULL,
+                ayah INTEGER NOT NULL,
+                note TEXT NOT NULL DEFAULT '',
+                created REAL NOT NULL,
+                PRIMARY KEY (user_id, surah, ayah)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS positions (
+                user_id TEXT PRIMARY KEY,
+                surah INTEGER NOT NULL,
+                ayah INTEGER NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS furthest (
+                user_id TEXT NOT NULL,
+                surah INTEGER NOT NULL,
+                ayah INTEGER NOT NULL,
+                PRIMARY KEY (user_id, surah)
+            ) WITHOUT ROWID;
+        """)
+
+    def _user_marks(self, user_id):
+        """ The user's bookmark positions; call with the lock held """
+        marks = self._marks.get(user_id)
+        if marks is None:
+            rows = self._conn.execute("SELECT surah, ayah FROM bookmarks WHERE user_id = ?", (user_id,))
+            marks = self._marks[user_id] = set(rows)
+            if len(self._marks) > self.max_cached_users:
+                self._marks.popitem(last=False)
+        else:
+            self._marks.move_to_end(user_id)
+        return marks
+
+    def contains(self, user_id, surah, ayah):
+        with self._lock:
+            return (surah, ayah) in self._user_marks(user_id)
+
+    def add(self, user_id, surah, ayah, note=""):
+        """ Bookmarks the ayah; returns False if it already was """
+        _check(surah, ayah)
+        with self._lock:
+            marks = self._user_marks(user_id)
+            if (surah, ayah) in marks:
+                return False
+            with self._conn:
+                self._conn.execute("INSERT INTO bookmarks (user_id, surah, ayah, note, created) VALUES (?, ?, ?, ?, ?)",
+                                   (user_id, surah, ayah, note, time.time()))
+            marks.add((surah, ayah))
+            return True
+
+    def remove(self, user_id, surah, ayah):
+        """ Returns False if the ayah was not bookmarked """
+        with self._lock:
+            marks = self._user_marks(user_id)
+            if (surah, ayah) not in marks:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM bookmarks WHERE user_id = ? AND surah = ? AND ayah = ?",
+                                   (user_id, surah, ayah))
+            marks.discard((surah, ayah))
+            return True
+
+    def toggle(self, user_id, surah, ayah):
+        """ Adds or removes the bookmark; returns True if the ayah is now bookmarked """
+        return self.add(user_id, surah, ayah) or not self.remove(user_id, surah, ayah)
+
+    def list(self, user_id):
+        """ [Bookmark] in Quran order """
+        with self._lock:
+            rows = self._conn.execute("SELECT surah, ayah, note, created FROM bookmarks WHERE user_id = ? "
+                                      "ORDER BY surah, ayah", (user_id,)).fetchall()
+        return [Bookmark(*row) for row in rows]
+
+    def count(self, user_id):
+        with self._lock:
+            return len(self._user_marks(user_id))
+
+    def clear(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bookmarks WHERE user_id = ?", (user_id,))
+            self._marks[user_id] = set()
+
+    def record_position(self, user_id, surah, ayah):
+        """ Remembers the ayah the user is reading; a no-op while the position is unchanged """
+        _check(surah, ayah)
+        with self._lock:
+            if self._positions.get(user_id) == (surah, ayah):
+                return
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO positions (user_id, surah, ayah, updated) "
+                                   "VALUES (?, ?, ?, ?)", (user_id, surah, ayah, time.time()))
+                self._conn.execute("INSERT INTO furthest (user_id, surah, ayah) VALUES (?, ?, ?) "
+                                   "ON CONFLICT (user_id, surah) DO UPDATE SET ayah = MAX(ayah, excluded.ayah)",
+                                   (user_id, surah, ayah))
+            self._positions[user_id] = (surah, ayah)
+
+    def position(self, user_id):
+        """ Position to resume reading from, or None """
+        with self._lock:
+            row = self._conn.execute("SELECT surah, ayah, updated FROM positions WHERE user_id = ?",
+                                     (user_id,)).fetchone()
+        return Position(*row) if row else None
+
+    def progress(self, user_id):
+        """ (ayahs read, ayahs in the Quran), counting every surah up to the furthest ayah reached """
+        with self._lock:
+            read = self._conn.execute("SELECT COALESCE(SUM(ayah), 0) FROM furthest WHERE user_id = ?",
+                                      (user_id,)).fetchone()[0]
+        return read, quran_store.AYAH_TOTAL
+
+    def surah_progress(self, user_id):
+        """ {surah: furthest ayah reached} """
+        with self._lock:
+            return dict(self._conn.execute("SELECT surah, ayah FROM furthest WHERE user_id = ?", (user_id,)))
+
+
+def _check(surah, ayah):
+    if not 1 <= surah <= quran_store.SURAH_COUNT or not 1 <= ayah <= quran_store.AYAH_COUNTS[surah - 1]:
+        raise ValueError(f"there is no ayah {surah}:{ayah}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bookmarks():
+    """ Process-wide bookmark store """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BookmarkStore()
+        return _store
+
+
+# --------------- Benchmark ---------------
+
+def bench(n=5000, lookups=20000):
+    import random
+
+    rng = random.Random(7)
+    ayahs = [(s, a) for s in range(1, quran_store.SURAH_COUNT + 1) for a in range(1, quran_store.AYAH_COUNTS[s - 1] + 1)]
+    marks = rng.sample(ayahs, n)
+    probes = [rng.choice(ayahs) for _ in range(lookups)]
+    names = [f"Surah {s}:{a}" for s, a in marks]  # the old session list of strings
+
+    store = BookmarkStore(":memory:")
+    started = time.perf_counter()
+    for surah, ayah in marks:
+        store.add("bench", surah, ayah)
+    added = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hits_list = sum(f"Surah {s}:{a}" in names for s, a in probes)
+    as_list = time.perf_counter() - started
+    started = time.perf_counter()
+    hits_store = sum(store.contains("bench", s, a) for s, a in probes)
+    as_store = time.perf_counter() - started
+
+    print(f"{n} bookmarks added in {added * 1000:.0f} ms; {lookups} lookups:")
+    for label, elapsed in (("session list", as_list), ("bookmark store", as_store)):
+        print(f"  {label:15} {elapsed * 1000:8.1f} ms   {elapsed / lookups * 1e6:8.2f} µs each")
+    print(f"  same answers: {hits_list == hits_store}")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,111 @@
+"""
+Static content registry: divine names, adhkar, duas and city coordinates.
+
+The content lives in versioned JSON files under content/ (listed in
+content/manifest.json) and is loaded once per process into immutable,
+tuple-backed records. Sections only read from the registry, so nothing is
+rebuilt per rerun. Editing the files and bumping the manifest version is
+picked up by running processes within RELOAD_CHECK_SECONDS, without a
+deploy.
+
+    python content_registry.py     # load-time and per-rerun allocation benchmark
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from types import MappingProxyType
+
+CONTENT_DIR = os.environ.get("JANNAHWAY_CONTENT_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "content"))
+MANIFEST = "manifest.json"
+RELOAD_CHECK_SECONDS = 30
+
+# namedtuples: immutable, no per-instance __dict__, and still unpack like the old (a, b) tuples
+Name = namedtuple("Name", ["arabic", "english"])
+Dua = namedtuple("Dua", ["title", "arabic"])
+City = namedtuple("City", ["name", "country", "latitude", "longitude", "timezone"])
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ContentRegistry:
+    __slots__ = ("version", "asma", "prophet_names", "adhkar", "duas", "cities")
+
+    def __init__(self, content_dir=CONTENT_DIR):
+        manifest = _read_json(os.path.join(content_dir, MANIFEST))
+        files = {key: os.path.join(content_dir, name) for key, name in manifest["files"].items()}
+        self.version = manifest["version"]
+        self.asma = tuple(Name(n["arabic"], n["english"]) for n in _read_json(files["asma"])["names"])
+        self.prophet_names = tuple(Name(n["arabic"], n["english"])
+                                   for n in _read_json(files["prophet_names"])["names"])
+        self.adhkar = tuple(_read_json(files["adhkar"])["adhkar"])
+        self.duas = MappingProxyType({
+            category["name"]: tuple(Dua(d["title"], d["arabic"]) for d in category["duas"])
+            for category in _read_json(files["duas"])["categories"]
+        })
+        # (country, lowercased city name) -> City, for offline prayer times
+        self.cities = MappingProxyType({
+            (c["country"], c["name"].lower()): City(c["name"], c["country"], c["latitude"], c["longitude"], c["timezone"])
+            for c in _read_json(files["cities"])["cities"]
+        })
+
+
+_registry = None
+_manifest_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_registry():
+    """ Process-wide registry; reloaded when manifest.json changes on disk """
+    global _registry, _manifest_mtime, _checked_at
+    now = time.monotonic()
+    if _registry is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _registry
+    with _lock:
+        _checked_at = now
+        mtime = os.path.getmtime(os.path.join(CONTENT_DIR, MANIFEST))
+        if _registry is None or mtime != _manifest_mtime:
+            registry = ContentRegistry()
+            if _registry is None or registry.version != _registry.version:
+                _registry = registry
+            _manifest_mtime = mtime
+        return _registry
+
+
+def bench():
+    started = time.perf_counter()
+    registry = ContentRegistry()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    # What the sections used to do on every rerun: rebuild the literal lists
+    tracemalloc.start()
+    rebuilt = (
+        [(n.arabic, n.english) for n in registry.asma],
+        [(n.arabic, n.english) for n in registry.prophet_names],
+        [d for d in registry.adhkar],
+        {c: [(d.title, d.arabic) for d in duas] for c, duas in registry.duas.items()},
+    )
+    literal_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    get_registry()  # loaded once per process, like app startup
+    tracemalloc.start()
+    shared = (get_registry().asma, get_registry().prophet_names, get_registry().adhkar, get_registry().duas)
+    registry_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"load all content files: {load_ms:.2f} ms (once per process)")
+    print(f"per rerun, rebuilding the literals: {literal_bytes / 1024:.1f} KiB allocated")
+    print(f"per rerun, reading the registry:    {registry_bytes / 1024:.1f} KiB allocated")
+    return rebuilt, shared
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,111 @@
+"""
+One search index over the app's static collections: adhkar, duas, Asma ul
+Husna and the names of the Prophet ﷺ.
+
+Everything is indexed once at import, and again only if the content
+registry loads a new version. Text is lowercased and Arabic is
+stripped of diacritics with alef/hamza forms unified, so "الرحمن" finds
+"ٱلْرَّحْمَـٰنُ". Lookups go through a trigram index: exact substring hits
+rank first, then near matches by trigram overlap, which tolerates typos like
+"subhanalah". Only documents sharing a trigram with the query are ever
+looked at, so cost follows the number of matches, not the collection size.
+"""
+from collections import defaultdict
+
+import content_registry
+from quran_search import normalize_arabic
+
+ADHKAR = "adhkar"
+DUAS = "duas"
+ASMA = "asma"
+PROPHET_NAMES = "prophet_names"
+
+MIN_SIMILARITY = 0.5
+
+
+def normalize(text):
+    return " ".join(normalize_arabic(text).lower().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Document:
+    __slots__ = ("doc_id", "collection", "key", "text")
+
+    def __init__(self, doc_id, collection, key, text):
+        self.doc_id = doc_id
+        self.collection = collection
+        self.key = key    # what the section uses to find the item again
+        self.text = text  # normalized searchable text
+
+
+class ContentSearch:
+    def __init__(self, entries):
+        """ entries: iterable of (collection, key, searchable text) """
+        self.docs = []
+        self._postings = defaultdict(list)  # trigram -> doc ids, ascending
+        for collection, key, text in entries:
+            self.add(collection, key, text)
+
+    def add(self, collection, key, text):
+        doc = Document(len(self.docs), collection, key, normalize(text))
+        self.docs.append(doc)
+        for gram in trigrams(doc.text):
+            self._postings[gram].append(doc.doc_id)
+        return doc
+
+    def search(self, query, collection=None, limit=None, min_similarity=MIN_SIMILARITY):
+        """ Returns matching keys, exact substring matches first, then closest fuzzy matches """
+        query = normalize(query)
+        if not query:
+            return []
+        if len(query) < 3:
+            # Too short for trigrams to say anything; plain substring scan
+            return [d.key for d in self.docs if (not collection or d.collection == collection) and query in d.text][:limit]
+        query_grams = trigrams(query)
+        overlap = defaultdict(int)
+        for gram in query_grams:
+            for doc_id in self._postings.get(gram, ()):
+                overlap[doc_id] += 1
+
+        exact, fuzzy = [], []
+        for doc_id, shared in overlap.items():
+            doc = self.docs[doc_id]
+            if collection and doc.collection != collection:
+                continue
+            if query in doc.text:
+                exact.append(doc)
+            elif shared / len(query_grams) >= min_similarity:
+                fuzzy.append((shared / len(query_grams), doc))
+
+        exact.sort(key=lambda d: d.doc_id)
+        fuzzy.sort(key=lambda item: (-item[0], item[1].doc_id))
+        results = [doc.key for doc in exact] + [doc.key for _, doc in fuzzy]
+        return results[:limit] if limit else results
+
+
+def _registry_entries(registry):
+    for dhikr in registry.adhkar:
+        yield ADHKAR, dhikr, dhikr
+    for category, duas in registry.duas.items():
+        for title, dua in duas:
+            yield DUAS, (category, title, dua), f"{title} {dua}"
+    for i, (arabic, english) in enumerate(registry.asma):
+        yield ASMA, i, f"{arabic} {english}"
+    for i, (arabic, english) in enumerate(registry.prophet_names):
+        yield PROPHET_NAMES, i, f"{arabic} {english}"
+
+
+_indexed_registry = content_registry.get_registry()
+index = ContentSearch(_registry_entries(_indexed_registry))
+
+
+def search(query, collection=None, limit=None):
+    global index, _indexed_registry
+    registry = content_registry.get_registry()
+    if registry is not _indexed_registry:
+        index, _indexed_registry = ContentSearch(_registry_entries(registry)), registry
+    return index.search(query, collection, limit)
@@ -0,0 +1,262 @@
+"""
+Durable per-user tasbeeh counters.
+
+CounterStore sits in front of a pluggable backend and coalesces writes in
+memory: a thousand taps on one dhikr become a single "+1000" row update,
+flushed by a background thread every few seconds (or sooner when many
+updates are pending, and once more at exit).
+
+Backends:
+    SQLiteCounterBackend  default, WAL mode, one row per (user, dhikr)
+    RedisCounterBackend   one hash per user; works with a redis-py client or
+                          with FakeRedis, the in-memory stand-in for tests
+"""
+import atexit
+import fnmatch
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import defaultdict
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+COUNTER_DB_PATH = os.environ.get("JANNAHWAY_COUNTER_DB", os.path.join(DATA_DIR, "tasbeeh_counts.sqlite3"))
+FLUSH_INTERVAL = 2.0  # seconds
+MAX_PENDING = 500     # pending (user, dhikr) updates that force an early flush
+
+ADD = "add"
+SET = "set"
+
+
+class SQLiteCounterBackend:
+    def __init__(self, path=COUNTER_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS counts (
+                user_id TEXT NOT NULL,
+                dhikr TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, dhikr)
+            )
+        """)
+
+    def get_counts(self, user_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT dhikr, count FROM counts WHERE user_id = ?", (user_id,)).fetchall()
+        return dict(rows)
+
+    def totals(self):
+        """ {dhikr: count summed over all users} """
+        with self._lock:
+            return dict(self._conn.execute("SELECT dhikr, SUM(count) FROM counts GROUP BY dhikr"))
+
+    def apply_batch(self, ops):
+        """ ops: [(user_id, dhikr, ADD|SET, value)], written in one transaction """
+        now = time.time()
+        adds = [(u, d, v, now, v, now) for u, d, op, v in ops if op == ADD]
+        sets = [(u, d, v, now) for u, d, op, v in ops if op == SET]
+        with self._lock, self._conn:
+            if sets:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO counts (user_id, dhikr, count, updated_at) VALUES (?, ?, ?, ?)", sets)
+            if adds:
+                self._conn.executemany(
+                    "INSERT INTO counts (user_id, dhikr, count, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, dhikr) DO UPDATE SET count = count + ?, updated_at = ?", adds)
+
+
+class FakeRedis:
+    """ In-memory stand-in for the few redis-py hash commands the counters use """
+
+    def __init__(self):
+        self._hashes = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def hgetall(self, name):
+        with self._lock:
+            return {k.encode(): str(v).encode() for k, v in self._hashes.get(name, {}).items()}
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            self._hashes[name][key] = int(self._hashes[name].get(key, 0)) + amount
+            return self._hashes[name][key]
+
+    def hset(self, name, key, value):
+        with self._lock:
+            self._hashes[name][key] = int(value)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            names = list(self._hashes)
+        return (name.encode() for name in names if fnmatch.fnmatchcase(name, match))
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def hincrby(self, *args):
+        self._calls.append(("hincrby", args))
+        return self
+
+    def hset(self, *args):
+        self._calls.append(("hset", args))
+        return self
+
+    def execute(self):
+        return [getattr(self._redis, name)(*args) for name, args in self._calls]
+
+
+class RedisCounterBackend:
+    def __init__(self, client, prefix="jannahway:tasbeeh:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get_counts(self, user_id):
+        raw = self.client.hgetall(self.prefix + user_id)
+        return {k.decode(): int(v) for k, v in raw.items()}
+
+    def totals(self):
+        totals = defaultdict(int)
+        for name in self.client.scan_iter(match=self.prefix + "*"):
+            for dhikr, count in self.client.hgetall(name.decode()).items():
+                totals[dhikr.decode()] += int(count)
+        return dict(totals)
+
+    def apply_batch(self, ops):
+        pipe = self.client.pipeline()
+        for user_id, dhikr, op, value in ops:
+            if op == ADD:
+                pipe.hincrby(self.prefix + user_id, dhikr, value)
+            else:
+                pipe.hset(self.prefix + user_id, dhikr, value)
+        pipe.execute()
+
+
+class CounterStore:
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, background=True):
+        self.backend = backend
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = {}  # (user_id, dhikr) -> [op, value]
+        self.flushes = 0
+        self.writes_coalesced = 0
+        self._listeners = []
+        self._stop = threading.Event()
+        if background:
+            self._thread = threading.Thread(target=self._run, args=(flush_interval,), daemon=True,
+                                            name="tasbeeh-flusher")
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                # The batch is pending again; one failed write (e.g. "database is locked") mustn't stop the thread
+                traceback.print_exc()
+
+    def add_listener(self, listener):
+        """ listener(user_id, dhikr, op, value) is called for every update, before it is queued """
+        self._listeners.append(listener)
+
+    def _queue(self, user_id, dhikr, op, value):
+        for listener in self._listeners:
+            listener(user_id, dhikr, op, value)
+        with self._lock:
+            key = (user_id, dhikr)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = [op, value]
+            else:
+                self.writes_coalesced += 1
+                if op == SET:
+                    pending[:] = [SET, value]
+                else:
+                    pending[1] += value  # add on top of a pending add or set
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def increment(self, user_id, dhikr, amount=1):
+        self._queue(user_id, dhikr, ADD, amount)
+
+    def set(self, user_id, dhikr, value):
+        self._queue(user_id, dhikr, SET, value)
+
+    def reset(self, user_id, dhikr):
+        self._queue(user_id, dhikr, SET, 0)
+
+    def counts(self, user_id):
+        """ Persisted counts with this user's unflushed updates applied """
+        counts = self.backend.get_counts(user_id)
+        with self._lock:
+            pending = [(d, op, v) for (u, d), (op, v) in self._pending.items() if u == user_id]
+        for dhikr, op, value in pending:
+            counts[dhikr] = value if op == SET else counts.get(dhikr, 0) + value
+        return counts
+
+    def totals(self):
+        """ Counts summed over all users, persisted ones only """
+        return self.backend.totals()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            ops = [(u, d, op, v) for (u, d), (op, v) in self._pending.items()]
+            self._pending = {}
+        try:
+            self.backend.apply_batch(ops)
+        except Exception:
+            # Put the batch back (newer updates win) and let the next flush retry
+            with self._lock:
+                for user_id, dhikr, op, value in ops:
+                    newer = self._pending.get((user_id, dhikr))
+                    if newer is None:
+                        self._pending[(user_id, dhikr)] = [op, value]
+                    elif newer[0] == ADD:
+                        self._pending[(user_id, dhikr)] = [op, value + newer[1]]
+            raise
+        self.flushes += 1
+        return len(ops)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+def create_backend(kind=None):
+    kind = kind or os.environ.get("JANNAHWAY_COUNTER_BACKEND", "sqlite")
+    if kind == "redis":
+        import redis  # optional dependency, only needed for this backend
+
+        return RedisCounterBackend(redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0")))
+    if kind == "memory":
+        return RedisCounterBackend(FakeRedis())
+    return SQLiteCounterBackend()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """ Process-wide counter store, flushed once more when the process exits """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CounterStore(create_backend())
+            atexit.register(_store.close)
+        return _store
@@ -0,0 +1,301 @@
+"""
+Streaming import of dhikr counts from other counter apps.
+
+Reads "dhikr:count" text, CSV (a dhikr and a count column, header
+optional) or JSON Lines ({"dhikr": ..., "count": ...} per line) one line
+at a time from a binary file, so a file of any size is imported in
+constant memory. Bad lines are recorded in the report and skipped; the
+rest are applied to the counter store with one of three merge modes and
+flushed every BATCH_LINES lines.
+
+    add      imported counts are added to the user's counts
+    replace  imported counts overwrite them (later lines win)
+    max      the higher of the two is kept
+
+    python dhikr_import.py FILE --user UID [--mode add|replace|max] [--format text|csv|jsonl]
+    python dhikr_import.py --bench [lines]     # throughput and peak memory vs the old parser
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import counter_store
+import jobs
+
+FORMATS = ("text", "csv", "jsonl")
+MODES = ("add", "replace", "max")
+BATCH_LINES = 5000
+MAX_ERRORS = 200        # line-level errors kept in the report; the rest are only counted
+MAX_DHIKR_LENGTH = 300
+MAX_COUNT = 10 ** 9
+DHIKR_KEYS = ("dhikr", "name", "phrase", "title")
+COUNT_KEYS = ("count", "value", "total", "counter")
+EXTENSIONS = {".txt": "text", ".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl"}
+
+
+class LineError(ValueError):
+    pass
+
+
+def detect_format(name, first_line=""):
+    """ Format from the file extension, or from the first line when the extension says nothing """
+    fmt = EXTENSIONS.get(os.path.splitext(name or "")[1].lower())
+    if fmt:
+        return fmt
+    first_line = first_line.strip()
+    if first_line.startswith("{"):
+        return "jsonl"
+    if "," in first_line and ":" not in first_line:
+        return "csv"
+    return "text"
+
+
+def _count(value):
+    try:
+        count = int(str(value).strip())
+    except ValueError:
+        raise LineError(f"count {str(value).strip()[:20]!r} is not a whole number") from None
+    if count < 0:
+        raise LineError("count is negative")
+    if count > MAX_COUNT:
+        raise LineError(f"count is larger than {MAX_COUNT:,}")
+    return count
+
+
+def _record(dhikr, count):
+    dhikr = str(dhikr).strip()
+    if not dhikr:
+        raise LineError("dhikr is empty")
+    if len(dhikr) > MAX_DHIKR_LENGTH:
+        raise LineError(f"dhikr is longer than {MAX_DHIKR_LENGTH} characters")
+    return dhikr, _count(count)
+
+
+def _lines(f, position):
+    """ Decoded lines of a binary file; position[0] tracks the bytes consumed """
+    for raw in f:
+        position[0] += len(raw)
+        yield raw.decode("utf-8-sig" if position[0] == len(raw) else "utf-8", errors="replace")
+
+
+def _text_records(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        dhikr, sep, count = line.rpartition(":")  # the dhikr itself may contain a colon
+        if not sep:
+            yield number, LineError("expected dhikr:count"), line
+        else:
+            yield number, (dhikr, count), line
+
+
+def _csv_records(lines):
+    reader = csv.reader(lines)
+    columns = None
+    for row in reader:
+        number = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            header = [cell.strip().lower() for cell in row]
+            dhikr_col = next((header.index(k) for k in DHIKR_KEYS if k in header), None)
+            count_col = next((header.index(k) for k in COUNT_KEYS if k in header), None)
+            if dhikr_col is not None and count_col is not None:
+                columns = (dhikr_col, count_col)
+                continue
+            columns = (0, 1)  # no header: dhikr, count
+        if len(row) <= max(columns):
+            yield number, LineError(f"expected at least {max(columns) + 1} columns"), ",".join(row)
+        else:
+            yield number, (row[columns[0]], row[columns[1]]), ",".join(row)
+
+
+def _jsonl_records(lines):
+    for number, line in enumerate(lines, start=1):
+        line = line.strip().rstrip(",")
+        if not line or line in ("[", "]"):  # tolerate a small JSON array written one object per line
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield number, LineError(f"invalid JSON ({e.msg})"), line
+            continue
+        if not isinstance(obj, dict):
+            yield number, LineError("expected a JSON object"), line
+            continue
+        dhikr = next((obj[k] for k in DHIKR_KEYS if k in obj), None)
+        count = next((obj[k] for k in COUNT_KEYS if k in obj), None)
+        if dhikr is None or count is None:
+            yield number, LineError("expected \"dhikr\" and \"count\" keys"), line
+        else:
+            yield number, (dhikr, count), line
+
+
+_READERS = {"text": _text_records, "csv": _csv_records, "jsonl": _jsonl_records}
+
+
+def import_counts(f, user_id, mode="add", fmt="text", store=None, progress=None, size=None):
+    """
+    Streams records from the binary file f into the counter store; returns
+    the report dict. progress(bytes read, size) is called once per batch.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown merge mode {mode!r}; expected one of {MODES}")
+    if fmt not in _READERS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {FORMATS}")
+    store = store or counter_store.get_store()
+    current = store.counts(user_id) if mode == "max" else None
+    started = time.perf_counter()
+    position = [0]
+    report = {"format": fmt, "mode": mode, "lines": 0, "imported": 0, "skipped": 0, "errors": []}
+
+    for number, record, line in _READERS[fmt](_lines(f, position)):
+        report["lines"] += 1
+        try:
+            if isinstance(record, LineError):
+                raise record
+            dhikr, count = _record(*record)
+        except LineError as e:
+            report["skipped"] += 1
+            if len(report["errors"]) < MAX_ERRORS:
+                report["errors"].append({"line": number, "error": str(e), "text": line.strip()[:80]})
+            continue
+        if mode == "add":
+            store.increment(user_id, dhikr, count)
+        elif mode == "replace":
+            store.set(user_id, dhikr, count)
+        elif count > current.get(dhikr, -1):
+            current[dhikr] = count
+            store.set(user_id, dhikr, count)
+        report["imported"] += 1
+        if report["lines"] % BATCH_LINES == 0:
+            store.flush()
+            if progress:
+                progress(position[0], size)
+    store.flush()
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def run_import_job(params, progress):
+    """
+    jobs handler: params has user_id, mode, format and either the pasted
+    text or the path of an uploaded file, which is removed afterwards.
+    """
+    path = params.get("path")
+    try:
+        if path:
+            size = os.path.getsize(path)
+            f = open(path, "rb")
+        else:
+            data = params["text"].encode("utf-8")
+            size, f = len(data), io.BytesIO(data)
+        with f:
+            report = import_counts(f, params["user_id"], params.get("mode", "add"), params.get("format", "text"),
+                                   progress=progress, size=size)
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+    return jobs.Result(summary=report)
+
+
+jobs.register("dhikr-import", "dhikr_import:run_import_job")
+
+
+def save_upload(uploaded, directory=None):
+    """ Copies an uploaded file object to disk in chunks; returns the path for the import job """
+    directory = directory or os.path.join(jobs.ARTIFACTS_DIR, "uploads")
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(getattr(uploaded, "name", ""))[1])
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = uploaded.read(1 << 20)
+            if not chunk:
+                break
+            out.write(chunk)
+    return path
+
+
+# --------------- Benchmark ---------------
+
+def _sample_file(path, n_lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_lines):
+            f.write(f"SubhanAllah wa bihamdihi {i % 997}:{i % 100}\n" if i % 1000 else "not a count line\n")
+
+
+def _old_parser(text):
+    """ What the Import button used to do with the pasted text """
+    counts = {}
+    for line in text.strip().split("\n"):
+        if ":" in line:
+            dhikr, count = line.split(":", 1)
+            counts[dhikr.strip()] = int(count.strip())
+    return counts
+
+
+def _measure(run):
+    started = time.perf_counter()
+    outcome = run()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()  # separate run: tracing slows the parsing down several times
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, outcome
+
+
+def bench(n_lines=500000):
+    def streaming():
+        store = counter_store.CounterStore(counter_store.RedisCounterBackend(counter_store.FakeRedis()),
+                                           background=False)
+        with open(path, "rb") as f:
+            report = import_counts(f, "bench", "add", "text", store=store)
+        return f"{report['imported']} imported, {report['skipped']} skipped"
+
+    def old():
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f"{len(_old_parser(f.read()))} counts"
+        except ValueError as e:
+            return f"aborted: {e}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "counts.txt")
+        _sample_file(path, n_lines)
+        print(f"{n_lines} lines, {os.path.getsize(path) / 2**20:.1f} MiB, 1 bad line in 1000")
+        for label, run in (("streaming import", streaming), ("old parser", old)):
+            elapsed, peak, outcome = _measure(run)
+            print(f"  {label:16} {elapsed:6.2f} s   peak {peak / 2**20:6.1f} MiB   {outcome}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--user")
+    parser.add_argument("--mode", choices=MODES, default="add")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--bench", nargs="?", const=500000, type=int, metavar="LINES")
+    args = parser.parse_args(argv)
+    if args.bench:
+        bench(args.bench)
+        return 0
+    if not args.file or not args.user:
+        parser.error("FILE and --user are required")
+    with open(args.file, "rb") as f:
+        first = f.readline().decode("utf-8", errors="replace")
+        f.seek(0)
+        report = import_counts(f, args.user, args.mode, args.format or detect_format(args.file, first))
+    counter_store.get_store().close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+Append-only log of dhikr increments, with rollups and streaks.
+
+Every increment becomes an event (timestamp, dhikr, delta). Events are
+buffered in memory and written by a background thread, like the counters,
+into per-user chunks of CHUNK_EVENTS events stored column by column: three
+packed arrays (uint32 seconds, uint32 dhikr id, int32 delta), 12 bytes an
+event. Only a user's newest chunk is ever rewritten; full chunks are
+sealed.
+
+The same flush adds each batch into daily and weekly rollups per dhikr and
+advances the user's streak, so charts read a few hundred pre-summed rows
+no matter how many years of events sit behind them. Reads add the events
+still buffered on top instead of flushing them, so a chart redrawn after
+every tap costs no write. Days are local calendar days of the server.
+
+    python dhikr_log.py [years]     # write a synthetic history, then time the reads
+"""
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from array import array
+from collections import defaultdict
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+LOG_DB_PATH = os.environ.get("JANNAHWAY_DHIKR_LOG", os.path.join(DATA_DIR, "dhikr_log.sqlite3"))
+CHUNK_EVENTS = 4096
+FLUSH_INTERVAL = 2.0   # seconds
+MAX_PENDING = 2000     # buffered events that force an early flush
+
+DAY = "day"
+WEEK = "week"
+
+
+def day_of(ts):
+    return date.fromtimestamp(ts).toordinal()
+
+
+def week_of(day):
+    """ Ordinal of the Monday starting the week that contains day (an ordinal) """
+    return day - date.fromordinal(day).weekday()
+
+
+def _streak_step(streak, days):
+    """ (last_day, current, longest, active_days) advanced over the active day ordinals """
+    last_day, current, longest, active_days = streak
+    for day in sorted(days):
+        if day <= last_day:
+            continue  # late event for a day already counted
+        current = current + 1 if day == last_day + 1 else 1
+        longest = max(longest, current)
+        last_day = day
+        active_days += 1
+    return last_day, current, longest, active_days
+
+
+class DhikrLog:
+    def __init__(self, path=LOG_DB_PATH, chunk_events=CHUNK_EVENTS, flush_interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING, background=True):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.chunk_events = chunk_events
+        self.max_pending = max_pending
+        self._lock = threading.Lock()        # the pending buffer
+        self._db_lock = threading.Lock()     # the connection and the cached tail chunks; held for a whole flush
+        self._pending = []                   # (user_id, ts, dhikr, delta)
+        self._tails = {}                     # user_id -> (chunk_no, ts, dhikr ids, deltas) of the open chunk
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dhikr_names (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                user_id TEXT NOT NULL,
+                chunk_no INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                first_ts INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+                ts BLOB NOT NULL,
+                dhikr BLOB NOT NULL,
+                delta BLOB NOT NULL,
+                PRIMARY KEY (user_id, chunk_no)
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                user_id TEXT NOT NULL,
+                period TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                dhikr INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (user_id, period, start, dhikr)
+            );
+            CREATE TABLE IF NOT EXISTS streaks (
+                user_id TEXT PRIMARY KEY,
+                last_day INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                longest INTEGER NOT NULL,
+                active_days INTEGER NOT NULL
+            );
+        """)
+        self._names = dict(self._conn.execute("SELECT name, id FROM dhikr_names"))
+        self._ids = {i: name for name, i in self._names.items()}
+        self.flushes = 0
+        self._stop = threading.Event()
+        if background:
+            self._thread = threading.Thread(target=self._run, args=(flush_interval,), daemon=True,
+                                            name="dhikr-log-flusher")
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                # The events are pending again; one failed write (e.g. "database is locked") mustn't stop the thread
+                traceback.print_exc()
+
+    # ---- writes ----
+    def record(self, user_id, dhikr, delta=1, ts=None):
+        with self._lock:
+            self._pending.append((user_id, int(ts if ts is not None else time.time()), dhikr, delta))
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def _dhikr_id(self, name):
+        dhikr_id = self._names.get(name)
+        if dhikr_id is None:
+            dhikr_id = self._conn.execute("INSERT INTO dhikr_names (name) VALUES (?)", (name,)).lastrowid
+            self._names[name] = dhikr_id
+            self._ids[dhikr_id] = name
+        return dhikr_id
+
+    def _tail(self, user_id):
+        tail = self._tails.get(user_id)
+        if tail is None:
+            row = self._conn.execute("SELECT chunk_no, n, ts, dhikr, delta FROM chunks WHERE user_id = ? "
+                                     "ORDER BY chunk_no DESC LIMIT 1", (user_id,)).fetchone()
+            if row is None or row[1] >= self.chunk_events:
+                tail = ((row[0] + 1) if row else 0, array("I"), array("I"), array("i"))
+            else:
+                tail = (row[0], array("I", row[2]), array("I", row[3]), array("i", row[4]))
+            self._tails[user_id] = tail
+        return tail
+
+    def _append(self, user_id, events):
+        """ Appends (ts, dhikr id, delta) events, sealing chunks as they fill; returns chunk rows to write """
+        rows = []
+        chunk_no, ts, ids, deltas = self._tail(user_id)
+        for event_ts, dhikr_id, delta in events:
+            if len(ts) >= self.chunk_events:
+                rows.append((user_id, chunk_no, len(ts), ts[0], ts[-1], ts.tobytes(), ids.tobytes(), deltas.tobytes()))
+                chunk_no, ts, ids, deltas = chunk_no + 1, array("I"), array("I"), array("i")
+            ts.append(event_ts)
+            ids.append(dhikr_id)
+            deltas.append(delta)
+        rows.append((user_id, chunk_no, len(ts), ts[0], ts[-1], ts.tobytes(), ids.tobytes(), deltas.tobytes()))
+        self._tails[user_id] = (chunk_no, ts, ids, deltas)
+        return rows
+
+    def _advance_streak(self, user_id, days):
+        row = self._conn.execute("SELECT last_day, current, longest, active_days FROM streaks WHERE user_id = ?",
+                                 (user_id,)).fetchone()
+        self._conn.execute("INSERT OR REPLACE INTO streaks (user_id, last_day, current, longest, active_days) "
+                           "VALUES (?, ?, ?, ?, ?)", (user_id, *_streak_step(row or (0, 0, 0, 0), days)))
+
+    def flush(self):
+        # One flush at a time, taking the buffer under the db lock, so batches are applied in the
+        # order they were recorded (the streak only moves forward) and a read never sees a batch
+        # that has left the buffer but is not written yet
+        with self._db_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, []
+            by_user = defaultdict(list)
+            rollups = defaultdict(int)
+            try:
+                with self._conn:
+                    for user_id, ts, dhikr, delta in pending:
+                        dhikr_id = self._dhikr_id(dhikr)
+                        by_user[user_id].append((ts, dhikr_id, delta))
+                        day = day_of(ts)
+                        rollups[(user_id, DAY, day, dhikr_id)] += delta
+                        rollups[(user_id, WEEK, week_of(day), dhikr_id)] += delta
+                    for user_id, events in by_user.items():
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO chunks (user_id, chunk_no, n, first_ts, last_ts, ts, dhikr, delta) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._append(user_id, events))
+                        self._advance_streak(user_id, {day_of(ts) for ts, _, delta in events if delta > 0})
+                    self._conn.executemany(
+                        "INSERT INTO rollups (user_id, period, start, dhikr, total) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (user_id, period, start, dhikr) DO UPDATE SET total = total + excluded.total",
+                        [(*key, total) for key, total in rollups.items()])
+            except Exception:
+                # Rolled back: forget the cached tails and names, and put the events back for the next flush
+                self._tails.clear()
+                self._names = dict(self._conn.execute("SELECT name, id FROM dhikr_names"))
+                self._ids = {i: name for name, i in self._names.items()}
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+        self.flushes += 1
+        return len(pending)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    # ---- reads (persisted rows plus the events still buffered) ----
+    def _buffered(self, user_id):
+        """ This user's (ts, dhikr, delta) events not flushed yet; call with the db lock held """
+        with self._lock:
+            return [(ts, dhikr, delta) for u, ts, dhikr, delta in self._pending if u == user_id]
+
+    def totals(self, user_id, period=DAY, since=None, dhikr=None):
+        """ {start date: total} per day or week (the Monday), for all adhkar or one """
+        since = since.toordinal() if since else 0
+        query = "SELECT start, SUM(total) FROM rollups WHERE user_id = ? AND period = ? AND start >= ?"
+        args = [user_id, period, since]
+        with self._db_lock:
+            dhikr_id = self._names.get(dhikr)
+            if dhikr is None or dhikr_id is not None:
+                if dhikr is not None:
+                    query += " AND dhikr = ?"
+                    args.append(dhikr_id)
+                totals = dict(self._conn.execute(query + " GROUP BY start", args).fetchall())
+            else:
+                totals = {}
+            buffered = self._buffered(user_id)
+        for ts, name, delta in buffered:
+            if dhikr is None or name == dhikr:
+                start = day_of(ts) if period == DAY else week_of(day_of(ts))
+                if start >= since:
+                    totals[start] = totals.get(start, 0) + delta
+        return {date.fromordinal(start): totals[start] for start in sorted(totals)}
+
+    def series(self, user_id, period=DAY, count=30, dhikr=None, today=None):
+        """ The last `count` days or weeks up to today, zeros included, oldest first """
+        step = 7 if period == WEEK else 1
+        end = (today or date.today()).toordinal()
+        if period == WEEK:
+            end = week_of(end)
+        starts = [date.fromordinal(end - step * i) for i in range(count - 1, -1, -1)]
+        totals = self.totals(user_id, period, starts[0], dhikr)
+        return [(start, totals.get(start, 0)) for start in starts]
+
+    def dhikr_names(self, user_id):
+        """ Adhkar this user has logged, most recited first """
+        with self._db_lock:
+            rows = self._conn.execute("SELECT dhikr, SUM(total) FROM rollups WHERE user_id = ? AND period = ? "
+                                      "GROUP BY dhikr", (user_id, WEEK)).fetchall()
+            totals = {self._ids[dhikr_id]: total for dhikr_id, total in rows}
+            buffered = self._buffered(user_id)
+        for _, name, delta in buffered:
+            totals[name] = totals.get(name, 0) + delta
+        return sorted(totals, key=totals.get, reverse=True)
+
+    def streak(self, user_id, today=None):
+        """ (current streak, longest streak, active days); the current one survives until a full day is missed """
+        with self._db_lock:
+            row = self._conn.execute("SELECT last_day, current, longest, active_days FROM streaks WHERE user_id = ?",
+                                     (user_id,)).fetchone()
+            buffered = self._buffered(user_id)
+        last_day, current, longest, active_days = _streak_step(
+            row or (0, 0, 0, 0), {day_of(ts) for ts, _, delta in buffered if delta > 0})
+        if not active_days:
+            return 0, 0, 0
+        today = (today or date.today()).toordinal()
+        return (current if last_day >= today - 1 else 0), longest, active_days
+
+    def columns(self, user_id, since_ts=0):
+        """
+        (ts, dhikr ids, deltas) numpy arrays over this user's raw events from
+        since_ts on; buffered events of an adhkar logged for the first time
+        since the last flush have no id yet and carry 0.
+        """
+        with self._db_lock:
+            rows = self._conn.execute("SELECT ts, dhikr, delta FROM chunks WHERE user_id = ? AND last_ts >= ? "
+                                      "ORDER BY chunk_no", (user_id, since_ts)).fetchall()
+            buffered = [(ts, self._names.get(name, 0), delta) for ts, name, delta in self._buffered(user_id)]
+        ts = [np.frombuffer(r[0], np.uint32) for r in rows]
+        ids = [np.frombuffer(r[1], np.uint32) for r in rows]
+        deltas = [np.frombuffer(r[2], np.int32) for r in rows]
+        if buffered:
+            columns = list(zip(*buffered))
+            ts.append(np.array(columns[0], np.uint32))
+            ids.append(np.array(columns[1], np.uint32))
+            deltas.append(np.array(columns[2], np.int32))
+        if not ts:
+            return np.empty(0, np.uint32), np.empty(0, np.uint32), np.empty(0, np.int32)
+        ts, ids, deltas = np.concatenate(ts), np.concatenate(ids), np.concatenate(deltas)
+        keep = ts >= since_ts
+        return ts[keep], ids[keep], deltas[keep]
+
+    def hour_profile(self, user_id, days=90, tz=None):
+        """
+        Dhikr recited in each local hour of the day over the last `days` days,
+        in the zone named by tz or the server's. Every event gets the UTC
+        offset in force at its own time, so hours stay right across DST changes.
+        """
+        ts, _, deltas = self.columns(user_id, int(time.time()) - days * 86400)
+        zone = ZoneInfo(tz) if tz else None
+        # Every UTC offset is a whole number of quarter hours: convert each distinct quarter once
+        quarters, where = np.unique(ts.astype(np.int64) // 900, return_inverse=True)
+        local = np.array([datetime.fromtimestamp(q * 900, zone).hour for q in quarters.tolist()], np.int64)
+        return np.bincount(local[where], weights=deltas, minlength=24).astype(int).tolist()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """ Process-wide log, flushed once more when the process exits """
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = DhikrLog()
+            atexit.register(_log.close)
+        return _log
+
+
+# --------------- Benchmark ---------------
+
+def _scan_daily(log, user_id):
+    """ Daily totals the way a chart would get them without rollups: every event, every time """
+    ts, _, deltas = log.columns(user_id)
+    days = (ts.astype(np.int64) + int(datetime.now().astimezone().utcoffset().total_seconds())) // 86400
+    return np.bincount(days - days.min(), weights=deltas)
+
+
+def bench(years=3, events_per_day=150):
+    import tempfile
+
+    rng = np.random.default_rng(7)
+    adhkar = [f"Dhikr {i}" for i in range(40)]
+    with tempfile.TemporaryDirectory() as tmp:
+        log = DhikrLog(os.path.join(tmp, "log.sqlite3"), background=False, max_pending=10 ** 9)
+        start = int(time.time()) - years * 365 * 86400
+        n = years * 365 * events_per_day
+        stamps = np.sort(rng.integers(start, int(time.time()), n))
+        names = rng.integers(0, len(adhkar), n)
+        deltas = rng.integers(1, 34, n)
+        started = time.perf_counter()
+        for i in range(n):
+            log.record("bench", adhkar[names[i]], int(deltas[i]), int(stamps[i]))
+            if i % 20000 == 19999:
+                log.flush()
+        log.flush()
+        write = time.perf_counter() - started
+        size = os.path.getsize(os.path.join(tmp, "log.sqlite3"))
+        print(f"{n:,} events over {years} years: appended + rolled up in {write:.1f} s "
+              f"({n / write:,.0f} events/s), {size / 2**20:.1f} MiB on disk")
+
+        for label, read in (("daily series, 30 days", lambda: log.series("bench", DAY, 30)),
+                            ("weekly series, 3 years", lambda: log.series("bench", WEEK, years * 52)),
+                            ("one dhikr, weekly", lambda: log.series("bench", WEEK, years * 52, adhkar[3])),
+                            ("streak", lambda: log.streak("bench")),
+                            ("hour profile, 90 days", lambda: log.hour_profile("bench")),
+                            ("daily totals from raw events", lambda: _scan_daily(log, "bench"))):
+            started = time.perf_counter()
+            read()
+            print(f"  {label:30} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+        check = log.totals("bench", DAY)
+        ts, _, raw = log.columns("bench")
+        print(f"  rollups match the raw events: {sum(check.values()) == int(raw.sum())}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,196 @@
+"""
+Incrementally maintained dhikr rankings.
+
+The "Most Used" list and the statistics used to sort or scan every count
+of the user on each rerun. RankIndex keeps the counts together with a
+running total and a max-heap, so an update is O(log n) and top(k) is
+O(k log n) however many custom dhikr a user has added. The heap is lazy:
+an update pushes a fresh entry and only each dhikr's latest entry is live;
+older ones are dropped when they surface, with a rebuild once they
+outnumber the live entries.
+
+Rankings listens to the counter store and keeps one index per recently
+active user (loaded from the store on first touch, least recently used
+ones dropped) plus a global index of every user's counts for the
+"Most recited by everyone" view. Custom dhikr are free text that other
+users must not see, so the global index counts them all under CUSTOM.
+
+    python dhikr_ranking.py [dhikr] [updates]    # sorted() per rerun vs the heap
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import content_registry
+import counter_store
+
+MAX_USERS = 1000    # per-user indexes kept in memory
+CUSTOM = "Custom dhikr"  # what the global ranking shows for every dhikr not in the registry
+
+
+class RankIndex:
+    def __init__(self, counts=None):
+        self._counts = {}
+        self._latest = {}   # dhikr -> seq of its live heap entry
+        self._heap = []     # (-count, seq, dhikr); stale once the dhikr has a newer seq
+        self._seq = itertools.count()
+        self.total = 0
+        for dhikr, count in (counts or {}).items():
+            self.set(dhikr, count)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def get(self, dhikr):
+        return self._counts.get(dhikr, 0)
+
+    def add(self, dhikr, amount=1):
+        self.set(dhikr, self._counts.get(dhikr, 0) + amount)
+
+    def set(self, dhikr, count):
+        self.total += count - self._counts.get(dhikr, 0)
+        self._counts[dhikr] = count
+        seq = self._latest[dhikr] = next(self._seq)
+        heapq.heappush(self._heap, (-count, seq, dhikr))
+        if len(self._heap) > 2 * len(self._counts) + 64:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = []
+        for dhikr, count in self._counts.items():
+            seq = self._latest[dhikr] = next(self._seq)
+            self._heap.append((-count, seq, dhikr))
+        heapq.heapify(self._heap)
+
+    def top(self, k=10):
+        """ [(dhikr, count)] of the k highest non-zero counts, highest first """
+        found, popped = [], []
+        while self._heap and len(found) < k:
+            entry = heapq.heappop(self._heap)
+            count, seq, dhikr = -entry[0], entry[1], entry[2]
+            if self._latest.get(dhikr) != seq:
+                continue  # stale: the dhikr has a newer entry
+            popped.append(entry)
+            if count <= 0:
+                break
+            found.append((dhikr, count))
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def argmax(self):
+        """ (dhikr, count) of the highest count, or None while every count is zero """
+        top = self.top(1)
+        return top[0] if top else None
+
+
+class Rankings:
+    def __init__(self, store, max_users=MAX_USERS, public=None):
+        """ public: the dhikr shown by name in the global ranking; the registry adhkar by default """
+        self.store = store
+        self.max_users = max_users
+        self.public = frozenset(content_registry.get_registry().adhkar if public is None else public)
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # user_id -> RankIndex, least recently used first
+        # Listening before the totals are read, under the lock the listener takes, so an update
+        # made meanwhile either is in the flushed totals or waits here and is applied on top
+        with self._lock:
+            store.add_listener(self._update)
+            store.flush()
+            totals = {}
+            for dhikr, count in store.totals().items():
+                name = self._global_name(dhikr)
+                totals[name] = totals.get(name, 0) + count
+            self._global = RankIndex(totals)
+
+    def _global_name(self, dhikr):
+        return dhikr if dhikr in self.public else CUSTOM
+
+    def _user(self, user_id):
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._users[user_id] = RankIndex(self.store.counts(user_id))
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return index
+
+    def _update(self, user_id, dhikr, op, value):
+        """ Counter store listener; runs before the update is queued, so the index still has the old count """
+        with self._lock:
+            index = self._user(user_id)
+            delta = value if op == counter_store.ADD else value - index.get(dhikr)
+            index.add(dhikr, delta)
+            self._global.add(self._global_name(dhikr), delta)
+
+    def top(self, user_id, k=10):
+        with self._lock:
+            return self._user(user_id).top(k)
+
+    def total(self, user_id):
+        with self._lock:
+            return self._user(user_id).total
+
+    def argmax(self, user_id):
+        with self._lock:
+            return self._user(user_id).argmax()
+
+    def top_global(self, k=10):
+        with self._lock:
+            return self._global.top(k)
+
+
+_rankings = None
+_rankings_lock = threading.Lock()
+
+
+def get_rankings():
+    """ Rankings of the process-wide counter store """
+    global _rankings
+    with _rankings_lock:
+        if _rankings is None:
+            _rankings = Rankings(counter_store.get_store())
+        return _rankings
+
+
+# --------------- Benchmark ---------------
+
+def bench(n_dhikr=2000, updates=20000, k=10):
+    import random
+
+    rng = random.Random(7)
+    names = [f"Custom dhikr {i}" for i in range(n_dhikr)]
+    counts = {name: rng.randrange(100) for name in names}
+    picks = [rng.choice(names) for _ in range(updates)]
+    index = RankIndex(counts)
+
+    started = time.perf_counter()
+    for name in picks:
+        counts[name] += 1
+        sorted(counts, key=counts.get, reverse=True)[:k]
+        sum(counts.values())
+        max(counts.items(), key=lambda x: x[1])
+    scan = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name in picks:
+        index.add(name)
+        index.top(k)
+        index.total
+        index.argmax()
+    heap = time.perf_counter() - started
+
+    print(f"{n_dhikr} dhikr, {updates} updates, each followed by top-{k}, total and argmax")
+    for label, elapsed in (("sort and scan", scan), ("rank index", heap)):
+        print(f"  {label:14} {elapsed:7.2f} s   {elapsed / updates * 1e6:8.1f} µs per rerun")
+    expected = sorted(counts.values(), reverse=True)[:k]
+    print(f"  same top counts: {[count for _, count in index.top(k)] == expected}, "
+          f"same total: {index.total == sum(counts.values())}")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,118 @@
+"""
+Registry of Quran editions: the Arabic base text plus the translations,
+transliterations and tafsir a reader can show under it.
+
+Every edition is fetched and cached on its own, through the corpus store,
+so turning on Urdu costs one download of the Urdu text and nothing else,
+and editions nobody has turned on are never loaded. An edition is kept as
+a tuple of plain ayah texts indexed by ayah number (numberInSurah), not as
+the API's list of metadata dicts: editions line up by ayah, whichever
+order the API returned them in, and the one Arabic base tuple serves every
+combination of translations instead of being copied into each. When a
+corpus file has been built (see quran_corpus.py), editions it holds are
+read from the shared memory map instead, without parsing any JSON.
+
+    python editions.py      # memory of per-combination payloads vs per-edition texts
+"""
+import sys
+import tracemalloc
+from collections import OrderedDict, namedtuple
+
+import quran_corpus
+import quran_store
+
+Edition = namedtuple("Edition", ["id", "name", "language", "kind", "rtl"])
+
+QURAN = "quran"
+TRANSLATION = "translation"
+TRANSLITERATION = "transliteration"
+TAFSIR = "tafsir"
+
+BASE = "quran-uthmani"
+EDITIONS = OrderedDict((e.id, e) for e in (
+    Edition(BASE, "Uthmani script", "ar", QURAN, True),
+    Edition("en.asad", "Muhammad Asad", "en", TRANSLATION, False),
+    Edition("en.sahih", "Saheeh International", "en", TRANSLATION, False),
+    Edition("en.pickthall", "Marmaduke Pickthall", "en", TRANSLATION, False),
+    Edition("en.yusufali", "Abdullah Yusuf Ali", "en", TRANSLATION, False),
+    Edition("en.transliteration", "Transliteration", "en", TRANSLITERATION, False),
+    Edition("ur.jalandhry", "Fateh Muhammad Jalandhry", "ur", TRANSLATION, True),
+    Edition("ur.ahmedali", "Ahmed Ali", "ur", TRANSLATION, True),
+    Edition("fr.hamidullah", "Muhammad Hamidullah", "fr", TRANSLATION, False),
+    Edition("de.aburida", "Abu Rida Muhammad ibn Ahmad ibn Rassoul", "de", TRANSLATION, False),
+    Edition("tr.diyanet", "Diyanet İşleri", "tr", TRANSLATION, False),
+    Edition("id.indonesian", "Kementerian Agama", "id", TRANSLATION, False),
+    Edition("ar.muyassar", "Tafsir Al-Muyassar", "ar", TAFSIR, True),
+    Edition("ar.jalalayn", "Tafsir Al-Jalalayn", "ar", TAFSIR, True),
+))
+EXTRAS = [e for e in EDITIONS if e != BASE]   # what a reader can add under the Arabic
+DEFAULT_SELECTION = ("en.asad",)
+
+
+def label(edition_id):
+    edition = EDITIONS[edition_id]
+    return edition.name if edition.kind == TRANSLATION else f"{edition.name} ({edition.kind})"
+
+
+def aligned(payload, surah_number):
+    """ Tuple of ayah texts of one API edition payload, index = numberInSurah - 1 """
+    texts = [""] * quran_store.AYAH_COUNTS[surah_number - 1]
+    for ayah in payload["ayahs"]:
+        number = ayah["numberInSurah"]
+        if 1 <= number <= len(texts):
+            texts[number - 1] = ayah["text"]
+    return tuple(texts)
+
+
+def load_edition(surah_number, edition_id):
+    """ Aligned texts of one edition of a surah (corpus file, store, then API), or None if it can't be had """
+    if edition_id not in EDITIONS:
+        raise KeyError(f"unknown edition {edition_id!r}")
+    corpus = quran_corpus.get_corpus()
+    if corpus is not None and corpus.has(edition_id, surah_number):
+        return corpus.surah(edition_id, surah_number)
+    payload = quran_store.get_surah_verses(surah_number, (edition_id,))
+    return aligned(payload[0], surah_number) if payload else None
+
+
+# --------------- Benchmark ---------------
+
+def _payload(edition_id, count, text):
+    return {"edition": {"identifier": edition_id}, "englishName": "Al-Baqarah", "name": "سورة البقرة",
+            "ayahs": [{"number": 7 + i, "numberInSurah": i, "text": f"{text} {i}", "juz": 1, "manzil": 1,
+                       "page": 2 + i // 15, "ruku": 1 + i // 10, "hizbQuarter": 1 + i // 20, "sajda": False}
+                      for i in range(1, count + 1)]}
+
+
+def _measure(build):
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def bench(surah_number=2):
+    count = quran_store.AYAH_COUNTS[surah_number - 1]
+    texts = {BASE: "بِسْمِ اللَّهِ الرَّحْمَٰنِ الرَّحِيمِ " * 5, "en.asad": "In the name of God, the Most Gracious. " * 4,
+             "ur.jalandhry": "شروع الله کا نام لے کر جو بڑا مہربان نہایت رحم والا ہے " * 4,
+             "en.transliteration": "Bismi Allahi alrrahmani alrraheemi " * 4}
+    selections = [(BASE, "en.asad"), (BASE, "ur.jalandhry"), (BASE, "en.asad", "ur.jalandhry"),
+                  (BASE, "en.asad", "en.transliteration")]
+
+    def per_combination():
+        # the old cache: one entry per (surah, editions) holding the API payloads
+        return {selection: [_payload(e, count, texts[e]) for e in selection] for selection in selections}
+
+    def per_edition():
+        return {e: aligned(_payload(e, count, texts[e]), surah_number) for e in texts}
+
+    before, after = _measure(per_combination), _measure(per_edition)
+    print(f"surah {surah_number} ({count} ayahs), {len(selections)} edition combinations in use")
+    print(f"  payload per combination  {before / 2**20:6.2f} MiB")
+    print(f"  aligned text per edition {after / 2**20:6.2f} MiB   ({before / after:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:2]))
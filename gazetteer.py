@@ -0,0 +1,412 @@
+"""
+Offline city gazetteer for the prayer-times city input.
+
+Cities (names, aliases, coordinates, population and time zone) are packed
+into one binary file of flat arrays and opened with mmap, the same way as
+the Quran search index. Lookups are binary searches over the sorted name
+keys: prefix autocomplete ranks matches by population, and when nothing
+starts with the text a trigram index over city names finds near spellings
+("karachee", "lahor").
+
+Build it from a GeoNames dump (cities15000.txt, cities5000.txt, ... or the
+.zip as downloaded from download.geonames.org/export/dump/). The app builds
+the index itself when the file is missing or from an older version, from
+the dump named by JANNAHWAY_GEONAMES or else the bundled city table:
+
+    python gazetteer.py build path/to/cities15000.zip
+    python gazetteer.py query "lah" [--country PK]
+"""
+import argparse
+import csv
+import heapq
+import io
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+import zipfile
+from array import array
+from collections import Counter, defaultdict, namedtuple
+
+import content_registry
+import quran_store
+from quran_search import normalize_arabic
+
+GAZETTEER_PATH = os.environ.get("JANNAHWAY_GAZETTEER", os.path.join(quran_store.DATA_DIR, "gazetteer.idx"))
+GEONAMES_SOURCE = os.environ.get("JANNAHWAY_GEONAMES")  # dump the app (re)builds from; the bundled table if unset
+MAGIC = b"JWGZ"
+FORMAT_VERSION = 3
+MIN_SIMILARITY = 0.5
+MAX_ALIASES = 64  # per city, after dropping scripts nobody types here
+
+# The app's country selector uses names; the gazetteer stores ISO codes
+COUNTRY_CODES = {
+    "Pakistan": "PK", "Saudi Arabia": "SA", "UAE": "AE", "USA": "US", "UK": "GB",
+    "India": "IN", "Bangladesh": "BD", "Egypt": "EG", "Turkey": "TR", "Malaysia": "MY",
+}
+
+Place = namedtuple("Place", ["name", "country", "latitude", "longitude", "timezone", "population"])
+
+_NON_WORD = re.compile(r"[^\w]+")
+_TYPABLE = re.compile("^[\\sA-Za-z0-9\u00C0-\u024F\u0600-\u06FF'.,()-]+$")  # Latin and Arabic script
+
+
+def normalize(text):
+    """ Lowercase, accents and Arabic diacritics stripped, punctuation as spaces """
+    text = unicodedata.normalize("NFKD", normalize_arabic(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ---- building ----
+def read_geonames(path):
+    """ Yields (name, aliases, lat, lng, country code, population, timezone) from a GeoNames cities dump """
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            member = next(n for n in archive.namelist() if n.endswith(".txt"))
+            with archive.open(member) as raw:
+                yield from read_geonames_rows(io.TextIOWrapper(raw, encoding="utf-8"))
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from read_geonames_rows(f)
+
+
+def read_geonames_rows(lines):
+    for row in csv.reader(lines, delimiter="\t", quoting=csv.QUOTE_NONE):
+        if len(row) < 18:
+            continue
+        aliases = [row[2]] + [a for a in row[3].split(",") if a and _TYPABLE.match(a)]
+        yield row[1], aliases, float(row[4]), float(row[5]), row[8], int(row[14] or 0), row[17]
+
+
+def read_source(source=GEONAMES_SOURCE):
+    """ Rows from a GeoNames dump, or from the bundled city table when there is none """
+    return read_geonames(source) if source else read_registry_cities()
+
+
+def read_registry_cities():
+    """ The bundled city table, as GeoNames-style rows """
+    for city in content_registry.get_registry().cities.values():
+        yield (city.name, [], city.latitude, city.longitude, COUNTRY_CODES.get(city.country, ""), 0,
+               city.timezone)
+
+
+class _StringTable:
+    """ Sorted UTF-8 strings written as offsets + blob; read back as memoryviews """
+
+    @staticmethod
+    def pack(strings):
+        blob = bytearray()
+        offsets = array("I", [0])
+        for s in strings:
+            blob += s.encode("utf-8")
+            offsets.append(len(blob))
+        blob += b"\0" * (-len(blob) % 4)  # keep the arrays after it 4-byte aligned
+        return offsets.tobytes() + bytes(blob), len(blob)
+
+    def __init__(self, buf, offset, count, blob_len):
+        self.count = count
+        self.offsets = buf[offset:offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self.blob = buf[offset:offset + blob_len]
+        self.end = offset + blob_len
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def release(self):
+        self.offsets.release()
+        self.blob.release()
+
+
+def build_gazetteer(rows, path=GAZETTEER_PATH):
+    """
+    Writes the index file from (name, aliases, lat, lng, country, population, tz)
+    rows; returns the city count. Rows without a time zone take the one most
+    used in their country, and are dropped when the country has none.
+    """
+    names, countries, zones = [], bytearray(), {}
+    lats, lngs, populations, zone_ids = array("f"), array("f"), array("I"), array("I")
+    keys = set()                   # (normalized key, city id)
+    grams = defaultdict(set)       # trigram -> city ids, over the main names only
+    country_zones = defaultdict(Counter)
+    zoneless = []                  # rows without a time zone, placed once every country's zones are known
+
+    def add(name, aliases, lat, lng, country, population, tz):
+        city_id = len(names)
+        names.append(name)
+        countries.extend((country or "--").encode("ascii")[:2].ljust(2, b"-"))
+        lats.append(lat)
+        lngs.append(lng)
+        populations.append(population)
+        zone_ids.append(zones.setdefault(tz, len(zones)))
+        main = normalize(name)
+        for alias in [name] + aliases[:MAX_ALIASES]:
+            key = normalize(alias)
+            if key:
+                keys.add((key, city_id))
+        for gram in trigrams(main) | (trigrams(normalize(aliases[0])) if aliases else set()):
+            grams[gram].add(city_id)
+
+    for row in rows:
+        if row[6]:
+            country_zones[row[4]][row[6]] += 1
+            add(*row)
+        else:
+            zoneless.append(row)
+    for row in zoneless:
+        if country_zones[row[4]]:
+            add(*row[:6], country_zones[row[4]].most_common(1)[0][0])
+
+    n_cities = len(names)
+    # Keys sorted by text, so every prefix is one run of them, and the run's positions per city
+    keys = sorted(keys, key=lambda k: (k[0].encode("utf-8"), -populations[k[1]]))
+    key_cities = array("I", (city_id for _, city_id in keys))
+    per_city = [[] for _ in range(n_cities)]
+    for position, city_id in enumerate(key_cities):
+        per_city[city_id].append(position)
+    city_key_offsets, city_keys = array("I", [0]), array("I")
+    for positions in per_city:
+        city_keys.extend(positions)
+        city_key_offsets.append(len(city_keys))
+    # City ids most populous first, overall and grouped by country, for largest() and wide prefixes
+    by_population = array("I", sorted(range(n_cities), key=lambda c: -populations[c]))
+    by_country = array("I", sorted(by_population, key=lambda c: countries[2 * c:2 * c + 2]))
+    gram_list = sorted(grams, key=lambda g: g.encode("utf-8"))
+    posting_offsets, postings = array("I", [0]), array("I")
+    for gram in gram_list:
+        postings.extend(sorted(grams[gram]))
+        posting_offsets.append(len(postings))
+
+    name_table, name_blob_len = _StringTable.pack(names)
+    zone_list = sorted(zones, key=zones.get)
+    zone_table, zone_blob_len = _StringTable.pack(zone_list)
+    key_table, key_blob_len = _StringTable.pack(k for k, _ in keys)
+    gram_table, gram_blob_len = _StringTable.pack(gram_list)
+    countries += b"\0" * (-len(countries) % 4)
+
+    tmp_path = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<IIIIIIIII", FORMAT_VERSION, n_cities, len(zone_list), len(keys),
+                                    len(gram_list), name_blob_len, zone_blob_len, key_blob_len, gram_blob_len))
+        for column in (lats, lngs, populations, zone_ids, by_population, by_country):
+            f.write(column.tobytes())
+        f.write(bytes(countries))
+        f.write(name_table)
+        f.write(zone_table)
+        f.write(key_table)
+        f.write(key_cities.tobytes())
+        f.write(city_key_offsets.tobytes())
+        f.write(city_keys.tobytes())
+        f.write(gram_table)
+        f.write(struct.pack("<I", len(postings)))
+        f.write(posting_offsets.tobytes())
+        f.write(postings.tobytes())
+    os.replace(tmp_path, path)
+    return n_cities
+
+
+# ---- lookups ----
+class Gazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        with open(path, "rb") as f:
+            header = f.read(40)
+        if len(header) < 40 or header[:4] != MAGIC:
+            raise ValueError(f"{path} is not a JannahWay gazetteer")
+        (version, n, n_zones, n_keys, n_grams,
+         name_blob_len, zone_blob_len, key_blob_len, gram_blob_len) = struct.unpack_from("<IIIIIIIII", header, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has gazetteer version {version}, expected {FORMAT_VERSION}")
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        self.n_cities = n
+        offset = 40
+        self.lats = buf[offset:offset + 4 * n].cast("f")
+        self.lngs = buf[offset + 4 * n:offset + 8 * n].cast("f")
+        self.populations = buf[offset + 8 * n:offset + 12 * n].cast("I")
+        self.zone_ids = buf[offset + 12 * n:offset + 16 * n].cast("I")
+        self.by_population = buf[offset + 16 * n:offset + 20 * n].cast("I")
+        self.by_country = buf[offset + 20 * n:offset + 24 * n].cast("I")
+        offset += 24 * n
+        self.countries = buf[offset:offset + 2 * n]
+        offset += 2 * n + (-2 * n % 4)
+        self.names = _StringTable(buf, offset, n, name_blob_len)
+        self.zones = _StringTable(buf, self.names.end, n_zones, zone_blob_len)
+        self.keys = _StringTable(buf, self.zones.end, n_keys, key_blob_len)
+        offset = self.keys.end
+        self.key_cities = buf[offset:offset + 4 * n_keys].cast("I")
+        offset += 4 * n_keys
+        self.city_key_offsets = buf[offset:offset + 4 * (n + 1)].cast("I")
+        offset += 4 * (n + 1)
+        self.city_keys = buf[offset:offset + 4 * n_keys].cast("I")
+        self.grams = _StringTable(buf, offset + 4 * n_keys, n_grams, gram_blob_len)
+        offset = self.grams.end
+        n_postings, = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        self.posting_offsets = buf[offset:offset + 4 * (n_grams + 1)].cast("I")
+        offset += 4 * (n_grams + 1)
+        self.postings = buf[offset:offset + 4 * n_postings].cast("I")
+
+    def place(self, city_id):
+        return Place(self.names[city_id].decode("utf-8"), bytes(self.countries[2 * city_id:2 * city_id + 2]).decode(),
+                     round(self.lats[city_id], 5), round(self.lngs[city_id], 5),
+                     self.zones[self.zone_ids[city_id]].decode("utf-8"), self.populations[city_id])
+
+    def _country_ok(self, city_id, country):
+        return country is None or self.countries[2 * city_id:2 * city_id + 2] == country
+
+    def prefix(self, text, country=None, limit=10):
+        """ City ids with a name or alias starting with text, most populous first """
+        key = normalize(text).encode("utf-8")
+        if not key:
+            return []
+        lo = self.keys.lower_bound(key)
+        hi = self.keys.lower_bound(key + b"\xff")  # 0xff never occurs in UTF-8
+        # Ranking the run costs its length; walking cities by population finds a match about every
+        # n_cities / run cities. Walk when that is cheaper, as for the one or two letters typed first
+        if (hi - lo) ** 2 > limit * self.n_cities:
+            return self._walk_prefix(lo, hi, country, limit)
+        return self._rank_prefix(lo, hi, country, limit)
+
+    def _rank_prefix(self, lo, hi, country, limit):
+        cities = set(self.key_cities[lo:hi])
+        if country is not None:
+            cities = [c for c in cities if self._country_ok(c, country)]
+        return heapq.nlargest(limit, cities, key=self.populations.__getitem__)
+
+    def _walk_prefix(self, lo, hi, country, limit):
+        if country is None:
+            order = self.by_population
+        else:
+            order = self.by_country[self._country_bound(country):self._country_bound(country + b"\xff")]
+        found = []
+        for c in order:
+            if any(lo <= k < hi for k in self.city_keys[self.city_key_offsets[c]:self.city_key_offsets[c + 1]]):
+                found.append(c)
+                if len(found) == limit:
+                    break
+        return found
+
+    def fuzzy(self, text, country=None, limit=10, min_similarity=MIN_SIMILARITY):
+        """ City ids whose name shares most of the text's trigrams, closest first """
+        query_grams = trigrams(normalize(text))
+        overlap = Counter()
+        for gram in query_grams:
+            key = gram.encode("utf-8")
+            i = self.grams.lower_bound(key)
+            if i < self.grams.count and self.grams[i] == key:
+                overlap.update(self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]])
+        threshold = min_similarity * len(query_grams)
+        matches = [c for c, shared in overlap.items() if shared >= threshold and self._country_ok(c, country)]
+        return heapq.nlargest(limit, matches, key=lambda c: (overlap[c], self.populations[c], -c))
+
+    def largest(self, country, limit=100):
+        """ The most populous places in a country (ISO code) """
+        code = country.encode("ascii")
+        lo = self._country_bound(code)
+        hi = self._country_bound(code + b"\xff")
+        return [self.place(c) for c in self.by_country[lo:min(hi, lo + limit)]]
+
+    def _country_bound(self, code):
+        """ First position in by_country whose country is not below code """
+        lo, hi = 0, self.n_cities
+        while lo < hi:
+            mid = (lo + hi) // 2
+            c = self.by_country[mid]
+            if bytes(self.countries[2 * c:2 * c + 2]) < code:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def suggest(self, text, country=None, limit=10):
+        """ Places for autocomplete: prefix matches, or near spellings when nothing starts with text """
+        country = country.encode("ascii") if country else None
+        city_ids = self.prefix(text, country, limit) or self.fuzzy(text, country, limit)
+        return [self.place(c) for c in city_ids]
+
+    def close(self):
+        for view in (self.lats, self.lngs, self.populations, self.zone_ids, self.by_population, self.by_country,
+                     self.countries, self.key_cities, self.city_key_offsets, self.city_keys, self.posting_offsets,
+                     self.postings):
+            view.release()
+        for table in (self.names, self.zones, self.keys, self.grams):
+            table.release()
+        self._mmap.close()
+        self._file.close()
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """
+    Process-wide gazetteer. The index file is built first when there is none
+    yet, or rebuilt when it was written in another format version.
+    """
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            try:
+                _gazetteer = Gazetteer(GAZETTEER_PATH)
+            except (FileNotFoundError, ValueError):
+                build_gazetteer(read_source(), GAZETTEER_PATH)
+                _gazetteer = Gazetteer(GAZETTEER_PATH)
+        return _gazetteer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline city gazetteer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="index a GeoNames cities dump (default: $JANNAHWAY_GEONAMES, "
+                                             "else the bundled city table)")
+    build_cmd.add_argument("source", nargs="?")
+    query_cmd = sub.add_parser("query", help="autocomplete a city name")
+    query_cmd.add_argument("text")
+    query_cmd.add_argument("--country", help="ISO country code, e.g. PK")
+    query_cmd.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        rows = read_source(args.source or GEONAMES_SOURCE)
+        n_cities = build_gazetteer(rows)
+        print(f"Indexed {n_cities} cities into {GAZETTEER_PATH} ({os.path.getsize(GAZETTEER_PATH) / 2**20:.1f} MiB) "
+              f"in {time.perf_counter() - started:.2f}s")
+    else:
+        started = time.perf_counter()
+        gazetteer = Gazetteer()
+        opened = time.perf_counter()
+        places = gazetteer.suggest(args.text, args.country, args.limit)
+        done = time.perf_counter()
+        for place in places:
+            print(f"{place.name}, {place.country}  ({place.latitude}, {place.longitude})  {place.timezone}  "
+                  f"pop {place.population}")
+        print(f"open {1000 * (opened - started):.2f} ms, lookup {1000 * (done - opened):.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Shared HTTP client for every outbound call the app makes.
+
+One requests.Session per process keeps TCP/TLS connections alive between
+calls, with a bounded connection pool per host, connect/read timeouts and
+exponential-backoff retries on connection errors and 429/5xx responses. A
+per-host circuit breaker stops hammering an upstream that keeps failing;
+while it is open calls fail fast with CircuitOpenError so callers can fall
+back to cached data.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.environ.get("JANNAHWAY_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("JANNAHWAY_READ_TIMEOUT", "15"))
+POOL_CONNECTIONS = 10   # number of hosts to keep pools for
+POOL_MAXSIZE = 16       # open connections per host
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """ Raised instead of calling a host whose circuit is open """
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_after` seconds, letting one probe through;
+    the probe closes the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class HttpClient:
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=3, backoff_factor=0.5,
+                 pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 failure_threshold=5, reset_after=30.0):
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # Up to pool_maxsize connections per host are kept for reuse; a burst beyond
+        # that (or a streamed response nobody closed) opens a throwaway connection
+        # instead of waiting forever on a full pool
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "JannahWay/1.0"
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_after)
+            return self._breakers[host]
+
+    def request(self, method, url, **kwargs):
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {urlsplit(url).netloc}")
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            breaker.record_failure()
+            raise
+        # Retries are already exhausted here; a 5xx counts against the host
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def circuit_states(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: b.state for host, b in breakers.items()}
+
+
+client = HttpClient()
+
+
+def get(url, **kwargs):
+    return client.get(url, **kwargs)
@@ -0,0 +1,398 @@
+"""
+Background jobs for work that should not run on a Streamlit script thread.
+
+A job is one call to a handler ("module:function") with JSON params. Jobs
+are rows in a SQLite table, so status, progress and results outlive the
+rerun, the session and the process that submitted them: a page reload
+polls the same row, and a restart requeues whatever was still queued or
+had stopped running. A worker claims a job in one UPDATE before running it
+and then stamps a heartbeat on it, so with several app processes (or a
+worker process outliving its app) each job still runs once, and a running
+job is only taken over after its heartbeat has gone quiet. Files a job produces are written under the artifacts directory
+and downloaded from there, never held in session state.
+
+Handlers flagged cpu_bound run in their own worker processes, at most one
+per core at a time, so several PDF builds use every core; the others
+(network, SQLite) share a small thread pool. Submitting the same kind and params again while the
+first job is queued, running or still has its result returns that job
+instead of doing the work twice.
+
+    python jobs.py                 # recent jobs
+    python jobs.py purge           # drop expired jobs and their files
+    python jobs.py run JOB_ID      # what each cpu_bound job runs as
+"""
+import hashlib
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+JOBS_DB_PATH = os.environ.get("JANNAHWAY_JOBS_DB", os.path.join(DATA_DIR, "jobs.sqlite3"))
+ARTIFACTS_DIR = os.environ.get("JANNAHWAY_ARTIFACTS", os.path.join(DATA_DIR, "artifacts"))
+THREAD_WORKERS = 4
+PROCESS_WORKERS = int(os.environ.get("JANNAHWAY_JOB_PROCESSES", "0")) or os.cpu_count() or 2
+JOB_TTL = 24 * 3600          # finished jobs and their files are kept this long
+PURGE_INTERVAL = 600         # seconds between expiry sweeps
+PROGRESS_INTERVAL = 0.5      # seconds between progress writes from a running job
+HEARTBEAT_INTERVAL = 10      # seconds between a running job's heartbeats
+STALE_AFTER = 60             # a running job whose heartbeat is older than this is presumed dead
+NOT_CLAIMED = 75             # exit code of `jobs.py run` when another worker already has the job
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# kind -> (handler "module:function", cpu_bound)
+Kind = namedtuple("Kind", ["target", "cpu_bound"])
+KINDS = {}
+
+
+class Job(namedtuple("Job", ["id", "kind", "params", "owner", "status", "done", "total", "message", "summary",
+                             "artifact", "file_name", "mime", "created_at", "started_at", "finished_at"])):
+    __slots__ = ()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def fraction(self):
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+
+# What a handler returns: optional file bytes to download, plus a JSON-able summary
+Result = namedtuple("Result", ["data", "file_name", "mime", "summary"], defaults=(None, None, None, None))
+
+_COLUMNS = ", ".join(Job._fields)
+
+
+def register(kind, target, cpu_bound=False):
+    """
+    Declares a job kind. The handler is called as handler(params, progress)
+    and returns a Result (or None); progress(done, total) may be called any
+    number of times. Process-pool handlers must be importable by name.
+    """
+    KINDS[kind] = Kind(target, cpu_bound)
+
+
+def _job_key(kind, params):
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JobTable:
+    """ The jobs table; every process (app or pool worker) opens its own connection """
+
+    def __init__(self, path=JOBS_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                target TEXT NOT NULL,
+                cpu_bound INTEGER NOT NULL,
+                job_key TEXT NOT NULL,
+                params TEXT NOT NULL,
+                owner TEXT,
+                status TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                total INTEGER,
+                message TEXT,
+                summary TEXT,
+                artifact TEXT,
+                file_name TEXT,
+                mime TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker TEXT,
+                heartbeat REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (job_key, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_by_owner ON jobs (owner, created_at);
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        with self._conn:
+            for column, kind in (("worker", "TEXT"), ("heartbeat", "REAL")):
+                if column not in columns:  # tables made before jobs were claimed
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _job(self, row):
+        if row is None:
+            return None
+        row = list(row)
+        row[2] = json.loads(row[2])
+        row[8] = json.loads(row[8]) if row[8] else None
+        return Job(*row)
+
+    def insert(self, job_id, kind, target, cpu_bound, key, params, owner, total):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, target, cpu_bound, job_key, params, owner, status, total, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, target, int(cpu_bound), key, json.dumps(params), owner, QUEUED, total, time.time()),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            return self._job(self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def latest(self, key):
+        """ Newest job for a kind and params that is queued, running or done """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE job_key = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+                (key, FAILED),
+            ).fetchone()
+        return self._job(row)
+
+    def recent(self, owner=None, limit=20):
+        query = f"SELECT {_COLUMNS} FROM jobs" + (" WHERE owner = ?" if owner else "") + " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, ((owner,) if owner else ()) + (limit,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def work(self, job_id):
+        """ (handler target, params) for a job """
+        with self._lock:
+            target, params = self._conn.execute("SELECT target, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return target, json.loads(params)
+
+    def unfinished(self, stale_after=STALE_AFTER, queued=True):
+        """ (id, cpu_bound) of jobs running without a recent heartbeat, and those still queued """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, cpu_bound FROM jobs WHERE status = ? OR (status = ? AND COALESCE(heartbeat, 0) < ?) "
+                "ORDER BY created_at", (QUEUED if queued else RUNNING, RUNNING, time.time() - stale_after)).fetchall()
+        return [(job_id, bool(cpu_bound)) for job_id, cpu_bound in rows]
+
+    def claim(self, job_id, worker, stale_after=STALE_AFTER):
+        """ Marks the job running for this worker; False if it is finished or another live worker has it """
+        now = time.time()
+        with self._lock, self._conn:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, started_at = ?, done = 0 "
+                "WHERE id = ? AND (status = ? OR (status = ? AND COALESCE(heartbeat, 0) < ?))",
+                (RUNNING, worker, now, now, job_id, QUEUED, RUNNING, now - stale_after)).rowcount
+        return claimed == 1
+
+    def beat(self, job_id, worker):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+                               (time.time(), job_id, worker, RUNNING))
+
+    def update(self, job_id, **fields):
+        if "summary" in fields:
+            fields["summary"] = json.dumps(fields["summary"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def expired(self, before):
+        with self._lock:
+            return self._conn.execute("SELECT id, artifact FROM jobs WHERE finished_at < ?", (before,)).fetchall()
+
+    def delete(self, job_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+
+# --------------- Worker side ---------------
+
+_tables = {}  # path -> JobTable, one per process
+_tables_lock = threading.Lock()
+
+
+def _table(path):
+    with _tables_lock:
+        table = _tables.get(path)
+        if table is None:
+            table = _tables[path] = JobTable(path)
+        return table
+
+
+def _handler(target):
+    module, function = target.split(":")
+    return getattr(importlib.import_module(module), function)
+
+
+def run_job(db_path, artifacts_dir, job_id, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Runs one job to completion in this process, recording everything in the
+    jobs table; returns False without running it when it could not be claimed
+    """
+    table = _table(db_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    if not table.claim(job_id, worker):
+        return False
+    target, params = table.work(job_id)
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(heartbeat_interval):
+            table.beat(job_id, worker)
+
+    threading.Thread(target=heartbeat, daemon=True, name=f"job-heartbeat-{job_id[:8]}").start()
+    last_write = [0.0]
+
+    def progress(done, total=None):
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            table.update(job_id, done=done, **({"total": total} if total is not None else {}))
+
+    try:
+        result = _handler(target)(params, progress) or Result()
+        fields = {"status": DONE, "finished_at": time.time(), "summary": result.summary}
+        if result.data is not None:
+            os.makedirs(artifacts_dir, exist_ok=True)
+            path = os.path.join(artifacts_dir, job_id)
+            with open(path + ".tmp", "wb") as f:
+                f.write(result.data)
+            os.replace(path + ".tmp", path)
+            fields.update(artifact=path, file_name=result.file_name, mime=result.mime)
+        job = table.get(job_id)
+        if job and job.total:
+            fields["done"] = job.total
+        table.update(job_id, **fields)
+    except Exception as e:
+        traceback.print_exc()
+        table.update(job_id, status=FAILED, finished_at=time.time(), message=str(e) or type(e).__name__)
+    finally:
+        stop.set()
+    return True
+
+
+def purge(table, ttl=JOB_TTL):
+    """ Drops finished jobs older than ttl seconds, with their files """
+    expired = table.expired(time.time() - ttl)
+    for _, artifact in expired:
+        if artifact and os.path.exists(artifact):
+            os.remove(artifact)
+    table.delete([job_id for job_id, _ in expired])
+    return len(expired)
+
+
+# --------------- Queue ---------------
+
+class JobQueue:
+    def __init__(self, path=JOBS_DB_PATH, artifacts_dir=ARTIFACTS_DIR, threads=THREAD_WORKERS,
+                 processes=PROCESS_WORKERS, ttl=JOB_TTL):
+        self.path = path
+        self.artifacts_dir = artifacts_dir
+        self.ttl = ttl
+        self.table = _table(path)
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="job")
+        # Each slot waits on a `python jobs.py run <id>` child. Not multiprocessing: Streamlit
+        # runs app.py as __main__, and spawned pool workers would re-execute it on startup.
+        self._processes = ThreadPoolExecutor(max_workers=processes, thread_name_prefix="job-process")
+        self._submit_lock = threading.Lock()
+        self._purged_at = 0.0
+        self.purge()
+        self.resume()
+
+    def resume(self, queued=True):
+        """
+        Starts jobs whose worker stopped heartbeating, and with queued the
+        ones still waiting too; claiming keeps a job another process runs from running twice
+        """
+        for job_id, cpu_bound in self.table.unfinished(queued=queued):
+            self._start(job_id, cpu_bound)
+
+    def _start(self, job_id, cpu_bound):
+        if cpu_bound:
+            self._processes.submit(self._run_in_process, job_id)
+        else:
+            self._threads.submit(run_job, self.path, self.artifacts_dir, job_id)
+
+    def _run_in_process(self, job_id):
+        env = dict(os.environ, JANNAHWAY_JOBS_DB=self.path, JANNAHWAY_ARTIFACTS=self.artifacts_dir)
+        code = subprocess.run([sys.executable, os.path.abspath(__file__), "run", job_id], env=env).returncode
+        job = self.table.get(job_id)
+        if code != NOT_CLAIMED and job is not None and not job.finished:  # killed, or crashed before it could record the failure
+            self.table.update(job_id, status=FAILED, finished_at=time.time(),
+                              message=f"worker process exited with code {code}")
+
+    def submit(self, kind, params, owner=None, total=None, reuse=True):
+        """
+        Queues a job. With reuse, a job with the same kind and params that is
+        still pending, or finished with its file still on disk, is returned instead.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"unknown job kind {kind!r}; expected one of {sorted(KINDS)}")
+        target, cpu_bound = KINDS[kind]
+        key = _job_key(kind, params)
+        if time.time() - self._purged_at > PURGE_INTERVAL:
+            self.purge()
+            self.resume(queued=False)
+        with self._submit_lock:
+            existing = self.table.latest(key) if reuse else None
+            if existing and (not existing.finished or existing.artifact is None or os.path.exists(existing.artifact)):
+                return existing
+            job_id = uuid.uuid4().hex
+            self.table.insert(job_id, kind, target, cpu_bound, key, params, owner, total)
+        self._start(job_id, cpu_bound)
+        return self.table.get(job_id)
+
+    def get(self, job_id):
+        return self.table.get(job_id)
+
+    def recent(self, owner=None, limit=20):
+        return self.table.recent(owner, limit)
+
+    def artifact(self, job):
+        """ Bytes of a finished job's file, or None if it has none or it was purged """
+        if job is None or job.artifact is None:
+            return None
+        try:
+            with open(job.artifact, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def purge(self):
+        self._purged_at = time.time()
+        return purge(self.table, self.ttl)
+
+    def close(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """ Process-wide queue; created on first use, which also resumes unfinished jobs """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["run"]:  # a worker process started by JobQueue
+        sys.exit(0 if run_job(JOBS_DB_PATH, ARTIFACTS_DIR, sys.argv[2]) else NOT_CLAIMED)
+    elif sys.argv[1:2] == ["purge"]:
+        print(f"purged {purge(JobTable())} jobs")
+    else:
+        for job in JobTable().recent(limit=int(sys.argv[1]) if len(sys.argv) > 1 else 20):
+            print(f"{job.id[:8]}  {job.kind:14} {job.status:8} {job.done}/{job.total or '?':<6} "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(job.created_at))}  {job.message or ''}")
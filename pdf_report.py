@@ -0,0 +1,405 @@
+"""
+PDF report engine for tables of any length.
+
+Rows are pulled from each section's iterator one page at a time: every
+page gets its own small Table with the header row on top, so a long
+history never exists as one giant flowable and memory stays flat as the
+row count grows. Arabic text is set in an Arabic-capable TrueType font,
+registered once per process (ReportLab then embeds only the glyphs each
+document uses), and shaped and reordered for right-to-left display, both
+in table cells and in the Quran export. In the app, reports are built off
+the script thread as "pdf-report" jobs (see jobs.py) from the inputs of a
+report builder, so the rows are only ever made in the worker.
+
+    python pdf_report.py [rows]       # build time and peak memory vs one big Table
+
+Font lookup: $JANNAHWAY_ARABIC_FONT, then fonts/*.ttf next to this file,
+then common system locations. Without one, Arabic cells fall back to
+Helvetica and show as empty boxes. Shaping needs arabic-reshaper and
+python-bidi; without them Arabic runs are only reversed, with unjoined
+letters.
+"""
+import functools
+import glob
+import importlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import unicodedata
+from collections import namedtuple
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+import jobs
+
+try:
+    import arabic_reshaper
+    from arabic_reshaper.ligatures import LIGATURES
+    from bidi.algorithm import get_display
+except ImportError:
+    arabic_reshaper = None
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/fonts-hosny-amiri/amiri-regular.ttf",
+    "/usr/share/fonts/truetype/fonts-arabeyes/ae_AlMateen.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+)
+ARABIC_FONT = "JannahWayArabic"
+BASE_FONT = "Helvetica"
+HEADER_FONT = "Helvetica-Bold"
+FONT_SIZE = 9
+ROW_HEIGHT = 15
+CELL_PADDING = 6
+HEADER_COLOR = colors.HexColor("#1E563C")
+STRIPE_COLOR = colors.HexColor("#F2F2F2")
+
+_ARABIC = re.compile("[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]")
+_ARABIC_RUN = re.compile("{0}(?:[{1} ]*{0})?".format(_ARABIC.pattern, _ARABIC.pattern[1:-1]))
+# Letters some Arabic fonts lack, and the nearest plain letter
+SUBSTITUTES = {"ٱ": "ا"}  # alef wasla -> alef
+
+# columns: header labels; rows: a list, or a callable returning a fresh iterator of rows;
+# col_widths: points or None to share the page width; highlight: column indexes to tint
+Section = namedtuple("Section", ["heading", "columns", "rows", "col_widths", "highlight", "new_page"],
+                     defaults=(None, (), False))
+
+_font_lock = threading.Lock()
+_arabic_font = None  # registered font name, or BASE_FONT if none was found
+
+
+def find_arabic_font():
+    env = os.environ.get("JANNAHWAY_ARABIC_FONT")
+    candidates = ([env] if env else []) + sorted(glob.glob(os.path.join(FONT_DIR, "*.ttf"))) + list(FONT_CANDIDATES)
+    return next((path for path in candidates if path and os.path.exists(path)), None)
+
+
+def arabic_font():
+    """ Name of the Arabic-capable font, registering it on first use """
+    global _arabic_font
+    with _font_lock:
+        if _arabic_font is None:
+            path = find_arabic_font()
+            if path:
+                pdfmetrics.registerFont(TTFont(ARABIC_FONT, path))
+                _arabic_font = ARABIC_FONT
+            else:
+                _arabic_font = BASE_FONT
+        return _arabic_font
+
+
+def is_arabic(text):
+    return bool(_ARABIC.search(text))
+
+
+# --------------- Arabic shaping ---------------
+
+@functools.lru_cache(maxsize=1)
+def _shaping():
+    """ (reshaper, codepoints the font has) for the registered Arabic font """
+    face = getattr(pdfmetrics.getFont(arabic_font()), "face", None)
+    cmap = frozenset(face.charToGlyph) if hasattr(face, "charToGlyph") else None
+    if arabic_reshaper is None:
+        return None, cmap
+    config = {"delete_harakat": False}
+    if cmap is not None:
+        # Only ligatures the font has glyphs for; the rest stay as joined letters
+        for name, (_, forms) in LIGATURES:
+            config[name] = all(ord(c) in cmap for form in forms for c in form)
+    return arabic_reshaper.ArabicReshaper(configuration=config), cmap
+
+
+def _fit_to_font(text, cmap):
+    if cmap is None:
+        return text
+    out = []
+    for ch in text:
+        if ord(ch) in cmap or ch == " ":
+            out.append(ch)
+        elif ch in SUBSTITUTES:
+            out.append(SUBSTITUTES[ch])
+        elif unicodedata.category(ch) not in ("Mn", "Lm"):  # missing marks are dropped, letters kept
+            out.append(ch)
+    return "".join(out)
+
+
+def _visual(line):
+    """ Display order of a line; without python-bidi each Arabic run is reversed in place """
+    if arabic_reshaper is not None:
+        return get_display(line)
+    return _ARABIC_RUN.sub(lambda m: m.group(0)[::-1], line)
+
+
+def shape_arabic(text, width, font_size):
+    """ Arabic text as right-to-left display lines no wider than width """
+    reshaper, cmap = _shaping()
+    text = _fit_to_font(" ".join(text.split()), cmap)
+    shaped = reshaper.reshape(text) if reshaper else text
+    font = arabic_font()
+    space = pdfmetrics.stringWidth(" ", font, font_size)
+    lines, line, line_width = [], [], 0.0
+    for word in shaped.split(" "):  # joining never crosses a space, so wrapping after shaping is safe
+        word_width = pdfmetrics.stringWidth(word, font, font_size)
+        if line and line_width + space + word_width > width:
+            lines.append(" ".join(line))
+            line, line_width = [], 0.0
+        line_width += (space if line else 0) + word_width
+        line.append(word)
+    if line:
+        lines.append(" ".join(line))
+    return tuple(_visual(line) for line in lines)
+
+
+@functools.lru_cache(maxsize=4096)
+def shape_cell(text):
+    """ One table cell, Arabic or mixed with Latin, shaped and in display order """
+    return shape_arabic(text, float("inf"), FONT_SIZE)[0] if text.strip() else text
+
+
+@functools.lru_cache(maxsize=4096)
+def _fit(text, font, width):
+    """ Cuts text to the column width with an ellipsis; rows have a fixed height, so cells never wrap """
+    if len(text) * FONT_SIZE <= width or pdfmetrics.stringWidth(text, font, FONT_SIZE) <= width:  # no glyph is wider than 1 em
+        return text
+    while text and pdfmetrics.stringWidth(text + "…", font, FONT_SIZE) > width:
+        text = text[:max(1, int(len(text) * 0.9))] if len(text) > 40 else text[:-1]
+    return text + "…"
+
+
+def _iter_rows(rows):
+    return iter(rows() if callable(rows) else rows)
+
+
+class StreamingTable(Flowable):
+    """
+    A table that pulls its rows lazily, one page-full at a time. When the
+    rows don't fit, split() hands the frame a Table for what does fit
+    (header included) plus a StreamingTable for the rest.
+    """
+
+    def __init__(self, columns, rows, col_widths, highlight=(), buffer=None):
+        super().__init__()
+        self.columns = list(columns)
+        self.rows = rows  # iterator
+        self.col_widths = col_widths
+        self.highlight = highlight
+        self._buffer = buffer or []
+        self._exhausted = False
+        self._table = None
+
+    def _fill(self, n):
+        while len(self._buffer) < n and not self._exhausted:
+            row = next(self.rows, None)
+            if row is None:
+                self._exhausted = True
+            else:
+                self._buffer.append(row)
+
+    def _make_table(self, rows):
+        font = arabic_font()
+        commands = [
+            ("BACKGROUND", (0, 0), (-1, 0), HEADER_COLOR),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), HEADER_FONT),
+            ("FONTNAME", (0, 1), (-1, -1), BASE_FONT),
+            ("FONTSIZE", (0, 0), (-1, -1), FONT_SIZE),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, STRIPE_COLOR]),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("ALIGN", (1, 0), (-1, -1), "CENTER"),
+        ]
+        commands += [("BACKGROUND", (col, 1), (col, -1), colors.HexColor("#FFF4CC")) for col in self.highlight]
+        cells = []
+        for r, row in enumerate(rows, start=1):
+            cell_row = []
+            for c, value in enumerate(row):
+                text = "" if value is None else str(value)
+                cell_font = BASE_FONT
+                if is_arabic(text):
+                    text, cell_font = shape_cell(text), font
+                    commands.append(("FONTNAME", (c, r), (c, r), font))
+                cell_row.append(_fit(text, cell_font, self.col_widths[c] - 2 * CELL_PADDING))
+            cells.append(cell_row)
+        table = Table([self.columns] + cells, colWidths=self.col_widths, rowHeights=ROW_HEIGHT)
+        table.setStyle(TableStyle(commands))
+        return table
+
+    def _rows_that_fit(self, available_height):
+        return int(available_height // ROW_HEIGHT) - 1  # less the header row
+
+    def wrap(self, available_width, available_height):
+        fit = self._rows_that_fit(available_height)
+        self._fill(max(fit, 0) + 1)
+        if self._exhausted and len(self._buffer) <= fit:
+            self._table = self._make_table(self._buffer)
+            return self._table.wrap(available_width, available_height)
+        self._table = None
+        return available_width, available_height + 1  # too tall: the frame will split us
+
+    def split(self, available_width, available_height):
+        fit = self._rows_that_fit(available_height)
+        if fit < 1:
+            return []  # not even one row here; start on the next page
+        self._fill(fit + 1)
+        page, rest = self._buffer[:fit], self._buffer[fit:]
+        return [self._make_table(page),
+                StreamingTable(self.columns, self.rows, self.col_widths, self.highlight, rest)]
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+
+class LazyStory(list):
+    """
+    A story for doc.build() that holds only a few flowables at a time,
+    pulling more from an iterator as the document consumes them.
+    """
+
+    def __init__(self, flowables, buffered=16):
+        super().__init__()
+        self._source = iter(flowables)
+        self._buffered = buffered
+
+    def _refill(self):
+        while self._source is not None and list.__len__(self) < self._buffered:
+            flowable = next(self._source, None)
+            if flowable is None:
+                self._source = None
+            else:
+                self.append(flowable)
+
+    def __len__(self):
+        self._refill()
+        return list.__len__(self)
+
+    def __getitem__(self, i):
+        self._refill()
+        return list.__getitem__(self, i)
+
+
+class Report:
+    def __init__(self, title, sections, subtitle=None, pagesize=A4):
+        self.title = title
+        self.sections = sections
+        self.subtitle = subtitle
+        self.pagesize = pagesize
+
+
+def build_pdf(report):
+    """ Builds the PDF, streaming each section's rows; returns the bytes """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=report.pagesize, title=report.title, topMargin=30, bottomMargin=30)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(escape(report.title), styles["Title"])]
+    if report.subtitle:
+        story.append(Paragraph(escape(report.subtitle), styles["Normal"]))
+    story.append(Spacer(1, 12))
+    for i, section in enumerate(report.sections):
+        if section.new_page and i:
+            story.append(PageBreak())
+        if section.heading:
+            story.append(Paragraph(escape(section.heading), styles["Heading2"]))
+        widths = section.col_widths or [doc.width / len(section.columns)] * len(section.columns)
+        story.append(StreamingTable(section.columns, _iter_rows(section.rows), widths, section.highlight))
+        story.append(Spacer(1, 12))
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def run_report_job(params, progress):
+    """ jobs handler: makes the report with the builder start_render() recorded, then builds the PDF """
+    module, function = params["builder"].split(":")
+    report = getattr(importlib.import_module(module), function)(**params["inputs"])
+    total = sum(len(section.rows) for section in report.sections if not callable(section.rows))
+    done = 0
+
+    def counted(rows):
+        nonlocal done
+        for row in _iter_rows(rows):
+            done += 1
+            progress(done, total)
+            yield row
+
+    progress(0, total or None)
+    report.sections = [section._replace(rows=functools.partial(counted, section.rows))
+                       for section in report.sections]
+    return jobs.Result(build_pdf(report), params["file_name"], "application/pdf")
+
+
+jobs.register("pdf-report", "pdf_report:run_report_job", cpu_bound=True)
+
+
+def start_render(builder, inputs, file_name, owner=None):
+    """
+    Queues a report on the jobs process pool. builder is "module:function"
+    returning a Report, called in the worker with the JSON-able inputs as
+    keyword arguments; the same inputs again reuse the finished file.
+    """
+    params = {"builder": builder, "inputs": inputs, "file_name": file_name}
+    return jobs.get_queue().submit("pdf-report", params, owner=owner)
+
+
+def dhikr_report(counts, generated_on):
+    """ Builder for the tasbeeh export: {dhikr: count} as a table, highest first, with the total """
+    counted = sorted(((d, c) for d, c in counts.items() if c > 0), key=lambda x: x[1], reverse=True)
+    rows = [[d, str(c)] for d, c in counted] + [["Total", str(sum(c for _, c in counted))]]
+    return Report("Dhikr Counter Report", [Section(None, ["Dhikr", "Count"], rows, col_widths=[400, 100])],
+                  subtitle=f"Generated on: {generated_on}")
+
+
+# --------------- Benchmark ---------------
+
+def _sample_rows(n):
+    for i in range(n):
+        yield [f"SubhanAllah wa bihamdihi #{i % 97}", "سُبْحَانَ اللَّهِ وَبِحَمْدِهِ" if i % 5 == 0 else "",
+               str(i * 7 % 1000), datetime(2025, 1, 1 + i % 28).strftime("%Y-%m-%d")]
+
+
+def _one_big_table(rows):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    table = Table([["Dhikr", "Arabic", "Count", "Date"]] + [list(r) for r in rows], repeatRows=1)
+    table.setStyle(TableStyle([("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                               ("FONTNAME", (1, 1), (1, -1), arabic_font())]))
+    doc.build([table])
+    return buffer.getvalue()
+
+
+def _measure(build):
+    started = time.perf_counter()
+    pdf = build()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()  # separate run: tracing slows the build down several times
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(pdf)
+
+
+def bench(n_rows=5000):
+    arabic_font()  # register outside the measurements
+    columns = ["Dhikr", "Arabic", "Count", "Date"]
+    report = Report("Benchmark", [Section(None, columns, lambda: _sample_rows(n_rows))])
+    print(f"{n_rows} rows, Arabic font: {find_arabic_font() or 'none found (Helvetica)'}")
+    for label, build in (("one big Table", lambda: _one_big_table(_sample_rows(n_rows))),
+                         ("streaming pages", lambda: build_pdf(report))):
+        elapsed, peak, size = _measure(build)
+        print(f"  {label:16} {elapsed * 1000:8.0f} ms   peak {peak / 2**20:6.1f} MiB   {size / 1024:6.0f} KiB")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
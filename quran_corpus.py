@@ -0,0 +1,286 @@
+"""
+Compact binary Quran corpus, opened with mmap.
+
+The API's JSON carries a dozen metadata fields with every ayah, and each
+worker process that parses it keeps its own copy of the dicts. An offline
+build step packs just the text into one file instead: per edition, an
+offsets table with one entry per ayah of the whole Quran (in Quran order)
+followed by the UTF-8 text of every ayah back to back. At runtime the file
+is mapped read-only, so every process shares the same page-cache pages,
+opening it costs microseconds, and an ayah or any run of ayahs is a
+memoryview slice; text is only decoded when it is displayed.
+
+Layout (little endian):
+
+    b"JWQC", version u32, editions u32, ayahs u32
+    per edition: id (32 bytes, NUL padded), text bytes u32, surahs present (114 bytes, padded to 4),
+                 offsets u32 x (ayahs + 1), text, padded to 4
+
+    python quran_corpus.py build [--editions quran-uthmani,en.asad,...]
+    python quran_corpus.py bench     # load time and memory vs parsing the JSON
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate
+
+import quran_store
+
+CORPUS_PATH = os.environ.get("JANNAHWAY_CORPUS", os.path.join(quran_store.DATA_DIR, "quran_corpus.bin"))
+MAGIC = b"JWQC"
+FORMAT_VERSION = 1
+EDITION_ID_BYTES = 32
+# Index of each surah's first ayah in Quran order; SURAH_STARTS[-1] == AYAH_TOTAL
+SURAH_STARTS = (0, *accumulate(quran_store.AYAH_COUNTS))
+
+_SURAH_MAP = -(-quran_store.SURAH_COUNT // 4) * 4
+
+
+def ayah_index(surah_number, ayah):
+    """ Position of an ayah in Quran order, 0-based """
+    if not 1 <= surah_number <= quran_store.SURAH_COUNT or not 1 <= ayah <= quran_store.AYAH_COUNTS[surah_number - 1]:
+        raise IndexError(f"there is no ayah {surah_number}:{ayah}")
+    return SURAH_STARTS[surah_number - 1] + ayah - 1
+
+
+# ---- building ----
+def build_corpus(path=CORPUS_PATH, editions=quran_store.DEFAULT_EDITIONS, store=None, progress=None):
+    """
+    Packs the given editions from the local corpus store (no network) into
+    the binary file; surahs missing from the store are left empty and
+    marked absent. Returns {edition: surahs packed}.
+    """
+    store = store or quran_store.get_store()
+    packed = {}
+    tmp_path = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<III", FORMAT_VERSION, len(editions), quran_store.AYAH_TOTAL))
+        for done, edition in enumerate(editions, start=1):
+            key = edition.encode("utf-8")
+            if len(key) > EDITION_ID_BYTES:
+                raise ValueError(f"edition id {edition!r} is longer than {EDITION_ID_BYTES} bytes")
+            blob = bytearray()
+            offsets = array("I", [0])
+            present = bytearray(_SURAH_MAP)
+            for surah_number in range(1, quran_store.SURAH_COUNT + 1):
+                payload, _ = store.load_verses(surah_number, (edition,))
+                texts = [""] * quran_store.AYAH_COUNTS[surah_number - 1]
+                if payload:
+                    present[surah_number - 1] = 1
+                    for ayah in payload[0]["ayahs"]:
+                        if 1 <= ayah["numberInSurah"] <= len(texts):
+                            texts[ayah["numberInSurah"] - 1] = ayah["text"]
+                for text in texts:
+                    blob += text.encode("utf-8")
+                    offsets.append(len(blob))
+            f.write(struct.pack(f"<{EDITION_ID_BYTES}sI", key, len(blob)))
+            f.write(present)
+            f.write(offsets.tobytes())
+            f.write(bytes(blob) + b"\0" * (-len(blob) % 4))
+            packed[edition] = sum(present)
+            if progress:
+                progress(done, len(editions))
+    os.replace(tmp_path, path)
+    return packed
+
+
+# ---- reading ----
+class SurahTexts(Sequence):
+    """ Ayah texts of one surah in one edition, decoded from the map on access; index = ayah - 1 """
+
+    def __init__(self, corpus, edition, surah_number):
+        self._edition = corpus._editions[edition]
+        self._start = SURAH_STARTS[surah_number - 1]
+        self._count = quran_store.AYAH_COUNTS[surah_number - 1]
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return f"<SurahTexts ayahs {self._start}..{self._start + self._count - 1}>"
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        offsets, blob = self._edition
+        return str(blob[offsets[self._start + i]:offsets[self._start + i + 1]], "utf-8")
+
+
+class QuranCorpus:
+    def __init__(self, path=CORPUS_PATH):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if bytes(buf[:4]) != MAGIC:
+            raise ValueError(f"{path} is not a JannahWay corpus file")
+        version, n_editions, n_ayahs = struct.unpack_from("<III", buf, 4)
+        if version != FORMAT_VERSION or n_ayahs != quran_store.AYAH_TOTAL:
+            raise ValueError(f"{path} has corpus version {version} with {n_ayahs} ayahs, "
+                             f"expected {FORMAT_VERSION} with {quran_store.AYAH_TOTAL}")
+        offset = 16
+        self._editions = {}    # edition -> (offsets, text blob)
+        self._present = {}     # edition -> surahs present, as a memoryview of 0/1 bytes
+        for _ in range(n_editions):
+            key, blob_len = struct.unpack_from(f"<{EDITION_ID_BYTES}sI", buf, offset)
+            edition = key.rstrip(b"\0").decode("utf-8")
+            offset += EDITION_ID_BYTES + 4
+            self._present[edition] = buf[offset:offset + quran_store.SURAH_COUNT]
+            offset += _SURAH_MAP
+            offsets = buf[offset:offset + 4 * (n_ayahs + 1)].cast("I")
+            offset += 4 * (n_ayahs + 1)
+            self._editions[edition] = (offsets, buf[offset:offset + blob_len])
+            offset += blob_len + (-blob_len % 4)
+
+    @property
+    def editions(self):
+        return list(self._editions)
+
+    def has(self, edition, surah_number):
+        present = self._present.get(edition)
+        return bool(present is not None and present[surah_number - 1])
+
+    def ayah_bytes(self, edition, surah_number, ayah):
+        """ UTF-8 text of one ayah as a zero-copy memoryview """
+        offsets, blob = self._editions[edition]
+        i = ayah_index(surah_number, ayah)
+        return blob[offsets[i]:offsets[i + 1]]
+
+    def ayah(self, edition, surah_number, ayah):
+        return str(self.ayah_bytes(edition, surah_number, ayah), "utf-8")
+
+    def span(self, edition, first, last):
+        """
+        (offsets, text) for the ayahs first..last inclusive, each a (surah, ayah):
+        zero-copy views, text being the ayahs' UTF-8 back to back and offsets
+        the ayah boundaries within the file's text for that edition.
+        """
+        offsets, blob = self._editions[edition]
+        start, end = ayah_index(*first), ayah_index(*last) + 1
+        if end <= start:
+            raise ValueError(f"{first[0]}:{first[1]} comes after {last[0]}:{last[1]}")
+        return offsets[start:end + 1], blob[offsets[start]:offsets[end]]
+
+    def surah(self, edition, surah_number):
+        """ SurahTexts of the surah, or None when it was not in the store at build time """
+        if not self.has(edition, surah_number):
+            return None
+        return SurahTexts(self, edition, surah_number)
+
+    def close(self):
+        for offsets, blob in self._editions.values():
+            offsets.release()
+            blob.release()
+        for present in self._present.values():
+            present.release()
+        self._mmap.close()
+        self._file.close()
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus():
+    """ The process-wide mapped corpus, or None when no corpus file has been built """
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None and os.path.exists(CORPUS_PATH):
+            _corpus = QuranCorpus(CORPUS_PATH)
+        return _corpus
+
+
+# --------------- Benchmark ---------------
+
+def _memory():
+    """ (RSS, anonymous bytes) of this process from /proc; mapped file pages are shared, the heap is not """
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return values["Rss"], values["Anonymous"]
+
+
+def _load(kind, path, editions):
+    """ Child process of the benchmark: loads every ayah one way and reports time and memory """
+    before = _memory()
+    started = time.perf_counter()
+    if kind == "json":
+        store = quran_store.get_store()
+        kept = [store.load_verses(n, editions)[0] for n in range(1, quran_store.SURAH_COUNT + 1)]
+        opened = time.perf_counter()
+        chars = sum(len(a["text"]) for surah in kept if surah for edition in surah for a in edition["ayahs"])
+    else:
+        kept = QuranCorpus(path)
+        opened = time.perf_counter()
+        chars = sum(len(kept.ayah(e, n, a)) for e in editions for n in range(1, quran_store.SURAH_COUNT + 1)
+                    for a in range(1, quran_store.AYAH_COUNTS[n - 1] + 1))
+    done = time.perf_counter()
+    after = _memory()
+    print(json.dumps({"open": opened - started, "all": done - started, "chars": chars,
+                      "rss": after[0] - before[0], "heap": after[1] - before[1]}))
+
+
+def bench(editions=quran_store.DEFAULT_EDITIONS):
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.bin")
+        started = time.perf_counter()
+        packed = build_corpus(path, editions)
+        print(f"built {os.path.getsize(path) / 2**20:.1f} MiB in {time.perf_counter() - started:.2f} s "
+              f"({', '.join(f'{e}: {n} surahs' for e, n in packed.items())})")
+        results = {}
+        for kind in ("json", "binary"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "_load", kind, path, ",".join(editions)],
+                                 capture_output=True, text=True, check=True).stdout
+            results[kind] = json.loads(out.splitlines()[-1])
+    print(f"{'':8} {'open':>10} {'read all':>10} {'RSS':>10} {'own heap':>10}")
+    for kind, r in results.items():
+        print(f"{kind:8} {r['open'] * 1000:8.1f}ms {r['all'] * 1000:8.1f}ms "
+              f"{r['rss'] / 2**20:8.1f}MiB {r['heap'] / 2**20:8.1f}MiB")
+    print(f"same text: {results['json']['chars'] == results['binary']['chars']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or benchmark the binary Quran corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="pack the local store into the corpus file")
+    build_cmd.add_argument("--editions", default=",".join(quran_store.DEFAULT_EDITIONS))
+    build_cmd.add_argument("--path", default=CORPUS_PATH)
+    bench_cmd = sub.add_parser("bench", help="compare load time and memory with the JSON store")
+    bench_cmd.add_argument("--editions", default=",".join(quran_store.DEFAULT_EDITIONS))
+    load_cmd = sub.add_parser("_load")
+    load_cmd.add_argument("kind", choices=["json", "binary"])
+    load_cmd.add_argument("path")
+    load_cmd.add_argument("editions")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        packed = build_corpus(args.path, tuple(args.editions.split(",")))
+        print(f"Packed {', '.join(f'{e} ({n} surahs)' for e, n in packed.items())} into {args.path} "
+              f"in {time.perf_counter() - started:.2f}s")
+    elif args.command == "bench":
+        bench(tuple(args.editions.split(",")))
+    else:
+        _load(args.kind, args.path, tuple(args.editions.split(",")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
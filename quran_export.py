@@ -0,0 +1,385 @@
+"""
+Quran PDF export: any surah, ayah range or juz, or the whole mushaf.
+
+Each ayah is laid out with the Arabic text right-aligned in its own
+column next to the Asad translation. Arabic is shaped (joining forms,
+ligatures the font actually has) and reordered for right-to-left display
+once per ayah, and the shaped lines are saved in SQLite keyed by text,
+column width and font. Every export runs in a fresh job process, so the
+next export, of the same text or a selection that overlaps it, reads them
+back instead of shaping again. The story is generated lazily, one surah at
+a time, so only a few pages of flowables are alive at once.
+
+In the app, exports run as "quran-pdf" jobs on the jobs process pool and
+report how many ayahs have been laid out; the finished PDF is kept as the
+job's artifact, so asking for the same selection again is served from disk
+without rebuilding.
+
+    python quran_export.py                  # all 114 surahs, shaping cold vs read back from disk
+    python quran_export.py juz 30 out.pdf   # also: surah N, range S:A S:A, all
+
+Shaping needs arabic-reshaper and python-bidi. Without them the Arabic
+column is only reversed, with unjoined letters.
+"""
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+import jobs
+import pdf_report
+import quran_nav
+import quran_store
+
+SHAPED_PATH = os.environ.get("JANNAHWAY_SHAPED_LINES", os.path.join(quran_store.DATA_DIR, "shaped_lines.sqlite3"))
+# Bump when the layout or the shaping changes so exports and shaped lines are rebuilt
+EXPORT_VERSION = 1
+ARABIC_SIZE = 15
+ARABIC_LEADING = 24
+ENGLISH_SIZE = 9.5
+ARABIC_SHARE = 0.56  # of the frame width; the translation gets the rest less the gutter
+GUTTER = 14
+AYAH_SPACE = 8  # 3pt above each ayah, the rest below it
+RULE_COLOR = colors.HexColor("#D9E6DF")
+ACCENT_COLOR = pdf_report.HEADER_COLOR
+BISMILLAH = "بِسْمِ اللَّهِ الرَّحْمَٰنِ الرَّحِيمِ"
+
+JUZ_STARTS = quran_nav.JUZ_STARTS
+END = (quran_store.SURAH_COUNT + 1, 1)
+
+# start is the first (surah, ayah) included, end the first one after the selection
+Selection = namedtuple("Selection", ["title", "start", "end"])
+
+
+def _check(surah, ayah):
+    if not 1 <= surah <= quran_store.SURAH_COUNT or not 1 <= ayah <= quran_store.AYAH_COUNTS[surah - 1]:
+        raise ValueError(f"no ayah {surah}:{ayah}")
+
+
+def surah_selection(surah):
+    _check(surah, 1)
+    return Selection(f"Surah {surah}", (surah, 1), (surah + 1, 1))
+
+
+def range_selection(first, last):
+    """ From ayah first to ayah last inclusive, both (surah, ayah) """
+    _check(*first)
+    _check(*last)
+    if last < first:
+        raise ValueError(f"{last[0]}:{last[1]} comes before {first[0]}:{first[1]}")
+    end = (last[0], last[1] + 1) if last[1] < quran_store.AYAH_COUNTS[last[0] - 1] else (last[0] + 1, 1)
+    return Selection(f"{first[0]}:{first[1]} - {last[0]}:{last[1]}", tuple(first), end)
+
+
+def juz_selection(juz):
+    if not 1 <= juz <= len(JUZ_STARTS):
+        raise ValueError(f"no juz {juz}; expected 1 to {len(JUZ_STARTS)}")
+    return Selection(f"Juz {juz}", JUZ_STARTS[juz - 1], JUZ_STARTS[juz] if juz < len(JUZ_STARTS) else END)
+
+
+WHOLE_QURAN = Selection("The Holy Quran", (1, 1), END)
+
+
+def surah_spans(selection):
+    """ (surah, first ayah, last ayah) for every surah the selection touches """
+    (first_surah, first_ayah), (end_surah, end_ayah) = selection.start, selection.end
+    for surah in range(first_surah, min(end_surah, quran_store.SURAH_COUNT) + 1):
+        first = first_ayah if surah == first_surah else 1
+        last = end_ayah - 1 if surah == end_surah else quran_store.AYAH_COUNTS[surah - 1]
+        if first <= last:
+            yield surah, first, last
+
+
+def ayah_count(selection):
+    return sum(last - first + 1 for _, first, last in surah_spans(selection))
+
+
+# --------------- Arabic shaping ---------------
+
+class ShapedLines:
+    """
+    Shaped Arabic lines by (font, width, text), in memory and in SQLite.
+    New lines are written in one transaction by flush(), after each export.
+    """
+
+    def __init__(self, path=SHAPED_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._lines = {}
+        self._pending = []
+        self._fonts = {}
+        self.hits = self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shaped (
+                font TEXT NOT NULL,
+                width REAL NOT NULL,
+                text TEXT NOT NULL,
+                lines TEXT NOT NULL,
+                PRIMARY KEY (font, width, text)
+            ) WITHOUT ROWID
+        """)
+
+    def _font(self, font_size):
+        """ Everything besides text and width that changes the shaped lines """
+        if font_size not in self._fonts:
+            shaping = "reshaped" if pdf_report.arabic_reshaper else "reversed"
+            self._fonts[font_size] = f"{pdf_report.find_arabic_font()}:{font_size}:{shaping}:{EXPORT_VERSION}"
+        return self._fonts[font_size]
+
+    def get(self, text, width, font_size=ARABIC_SIZE):
+        key = (self._font(font_size), round(width, 2), text)
+        with self._lock:
+            lines = self._lines.get(key)
+            if lines is None:
+                row = self._conn.execute("SELECT lines FROM shaped WHERE font = ? AND width = ? AND text = ?",
+                                         key).fetchone()
+                if row:
+                    lines = self._lines[key] = tuple(json.loads(row[0]))
+        if lines is not None:
+            self.hits += 1
+            return lines
+        self.misses += 1
+        lines = tuple(pdf_report.shape_arabic(text, width, font_size))
+        with self._lock:
+            self._lines[key] = lines
+            self._pending.append((*key, json.dumps(lines, ensure_ascii=False)))
+        return lines
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO shaped (font, width, text, lines) VALUES (?, ?, ?, ?)", pending)
+        return len(pending)
+
+
+_shaped = None
+_shaped_lock = threading.Lock()
+
+
+def get_shaped_lines():
+    global _shaped
+    with _shaped_lock:
+        if _shaped is None:
+            _shaped = ShapedLines()
+        return _shaped
+
+
+def shape_ayah(text, width, font_size=ARABIC_SIZE):
+    """ Arabic text as right-to-left display lines no wider than width """
+    return get_shaped_lines().get(text, width, font_size)
+
+
+def shape_line(text):
+    """ A short Arabic run (surah name, bismillah) ready for a Paragraph """
+    return shape_ayah(text, 10 ** 6)[0] if text.strip() else ""
+
+
+# --------------- Layout ---------------
+
+class AyahBlock(Flowable):
+    """
+    One ayah: translation on the left, pre-shaped Arabic lines on the right.
+    Splits across pages line by line on both sides.
+    """
+
+    def __init__(self, lines, paragraph, arabic_width, english_width):
+        super().__init__()
+        self.lines = lines
+        self.paragraph = paragraph
+        self.arabic_width = arabic_width
+        self.english_width = english_width
+        self._english_height = 0
+
+    def wrap(self, available_width, available_height):
+        self._english_height = self.paragraph.wrap(self.english_width, available_height)[1] if self.paragraph else 0
+        self.width = available_width
+        self.height = max(len(self.lines) * ARABIC_LEADING, self._english_height) + AYAH_SPACE
+        return self.width, self.height
+
+    def split(self, available_width, available_height):
+        fit = int((available_height - AYAH_SPACE) // ARABIC_LEADING)
+        if fit < 1:
+            return []
+        parts = self.paragraph.split(self.english_width, available_height - AYAH_SPACE) if self.paragraph else []
+        if self.paragraph is None:
+            head, tail = None, None
+        elif not parts:
+            head, tail = None, self.paragraph  # not even one line of translation fits
+        else:
+            head, tail = parts[0], parts[1] if len(parts) > 1 else None
+        rest_lines = self.lines[fit:]
+        if not rest_lines and tail is None:
+            return [self]
+        return [AyahBlock(self.lines[:fit], head, self.arabic_width, self.english_width),
+                AyahBlock(rest_lines, tail, self.arabic_width, self.english_width)]
+
+    def draw(self):
+        canvas = self.canv
+        top = self.height - 3
+        if self.paragraph:
+            self.paragraph.drawOn(canvas, 0, top - self._english_height)
+        canvas.setFont(pdf_report.arabic_font(), ARABIC_SIZE)
+        for i, line in enumerate(self.lines):
+            canvas.drawRightString(self.width, top - (i + 1) * ARABIC_LEADING + ARABIC_LEADING * 0.3, line)
+        canvas.setStrokeColor(RULE_COLOR)
+        canvas.setLineWidth(0.5)
+        canvas.line(0, 1, self.width, 1)
+
+
+def _styles():
+    sample = getSampleStyleSheet()
+    font = pdf_report.arabic_font()
+    return {
+        "title": sample["Title"],
+        "heading": ParagraphStyle("SurahHeading", parent=sample["Heading2"], textColor=ACCENT_COLOR,
+                                  alignment=TA_CENTER, spaceBefore=6),
+        "bismillah": ParagraphStyle("Bismillah", fontName=font, fontSize=ARABIC_SIZE + 3,
+                                    leading=ARABIC_LEADING + 6, alignment=TA_CENTER, spaceAfter=6),
+        "english": ParagraphStyle("Translation", parent=sample["Normal"], fontSize=ENGLISH_SIZE,
+                                  leading=ENGLISH_SIZE * 1.35),
+    }
+
+
+def _story(selection, frame_width, progress=None):
+    """ Flowables for the selection, generated one surah at a time """
+    styles = _styles()
+    font = pdf_report.arabic_font()
+    arabic_width = frame_width * ARABIC_SHARE
+    english_width = frame_width - arabic_width - GUTTER
+    yield Paragraph(escape(selection.title), styles["title"])
+    for i, (surah, first, last) in enumerate(surah_spans(selection)):
+        editions = quran_store.get_surah_verses(surah)
+        if not editions:
+            raise LookupError(f"surah {surah} is not in the local corpus and could not be downloaded")
+        arabic, english = editions[0], editions[-1]
+        if i and first == 1:
+            yield PageBreak()
+        name = escape(arabic.get("englishName", f"Surah {surah}"))
+        yield Paragraph(f'{surah}. {name} &nbsp; <font name="{font}">{escape(shape_line(arabic.get("name", "")))}</font>',
+                        styles["heading"])
+        if first == 1 and surah not in (1, 9):
+            yield Paragraph(escape(shape_line(BISMILLAH)), styles["bismillah"])
+        for ar, en in zip(arabic["ayahs"][first - 1:last], english["ayahs"][first - 1:last]):
+            label = f"{surah}:{ar['numberInSurah']}"
+            paragraph = Paragraph(f'<font color="#1E563C"><b>{label}</b></font> &nbsp;{escape(en["text"])}',
+                                  styles["english"])
+            yield AyahBlock(shape_ayah(ar["text"], arabic_width), paragraph, arabic_width, english_width)
+            if progress:
+                progress(1)
+        yield Spacer(1, 8)
+
+
+def _footer(title):
+    def draw(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(pdf_report.BASE_FONT, 8)
+        canvas.setFillColor(colors.grey)
+        canvas.drawString(doc.leftMargin, 18, f"JannahWay - {title}")
+        canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 18, str(doc.page))
+        canvas.restoreState()
+    return draw
+
+
+def build_pdf(selection, progress=None):
+    """ PDF bytes for the selection; progress(n) is called as ayahs are laid out """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, title=selection.title, topMargin=36, bottomMargin=36,
+                            leftMargin=40, rightMargin=40)
+    footer = _footer(selection.title)
+    try:
+        doc.build(pdf_report.LazyStory(_story(selection, doc.width, progress)), onFirstPage=footer,
+                  onLaterPages=footer)
+    finally:
+        get_shaped_lines().flush()  # keep what was shaped, even for an export that failed part way
+    return buffer.getvalue()
+
+
+# --------------- Background jobs ---------------
+
+def file_name(selection):
+    return "quran_" + "".join(c if c.isalnum() else "_" for c in selection.title.lower()) + ".pdf"
+
+
+def run_export_job(params, progress):
+    """ jobs handler: builds the PDF in a pool process, reporting ayahs laid out """
+    selection = Selection(params["title"], tuple(params["start"]), tuple(params["end"]))
+    total = ayah_count(selection)
+    done = 0
+
+    def advance(n):
+        nonlocal done
+        done += n
+        progress(done, total)
+
+    return jobs.Result(build_pdf(selection, advance), file_name(selection), "application/pdf")
+
+
+jobs.register("quran-pdf", "quran_export:run_export_job", cpu_bound=True)
+
+
+def start_export(selection, owner=None):
+    """ Queues an export, or returns the job that already has (or is making) this PDF """
+    params = {"title": selection.title, "start": list(selection.start), "end": list(selection.end),
+              "version": EXPORT_VERSION}
+    return jobs.get_queue().submit("quran-pdf", params, owner=owner, total=ayah_count(selection))
+
+
+# --------------- Command line ---------------
+
+def parse_selection(args):
+    """ ["surah", "2"], ["juz", "30"], ["range", "2:255", "2:257"] or ["all"] """
+    kind = args[0] if args else "all"
+    if kind == "surah":
+        return surah_selection(int(args[1]))
+    if kind == "juz":
+        return juz_selection(int(args[1]))
+    if kind == "range":
+        return range_selection(*(tuple(int(x) for x in ref.split(":")) for ref in args[1:3]))
+    if kind == "all":
+        return WHOLE_QURAN
+    raise ValueError(f"unknown selection {kind!r}")
+
+
+def bench():
+    global _shaped
+    selections = [surah_selection(n) for n in range(1, quran_store.SURAH_COUNT + 1)]
+    print(f"Arabic font: {pdf_report.find_arabic_font() or 'none found (Helvetica)'}, "
+          f"shaping: {'arabic-reshaper + python-bidi' if pdf_report.arabic_reshaper else 'unavailable'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # A fresh ShapedLines per pass stands in for the fresh process each export job gets
+        for label in ("cold", "shaped lines on disk"):
+            _shaped = ShapedLines(os.path.join(tmp, "shaped.sqlite3"))
+            started = time.perf_counter()
+            size = sum(len(build_pdf(selection)) for selection in selections)
+            print(f"  all 114 surahs, {label:20} {time.perf_counter() - started:7.2f} s   {size / 2**20:6.1f} MiB"
+                  f"   ({_shaped.hits} lines read back, {_shaped.misses} shaped)")
+        _shaped = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        out = sys.argv[-1] if sys.argv[-1].endswith(".pdf") else "quran_export.pdf"
+        chosen = parse_selection([a for a in sys.argv[1:] if not a.endswith(".pdf")])
+        with open(out, "wb") as f:
+            f.write(build_pdf(chosen))
+        print(f"{chosen.title}: {ayah_count(chosen)} ayahs -> {out}")
+    else:
+        bench()
@@ -0,0 +1,311 @@
+"""
+Structural navigation index of the Quran: juz, hizb, hizb quarter,
+manzil, Madani page and ruku.
+
+For every division the index keeps the unit each ayah belongs to (one
+uint16 per ayah, in Quran order) and the first ayah of every unit, so both
+"which juz/page/ruku is 2:255 in?" and "which ayahs make up page 50?" are
+O(1) lookups instead of a scan of the API's per-ayah metadata.
+
+Juz and manzil boundaries are fixed and built in. Hizb quarters, pages
+and rukus are taken from the per-ayah metadata of the corpus store,
+checked, and saved to a small file so later processes just read it back:
+
+    python quran_nav.py build
+    python quran_nav.py juz 30            # the ayah range of a unit
+    python quran_nav.py at 2:255          # every unit an ayah is in
+    python quran_nav.py bench             # index lookups vs scanning the surah payloads
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+import quran_corpus
+import quran_store
+
+NAV_PATH = os.environ.get("JANNAHWAY_NAV", os.path.join(quran_store.DATA_DIR, "quran_nav.bin"))
+MAGIC = b"JWQN"
+FORMAT_VERSION = 1
+
+JUZ = "juz"
+HIZB = "hizb"
+QUARTER = "quarter"
+MANZIL = "manzil"
+PAGE = "page"
+RUKU = "ruku"
+DIVISIONS = (JUZ, HIZB, QUARTER, MANZIL, PAGE, RUKU)
+LABELS = {JUZ: "Juz", HIZB: "Hizb", QUARTER: "Hizb quarter", MANZIL: "Manzil", PAGE: "Page", RUKU: "Ruku"}
+UNITS = {JUZ: 30, HIZB: 60, QUARTER: 240, MANZIL: 7, PAGE: 604, RUKU: 556}
+# Stored per ayah; hizbs are derived from the quarters
+STORED = (JUZ, QUARTER, MANZIL, PAGE, RUKU)
+METADATA_KEYS = {JUZ: "juz", QUARTER: "hizbQuarter", MANZIL: "manzil", PAGE: "page", RUKU: "ruku"}
+
+JUZ_STARTS = (
+    (1, 1), (2, 142), (2, 253), (3, 93), (4, 24), (4, 148), (5, 82), (6, 111), (7, 88), (8, 41),
+    (9, 93), (11, 6), (12, 53), (15, 1), (17, 1), (18, 75), (21, 1), (23, 1), (25, 21), (27, 56),
+    (29, 46), (33, 31), (36, 28), (39, 32), (41, 47), (46, 1), (51, 31), (58, 1), (67, 1), (78, 1),
+)
+MANZIL_STARTS = ((1, 1), (5, 1), (10, 1), (17, 1), (26, 1), (37, 1), (50, 1))
+
+
+# Surah of every ayah, in Quran order
+_SURAH_OF = array("B", (s for s, count in enumerate(quran_store.AYAH_COUNTS, start=1) for _ in range(count)))
+
+
+def ref(index):
+    """ (surah, ayah) of an ayah's 0-based position in Quran order """
+    if not 0 <= index < quran_store.AYAH_TOTAL:
+        raise IndexError(f"there is no ayah at position {index}")
+    return _SURAH_OF[index], index - quran_corpus.SURAH_STARTS[_SURAH_OF[index] - 1] + 1
+
+
+def _units_from_starts(starts):
+    """ Per-ayah unit numbers from the (surah, ayah) each unit starts at """
+    units = array("H", bytes(2 * quran_store.AYAH_TOTAL))
+    bounds = [quran_corpus.ayah_index(*start) for start in starts] + [quran_store.AYAH_TOTAL]
+    for unit, (start, end) in enumerate(zip(bounds, bounds[1:]), start=1):
+        units[start:end] = array("H", [unit]) * (end - start)
+    return units
+
+
+def _valid(units, count):
+    """ Units must start at 1 and go up one at a time to count """
+    if len(units) != quran_store.AYAH_TOTAL or units[0] != 1 or units[-1] != count:
+        return False
+    return all(0 <= b - a <= 1 for a, b in zip(units, units[1:]))
+
+
+class NavIndex:
+    def __init__(self, units):
+        """ units: {division: array("H") of the unit of every ayah} for the divisions available """
+        self._units = dict(units)
+        if QUARTER in self._units:
+            self._units[HIZB] = array("H", ((q - 1) // 4 + 1 for q in self._units[QUARTER]))
+        self._starts = {}
+        for division, per_ayah in self._units.items():
+            starts = array("H", [0])
+            for i in range(1, len(per_ayah)):
+                if per_ayah[i] != per_ayah[i - 1]:
+                    starts.append(i)
+            starts.append(len(per_ayah))
+            self._starts[division] = starts
+        self._divisions = tuple(d for d in DIVISIONS if d in self._units)
+
+    @property
+    def divisions(self):
+        return self._divisions
+
+    def count(self, division):
+        return len(self._starts[division]) - 1
+
+    def unit(self, division, surah_number, ayah):
+        """ The unit of the division the ayah is in, e.g. unit(PAGE, 2, 255) -> 42 """
+        return self._units[division][quran_corpus.ayah_index(surah_number, ayah)]
+
+    def locate(self, surah_number, ayah):
+        """ {division: unit} for every available division """
+        i = quran_corpus.ayah_index(surah_number, ayah)
+        return {division: self._units[division][i] for division in self._divisions}
+
+    def positions(self, division, number):
+        """ range of 0-based Quran-order positions of the unit's ayahs """
+        starts = self._starts[division]
+        if not 1 <= number < len(starts):
+            raise ValueError(f"no {division} {number}; expected 1 to {len(starts) - 1}")
+        return range(starts[number - 1], starts[number])
+
+    def bounds(self, division, number):
+        """ (first, last) (surah, ayah) of the unit, both included """
+        positions = self.positions(division, number)
+        return ref(positions[0]), ref(positions[-1])
+
+    def spans(self, division, number, positions=None):
+        """ [(surah, first ayah, last ayah)] of the unit, or of a sub-range of its positions """
+        positions = positions if positions is not None else self.positions(division, number)
+        spans = []
+        for i in (positions[0], *(p for p in positions[1:] if _SURAH_OF[p] != _SURAH_OF[p - 1])):
+            surah_number, first = ref(i)
+            last_position = min(positions[-1], quran_corpus.SURAH_STARTS[surah_number] - 1)
+            spans.append((surah_number, first, ref(last_position)[1]))
+        return spans
+
+    def save(self, path=NAV_PATH):
+        stored = [d for d in STORED if d in self._units]
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<II", FORMAT_VERSION, len(stored)))
+            for division in stored:
+                f.write(struct.pack("<8s", division.encode("ascii")))
+                self._units[division].tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=NAV_PATH):
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if header[:4] != MAGIC:
+                raise ValueError(f"{path} is not a JannahWay navigation index")
+            version, n_divisions = struct.unpack("<II", header[4:])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has index version {version}, expected {FORMAT_VERSION}")
+            units = {}
+            for _ in range(n_divisions):
+                division = f.read(8).rstrip(b"\0").decode("ascii")
+                units[division] = array("H")
+                units[division].fromfile(f, quran_store.AYAH_TOTAL)
+        return cls(units)
+
+
+def built_in():
+    """ Juz and manzil only, from the fixed boundaries """
+    return NavIndex({JUZ: _units_from_starts(JUZ_STARTS), MANZIL: _units_from_starts(MANZIL_STARTS)})
+
+
+def build_index(store=None):
+    """
+    Index with every division the store's ayah metadata gives consistently;
+    the built-in juz and manzil boundaries fill in for the rest.
+    """
+    store = store or quran_store.get_store()
+    units = {JUZ: _units_from_starts(JUZ_STARTS), MANZIL: _units_from_starts(MANZIL_STARTS)}
+    found = {division: array("H") for division in STORED}
+    for surah_number in range(1, quran_store.SURAH_COUNT + 1):
+        payload, _ = store.load_verses(surah_number, (quran_store.DEFAULT_EDITIONS[0],))
+        ayahs = payload[0]["ayahs"] if payload else []
+        if len(ayahs) != quran_store.AYAH_COUNTS[surah_number - 1]:
+            break  # surah missing from the store: only the built-in divisions can be indexed
+        for division, key in METADATA_KEYS.items():
+            found[division].extend(int(a.get(key) or 0) for a in ayahs)
+    for division, per_ayah in found.items():
+        if _valid(per_ayah, UNITS[division]):
+            units[division] = per_ayah
+    return NavIndex(units)
+
+
+_index = None
+_index_surahs = None  # surahs in the store when an incomplete _index was built
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Process-wide index: the saved file, else built from the corpus store
+    (and saved when it came out complete), else the built-in divisions.
+    An incomplete index is built again once the store holds more surahs.
+    """
+    global _index, _index_surahs
+    with _index_lock:
+        if _index is None and os.path.exists(NAV_PATH):
+            _index = NavIndex.load(NAV_PATH)
+        if _index is None or len(_index.divisions) < len(DIVISIONS):
+            store = quran_store.get_store()
+            surahs = store.surah_count(quran_store.DEFAULT_EDITIONS[0])
+            if surahs != _index_surahs:
+                _index, _index_surahs = build_index(store), surahs
+                if len(_index.divisions) == len(DIVISIONS):
+                    _index.save(NAV_PATH)
+        return _index
+
+
+# --------------- Benchmark ---------------
+
+def _payloads(units):
+    """ Per-surah API-style payloads carrying the given per-ayah units as metadata """
+    payloads, i = [], 0
+    for surah_number, count in enumerate(quran_store.AYAH_COUNTS, start=1):
+        ayahs = []
+        for number in range(1, count + 1):
+            ayahs.append({"number": i + 1, "numberInSurah": number, "text": "",
+                          **{key: units[division][i] for division, key in METADATA_KEYS.items()}})
+            i += 1
+        payloads.append({"number": surah_number, "ayahs": ayahs})
+    return payloads
+
+
+def bench(lookups=2000):
+    import random
+
+    # Synthetic but well-formed divisions: evenly spread pages, rukus and quarters
+    units = {division: array("H", (1 + i * UNITS[division] // quran_store.AYAH_TOTAL
+                                   for i in range(quran_store.AYAH_TOTAL)))
+             for division in (QUARTER, PAGE, RUKU)}
+    units[JUZ], units[MANZIL] = _units_from_starts(JUZ_STARTS), _units_from_starts(MANZIL_STARTS)
+    payloads = _payloads(units)
+    index = NavIndex(units)
+    rng = random.Random(7)
+    pages = [rng.randint(1, UNITS[PAGE]) for _ in range(lookups)]
+    probes = [ref(rng.randrange(quran_store.AYAH_TOTAL)) for _ in range(lookups)]
+
+    def scan_page(page):
+        return [(p["number"], a["numberInSurah"]) for p in payloads for a in p["ayahs"] if a["page"] == page]
+
+    def scan_locate(surah_number, ayah):
+        a = payloads[surah_number - 1]["ayahs"][ayah - 1]
+        return {division: a[key] for division, key in METADATA_KEYS.items()}
+
+    results = {}
+    for label, page_of, where in (
+        ("scan payloads", scan_page, scan_locate),
+        ("nav index", lambda page: [ref(i) for i in index.positions(PAGE, page)], index.locate),
+    ):
+        started = time.perf_counter()
+        found = [page_of(page) for page in pages]
+        paged = time.perf_counter() - started
+        started = time.perf_counter()
+        for probe in probes:
+            where(*probe)
+        located = time.perf_counter() - started
+        results[label] = found
+        print(f"  {label:14} page ayahs {paged / lookups * 1e6:9.1f} µs   ayah's units {located / lookups * 1e6:6.2f} µs")
+    print(f"  same pages: {results['scan payloads'] == results['nav index']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the Quran navigation index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="index the ayah metadata in the local store")
+    sub.add_parser("bench", help="compare lookups with scanning the surah payloads")
+    at_cmd = sub.add_parser("at", help="the units an ayah is in")
+    at_cmd.add_argument("ayah", help="surah:ayah, e.g. 2:255")
+    for division in DIVISIONS:
+        unit_cmd = sub.add_parser(division, help=f"the ayahs of a {division}")
+        unit_cmd.add_argument("number", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = build_index()
+        index.save(NAV_PATH)
+        missing = [d for d in DIVISIONS if d not in index.divisions]
+        print(f"Indexed {', '.join(f'{d} ({index.count(d)})' for d in index.divisions)} into {NAV_PATH} "
+              f"in {time.perf_counter() - started:.2f}s" + (f"; not in the store: {', '.join(missing)}" if missing else ""))
+        return 0
+    if args.command == "bench":
+        bench()
+        return 0
+    index = get_index()
+    started = time.perf_counter()
+    if args.command == "at":
+        surah_number, ayah = (int(part) for part in args.ayah.split(":"))
+        result = index.locate(surah_number, ayah)
+        elapsed = time.perf_counter() - started
+        print("  ".join(f"{division} {unit}" for division, unit in result.items()))
+    else:
+        if args.command not in index.divisions:
+            print(f"No {args.command} data; run `python quran_nav.py build` with a full corpus store")
+            return 1
+        (first, last), spans = index.bounds(args.command, args.number), index.spans(args.command, args.number)
+        elapsed = time.perf_counter() - started
+        print(f"{args.command} {args.number}: {first[0]}:{first[1]} - {last[0]}:{last[1]}, "
+              f"{len(index.positions(args.command, args.number))} ayahs in {len(spans)} surahs")
+    print(f"lookup {elapsed * 1e6:.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Concurrent bulk prefetch of the Quran corpus into the local store.
+
+Every (surah, edition) pair is an independent download. They run on an
+asyncio loop with a bounded number in flight and a token-bucket rate limit,
+each result is written to the store as soon as it arrives, and pairs that
+are already fresh in the store are skipped, so an interrupted run picks up
+where it stopped.
+
+    python quran_prefetch.py --editions quran-uthmani,en.asad,ur.jalandhry
+    python quran_prefetch.py --bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import quran_store
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 20.0  # requests per second, shared by all workers
+
+
+class RateLimiter:
+    """ Token bucket: `rate` tokens per second, bursts of up to `burst` """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def prefetch(surahs=None, editions=quran_store.DEFAULT_EDITIONS, store=None,
+                   concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                   base_url=quran_store.BASE_URL, progress=None):
+    """
+    Downloads every missing or stale (surah, edition) pair and returns
+    {"done": n, "failed": [(surah, edition), ...], "skipped": n, "seconds": t}.
+    progress(done, total, surah, edition, ok) is called after each pair.
+    """
+    store = store or quran_store.get_store()
+    surahs = list(surahs or range(1, quran_store.SURAH_COUNT + 1))
+    pending = store.missing_verses(editions, surahs)
+    skipped = len(surahs) * len(editions) - len(pending)
+    started = time.perf_counter()
+
+    loop = asyncio.get_running_loop()
+    # Own pool sized to the concurrency; the default executor is tiny on 1-2 core hosts
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prefetch")
+
+    if not store.load_surahs()[1]:
+        try:
+            surah_list = await loop.run_in_executor(executor, quran_store.download_surahs, base_url)
+        except requests.RequestException:
+            surah_list = None  # only names and metadata; the verses below are fetched regardless
+        if surah_list:
+            store.save_surahs(surah_list)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    failed = []
+    done = 0
+
+    async def fetch_one(surah_number, edition):
+        nonlocal done
+        async with semaphore:
+            await limiter.acquire()
+            ok = False
+            try:
+                data = await loop.run_in_executor(
+                    executor, quran_store.download_surah_verses, surah_number, (edition,), base_url)
+                if data:
+                    # Written straight away so an interruption keeps what has arrived
+                    await loop.run_in_executor(executor, store.save_verses, surah_number, data)
+                    ok = True
+            except (requests.RequestException, KeyError, TypeError, ValueError):
+                # A malformed payload fails only this pair, not the whole gather
+                pass
+            if not ok:
+                failed.append((surah_number, edition))
+            done += 1
+            if progress:
+                progress(done, len(pending), surah_number, edition, ok)
+
+    try:
+        await asyncio.gather(*(fetch_one(n, e) for n, e in pending))
+    finally:
+        executor.shutdown(wait=False)
+    return {"done": done - len(failed), "failed": failed, "skipped": skipped,
+            "seconds": time.perf_counter() - started}
+
+
+def prefetch_sync(*args, **kwargs):
+    return asyncio.run(prefetch(*args, **kwargs))
+
+
+def print_progress(done, total, surah_number, edition, ok):
+    print(f"[{done}/{total}] surah {surah_number} {edition} {'ok' if ok else 'failed'}", flush=True)
+
+
+# ---- benchmark against a local mock of api.alquran.cloud ----
+def _start_mock_server(latency):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MockHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            parts = self.path.strip("/").split("/")
+            if parts[-1] == "surah":
+                data = [{"number": n, "englishName": f"Surah {n}", "name": "", "revelationType": "meccan"}
+                        for n in range(1, quran_store.SURAH_COUNT + 1)]
+            else:
+                surah_number, editions = int(parts[-3]), parts[-1].split(",")
+                data = [{"edition": {"identifier": e}, "number": surah_number,
+                         "ayahs": [{"numberInSurah": i, "text": "x" * 80} for i in range(1, 50)]}
+                        for e in editions]
+            body = json.dumps({"code": 200, "data": data}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(editions=quran_store.DEFAULT_EDITIONS, latency=0.05, concurrency=DEFAULT_CONCURRENCY):
+    server = _start_mock_server(latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = quran_store.QuranStore(os.path.join(tmp, "sequential.sqlite3"))
+        started = time.perf_counter()
+        for n in range(1, quran_store.SURAH_COUNT + 1):
+            store.save_verses(n, quran_store.download_surah_verses(n, editions, base_url))
+        sequential = time.perf_counter() - started
+
+        store = quran_store.QuranStore(os.path.join(tmp, "concurrent.sqlite3"))
+        result = prefetch_sync(editions=editions, store=store, concurrency=concurrency,
+                               rate=1000, base_url=base_url)
+    server.shutdown()
+    print(f"mock latency {latency * 1000:.0f} ms, {quran_store.SURAH_COUNT} surahs x {len(editions)} editions")
+    print(f"sequential fetch_surah_verses loop: {sequential:.2f}s")
+    print(f"concurrent prefetch ({concurrency} in flight): {result['seconds']:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefetch the Quran corpus into the local store")
+    parser.add_argument("--editions", default=",".join(quran_store.DEFAULT_EDITIONS))
+    parser.add_argument("--surahs", help="comma separated surah numbers (default: all 114)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="max requests per second")
+    parser.add_argument("--bench", action="store_true", help="compare sequential vs concurrent on a local mock server")
+    args = parser.parse_args(argv)
+
+    editions = tuple(args.editions.split(","))
+    if args.bench:
+        bench(editions, concurrency=args.concurrency)
+        return 0
+    surahs = [int(n) for n in args.surahs.split(",")] if args.surahs else None
+    result = prefetch_sync(surahs, editions, concurrency=args.concurrency, rate=args.rate, progress=print_progress)
+    print(f"Fetched {result['done']}, skipped {result['skipped']} already cached, "
+          f"{len(result['failed'])} failed in {result['seconds']:.1f}s")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Full-text search over the Quran corpus.
+
+An inverted index with positions is built once from the local corpus store
+for two fields: the Uthmani Arabic text and the Asad English translation.
+Arabic is matched without diacritics and with alef/hamza/yaa forms unified,
+English through a light suffix-stripping stemmer. Queries support plain
+terms (BM25 ranked), "quoted phrases" and prefix* terms.
+
+The index is written to one binary file and opened with mmap, so startup
+only maps the file and every process shares the same pages:
+
+    python quran_search.py build
+    python quran_search.py query "most gracious"
+"""
+import argparse
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from collections import defaultdict
+
+import jobs
+import quran_prefetch
+import quran_store
+
+INDEX_PATH = os.environ.get("JANNAHWAY_SEARCH_INDEX", os.path.join(quran_store.DATA_DIR, "quran_search.idx"))
+FIELDS = ("quran-uthmani", "en.asad")
+MAGIC = b"JWQS"
+FORMAT_VERSION = 1
+MAX_PREFIX_EXPANSION = 50
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# ---- text normalization ----
+_ARABIC_DIACRITICS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_ARABIC_FORMS = str.maketrans({
+    "\u0622": "\u0627",  # آ
+    "\u0623": "\u0627",  # أ
+    "\u0625": "\u0627",  # إ
+    "\u0671": "\u0627",  # ٱ alef wasla
+    "\u0649": "\u064A",  # ى alef maqsura
+    "\u0629": "\u0647",  # ة ta marbuta
+    "\u0624": "\u0648",  # ؤ
+    "\u0626": "\u064A",  # ئ
+})
+_ARABIC_WORD = re.compile("[\u0621-\u064A\u066E-\u06D3]+")
+_ARABIC_CHAR = re.compile("[\u0600-\u06FF]")
+_ENGLISH_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+_SUFFIXES = (
+    ("ational", "ate"), ("tional", "tion"), ("fulness", "ful"), ("ousness", "ous"), ("iveness", "ive"),
+    ("ization", "ize"), ("ations", "ate"), ("ation", "ate"), ("ements", ""), ("ement", ""),
+    ("nesses", ""), ("ness", ""), ("ments", ""), ("ment", ""), ("ingly", ""), ("edly", ""),
+    ("ings", ""), ("ing", ""), ("ies", "y"), ("ied", "y"), ("ed", ""), ("es", ""), ("ly", ""), ("s", ""),
+)
+
+
+def normalize_arabic(text):
+    return _ARABIC_DIACRITICS.sub("", text).translate(_ARABIC_FORMS)
+
+
+def stem(word):
+    """ Light English stemmer: strips one common suffix, keeping at least 3 letters """
+    if word.endswith("'s"):
+        word = word[:-2]
+    if word.endswith("ss") or len(word) <= 3:
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if suffix == "s" and word[-2] in "ius":
+            return word  # gracious, his, thus
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= 3:
+            word = word[: -len(suffix)] + replacement
+            # running -> run, hopped -> hop
+            if suffix in ("ing", "ed", "ings") and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    return word
+
+
+def tokenize(text, field):
+    if field == "quran-uthmani":
+        return _ARABIC_WORD.findall(normalize_arabic(text))
+    return [stem(w) for w in _ENGLISH_WORD.findall(text.lower())]
+
+
+def is_arabic(text):
+    return bool(_ARABIC_CHAR.search(text))
+
+
+# ---- building ----
+def iter_corpus(store=None):
+    """ Yields (surah, ayah, {edition: text}) from the local store, no network """
+    store = store or quran_store.get_store()
+    for surah_number in range(1, quran_store.SURAH_COUNT + 1):
+        editions, _ = store.load_verses(surah_number, FIELDS)
+        if not editions:
+            continue
+        for verses in zip(*(edition["ayahs"] for edition in editions)):
+            yield surah_number, verses[0]["numberInSurah"], {f: v["text"] for f, v in zip(FIELDS, verses)}
+
+
+def build_index(path=INDEX_PATH, store=None, progress=None, complete=False):
+    """
+    Builds the index file from whatever is in the corpus store; returns the
+    doc count. With complete=True nothing is written unless every ayah is there.
+    """
+    refs = array("H")
+    doc_lens = {f: array("I") for f in FIELDS}
+    postings = {f: defaultdict(list) for f in FIELDS}  # term -> [doc, tf, pos..., doc, tf, pos...]
+
+    for doc_id, (surah_number, ayah, texts) in enumerate(iter_corpus(store)):
+        refs.extend((surah_number, ayah))
+        if progress:
+            progress(doc_id + 1, quran_store.AYAH_TOTAL)
+        for field in FIELDS:
+            tokens = tokenize(texts[field], field)
+            doc_lens[field].append(len(tokens))
+            positions = defaultdict(list)
+            for pos, token in enumerate(tokens):
+                positions[token].append(pos)
+            for token, token_positions in positions.items():
+                postings[field][token].extend((doc_id, len(token_positions), *token_positions))
+
+    n_docs = len(refs) // 2
+    if complete and n_docs < quran_store.AYAH_TOTAL:
+        raise ValueError(f"only {n_docs} of {quran_store.AYAH_TOTAL} ayahs are saved locally; "
+                         "check the connection and build the index again")
+    tmp_path = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<II", FORMAT_VERSION, n_docs))
+        f.write(refs.tobytes())
+        for field in FIELDS:
+            terms = sorted(postings[field])
+            term_blob = bytearray()
+            term_offsets = array("I", [0])
+            posting_offsets = array("I", [0])
+            posting_data = array("I")
+            for term in terms:
+                term_blob += term.encode("utf-8")
+                term_offsets.append(len(term_blob))
+                entries = postings[field][term]
+                posting_data.extend(entries)
+                posting_offsets.append(len(posting_data))
+            term_blob += b"\0" * (-len(term_blob) % 4)  # keep the arrays after it 4-byte aligned
+            lens = doc_lens[field]
+            avgdl = sum(lens) / n_docs if n_docs else 0.0
+            f.write(struct.pack("<IIIId", len(terms), len(term_blob), len(posting_data), 0, avgdl))
+            f.write(lens.tobytes())
+            f.write(term_offsets.tobytes())
+            f.write(bytes(term_blob))
+            f.write(posting_offsets.tobytes())
+            f.write(posting_data.tobytes())
+    os.replace(tmp_path, path)
+    return n_docs
+
+
+# ---- querying ----
+class FieldIndex:
+    """ Read-only view of one field's section of the mmapped index file """
+
+    def __init__(self, buf, offset, n_docs):
+        n_terms, blob_len, n_postings, _, self.avgdl = struct.unpack_from("<IIIId", buf, offset)
+        offset += 24
+        self.n_docs = n_docs
+        self.n_terms = n_terms
+        self.doc_lens = buf[offset:offset + 4 * n_docs].cast("I")
+        offset += 4 * n_docs
+        self.term_offsets = buf[offset:offset + 4 * (n_terms + 1)].cast("I")
+        offset += 4 * (n_terms + 1)
+        self.term_blob = buf[offset:offset + blob_len]
+        offset += blob_len
+        self.posting_offsets = buf[offset:offset + 4 * (n_terms + 1)].cast("I")
+        offset += 4 * (n_terms + 1)
+        self.postings_data = buf[offset:offset + 4 * n_postings].cast("I")
+        self.end = offset + 4 * n_postings
+
+    def term(self, i):
+        return bytes(self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, term):
+        key = term.encode("utf-8")
+        i = self._lower_bound(key)
+        return i if i < self.n_terms and self.term(i) == key else None
+
+    def prefix(self, prefix, limit=MAX_PREFIX_EXPANSION):
+        key = prefix.encode("utf-8")
+        i = self._lower_bound(key)
+        found = []
+        while i < self.n_terms and len(found) < limit and self.term(i).startswith(key):
+            found.append(i)
+            i += 1
+        return found
+
+    def postings(self, term_id):
+        """ {doc_id: positions} for a term """
+        data = self.postings_data
+        i, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+        result = {}
+        while i < end:
+            doc_id, tf = data[i], data[i + 1]
+            result[doc_id] = data[i + 2:i + 2 + tf]
+            i += 2 + tf
+        return result
+
+    def bm25(self, term_id, docs):
+        df = len(docs)
+        idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+        scores = {}
+        for doc_id, positions in docs.items():
+            tf = len(positions)
+            norm = K1 * (1 - B + B * self.doc_lens[doc_id] / (self.avgdl or 1))
+            scores[doc_id] = idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+
+def parse_query(query):
+    """ Splits a query into ("phrase", [terms]), ("prefix", text) and ("term", text) parts """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+        if phrase:
+            parts.append(("phrase", phrase))
+        elif word.endswith("*") and len(word) > 1:
+            parts.append(("prefix", word[:-1]))
+        else:
+            parts.append(("term", word))
+    return parts
+
+
+class QuranSearchIndex:
+    def __init__(self, path=INDEX_PATH):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if bytes(buf[:4]) != MAGIC:
+            raise ValueError(f"{path} is not a JannahWay search index")
+        version, self.n_docs = struct.unpack_from("<II", buf, 4)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has index version {version}, expected {FORMAT_VERSION}")
+        offset = 12
+        self.refs = buf[offset:offset + 4 * self.n_docs].cast("H")
+        offset += 4 * self.n_docs
+        self.fields = {}
+        for field in FIELDS:
+            self.fields[field] = FieldIndex(buf, offset, self.n_docs)
+            offset = self.fields[field].end
+
+    def ref(self, doc_id):
+        return self.refs[2 * doc_id], self.refs[2 * doc_id + 1]
+
+    def search(self, query, limit=20, field=None):
+        """ Returns [(surah, ayah, score)] best first """
+        field = field or ("quran-uthmani" if is_arabic(query) else "en.asad")
+        index = self.fields[field]
+        scores = defaultdict(float)
+        required = None  # docs that matched every phrase / term group
+
+        for kind, text in parse_query(query):
+            if kind == "prefix":
+                tokens = tokenize(text, field) if field == "quran-uthmani" else _ENGLISH_WORD.findall(text.lower())
+                term_ids = index.prefix(tokens[0]) if tokens else []
+            else:
+                term_ids = [index.find(t) for t in tokenize(text, field)]
+            if not term_ids or None in term_ids:
+                return []
+
+            postings = [index.postings(t) for t in term_ids]
+            if kind == "phrase" and len(postings) > 1:
+                matched = _phrase_docs(postings)
+            else:
+                matched = set().union(*postings) if kind == "prefix" else set.intersection(*(set(p) for p in postings))
+            required = matched if required is None else required & matched
+            for term_id, docs in zip(term_ids, postings):
+                for doc_id, score in index.bm25(term_id, docs).items():
+                    if doc_id in matched:
+                        scores[doc_id] += score
+
+        if not required:
+            return []
+        ranked = sorted(required, key=lambda d: scores[d], reverse=True)[:limit]
+        return [(*self.ref(d), round(scores[d], 3)) for d in ranked]
+
+    def close(self):
+        for field in self.fields.values():
+            for view in (field.doc_lens, field.term_offsets, field.term_blob, field.posting_offsets, field.postings_data):
+                view.release()
+        self.refs.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def _phrase_docs(postings):
+    """ Docs where the terms appear at consecutive positions """
+    docs = set(postings[0]).intersection(*postings[1:])
+    matched = set()
+    for doc_id in docs:
+        starts = set(postings[0][doc_id])
+        for offset, term_postings in enumerate(postings[1:], 1):
+            starts &= {p - offset for p in term_postings[doc_id]}
+            if not starts:
+                break
+        if starts:
+            matched.add(doc_id)
+    return matched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the Quran search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="index the corpus in the local store")
+    query_cmd = sub.add_parser("query", help="run a query against the index")
+    query_cmd.add_argument("query")
+    query_cmd.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        n_docs = build_index()
+        print(f"Indexed {n_docs} ayahs into {INDEX_PATH} in {time.perf_counter() - started:.2f}s")
+    else:
+        started = time.perf_counter()
+        index = QuranSearchIndex()
+        opened = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        done = time.perf_counter()
+        for surah_number, ayah, score in results:
+            print(f"{surah_number}:{ayah}  {score}")
+        print(f"open {1000 * (opened - started):.2f} ms, query {1000 * (done - opened):.2f} ms")
+    return 0
+
+
+def run_index_job(params, progress):
+    """ jobs handler: downloads the surahs the store lacks, then (re)builds the index file in a pool process """
+    quran_prefetch.prefetch_sync(editions=FIELDS, progress=lambda done, total, *_: progress(done, total))
+    return jobs.Result(summary={"ayahs": build_index(progress=progress, complete=True)})
+
+
+jobs.register("search-index", "quran_search:run_index_job", cpu_bound=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
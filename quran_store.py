@@ -0,0 +1,263 @@
+"""
+Local Quran corpus store.
+
+Surah metadata and verses from api.alquran.cloud are kept in a small SQLite
+database, one row per (surah, edition). The app reads from here and only goes
+to the network when a row is missing, stale or was written by an older store
+version. Run this file directly to pre-warm the corpus or move it around as an
+offline bundle:
+
+    python quran_store.py warm            (see quran_prefetch.py for options)
+    python quran_store.py export quran_bundle.json
+    python quran_store.py import quran_bundle.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+
+import http_client
+
+BASE_URL = "https://api.alquran.cloud/v1"
+DEFAULT_EDITIONS = ("quran-uthmani", "en.asad")
+SURAH_COUNT = 114
+# Ayahs per surah, in surah order
+AYAH_COUNTS = (
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+)
+AYAH_TOTAL = sum(AYAH_COUNTS)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+STORE_PATH = os.environ.get("JANNAHWAY_STORE", os.path.join(DATA_DIR, "quran_store.sqlite3"))
+BUNDLE_PATH = os.environ.get("JANNAHWAY_BUNDLE", os.path.join(DATA_DIR, "quran_bundle.json"))
+
+# Bump when the stored payload shape changes so old rows get refetched
+STORE_VERSION = 1
+# The text itself never changes; revalidate now and then to pick up API fixes
+CORPUS_TTL = 30 * 24 * 3600
+
+
+class QuranStore:
+    def __init__(self, path=STORE_PATH, ttl=CORPUS_TTL):
+        self.path = path
+        self.ttl = ttl
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS surahs (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                payload TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS verses (
+                surah INTEGER NOT NULL,
+                edition TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (surah, edition)
+            );
+        """)
+
+    def _is_fresh(self, version, fetched_at):
+        return version == STORE_VERSION and time.time() - fetched_at < self.ttl
+
+    # ---- reads ----
+    def load_surahs(self):
+        """ Returns (surah list, fresh) or (None, False) """
+        with self._lock:
+            row = self._conn.execute("SELECT payload, version, fetched_at FROM surahs WHERE id = 1").fetchone()
+        if row is None:
+            return None, False
+        return json.loads(row[0]), self._is_fresh(row[1], row[2])
+
+    def load_verses(self, surah_number, editions=DEFAULT_EDITIONS):
+        """ Returns (edition list in the requested order, fresh) or (None, False) """
+        placeholders = ",".join("?" * len(editions))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT edition, payload, version, fetched_at FROM verses WHERE surah = ? AND edition IN ({placeholders})",
+                (surah_number, *editions),
+            ).fetchall()
+        if len(rows) != len(editions):
+            return None, False
+        by_edition = {edition: (payload, version, fetched_at) for edition, payload, version, fetched_at in rows}
+        fresh = all(self._is_fresh(v, t) for _, v, t in by_edition.values())
+        return [json.loads(by_edition[e][0]) for e in editions], fresh
+
+    def surah_count(self, edition):
+        """ Surahs stored for an edition, fresh or stale """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verses WHERE edition = ?", (edition,)).fetchone()[0]
+
+    def missing_verses(self, editions=DEFAULT_EDITIONS, surahs=None):
+        """ (surah, edition) pairs that are absent or stale """
+        with self._lock:
+            rows = self._conn.execute("SELECT surah, edition, version, fetched_at FROM verses").fetchall()
+        have = {(s, e) for s, e, v, t in rows if self._is_fresh(v, t)}
+        surahs = surahs or range(1, SURAH_COUNT + 1)
+        return [(n, e) for n in surahs for e in editions if (n, e) not in have]
+
+    # ---- writes ----
+    def save_surahs(self, surahs, fetched_at=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO surahs (id, payload, version, fetched_at) VALUES (1, ?, ?, ?)",
+                (json.dumps(surahs, ensure_ascii=False), STORE_VERSION, fetched_at or time.time()),
+            )
+
+    def save_verses(self, surah_number, edition_data, fetched_at=None):
+        """ Stores one API edition payload (the dicts inside `data`) per row """
+        now = fetched_at or time.time()
+        rows = [
+            (surah_number, data["edition"]["identifier"], json.dumps(data, ensure_ascii=False), STORE_VERSION, now)
+            for data in edition_data
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO verses (surah, edition, payload, version, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    # ---- offline bundle ----
+    def export_bundle(self, path):
+        with self._lock:
+            surahs = self._conn.execute("SELECT payload FROM surahs WHERE id = 1").fetchone()
+            verses = self._conn.execute("SELECT surah, payload FROM verses ORDER BY surah, edition").fetchall()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"store_version": STORE_VERSION}) + "\n")
+            if surahs:
+                f.write(json.dumps({"surahs": json.loads(surahs[0])}, ensure_ascii=False) + "\n")
+            for surah_number, payload in verses:
+                f.write(json.dumps({"surah": surah_number, "data": json.loads(payload)}, ensure_ascii=False) + "\n")
+        return len(verses)
+
+    def import_bundle(self, path):
+        """ Loads a bundle written by export_bundle (one JSON object per line) """
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if "surahs" in record:
+                    self.save_surahs(record["surahs"])
+                elif "surah" in record:
+                    self.save_verses(record["surah"], [record["data"]])
+                    count += 1
+        return count
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM verses").fetchone()[0] == 0
+
+
+# ---- network ----
+def download_surahs(base_url=BASE_URL):
+    response = http_client.get(f"{base_url}/surah")
+    if response.status_code == 200:
+        return response.json()["data"]
+    return None
+
+
+def download_surah_verses(surah_number, editions=DEFAULT_EDITIONS, base_url=BASE_URL):
+    response = http_client.get(f"{base_url}/surah/{surah_number}/editions/{','.join(editions)}")
+    if response.status_code == 200:
+        return response.json()["data"]
+    return None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """ Process-wide store, seeded from the offline bundle on first use """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = QuranStore()
+            if _store.is_empty() and os.path.exists(BUNDLE_PATH):
+                _store.import_bundle(BUNDLE_PATH)
+        return _store
+
+
+def get_surahs():
+    store = get_store()
+    surahs, fresh = store.load_surahs()
+    if fresh:
+        return surahs
+    try:
+        downloaded = download_surahs()
+    except requests.RequestException:
+        downloaded = None
+    if downloaded:
+        store.save_surahs(downloaded)
+        return downloaded
+    # Upstream failed: a stale copy is better than nothing
+    return surahs or []
+
+
+def get_surah_verses(surah_number, editions=DEFAULT_EDITIONS):
+    store = get_store()
+    verses, fresh = store.load_verses(surah_number, editions)
+    if fresh:
+        return verses
+    try:
+        downloaded = download_surah_verses(surah_number, editions)
+    except requests.RequestException:
+        downloaded = None
+    if downloaded:
+        store.save_verses(surah_number, downloaded)
+        return downloaded
+    return verses
+
+
+def warm(editions=DEFAULT_EDITIONS, **kwargs):
+    """ Fills the store with every missing or stale (surah, edition) pair """
+    import quran_prefetch
+
+    kwargs.setdefault("progress", quran_prefetch.print_progress)
+    return quran_prefetch.prefetch_sync(editions=editions, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local Quran corpus store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm_cmd = sub.add_parser("warm", help="download all 114 surahs into the store")
+    warm_cmd.add_argument("--editions", default=",".join(DEFAULT_EDITIONS))
+    warm_cmd.add_argument("--concurrency", type=int, default=8)
+    export_cmd = sub.add_parser("export", help="write the store to an offline bundle")
+    export_cmd.add_argument("path")
+    import_cmd = sub.add_parser("import", help="load an offline bundle into the store")
+    import_cmd.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        result = warm(tuple(args.editions.split(",")), concurrency=args.concurrency)
+        print(f"Fetched {result['done']}, skipped {result['skipped']}, {len(result['failed'])} failed")
+    elif args.command == "export":
+        print(f"Exported {get_store().export_bundle(args.path)} edition rows to {args.path}")
+    elif args.command == "import":
+        print(f"Imported {get_store().import_bundle(args.path)} edition rows from {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""
+Quran recitation audio, cached on local disk.
+
+Every surah recording is downloaded once per reciter and kept in
+AUDIO_DIR. The directory is bounded to MAX_CACHE_BYTES: files are ordered
+by last use (their mtime, so the order survives restarts) and the least
+recently played are evicted first. Downloads stream to a ".part" file and
+resume with an HTTP Range request after a dropped connection instead of
+starting over. Once a file is cached, Streamlit's media endpoint serves it
+with byte-range support, so seeking in the player never refetches.
+
+Reciters with per-ayah recordings (the everyayah.com layout) have their
+surah assembled from the ayah files. The MP3 frames are concatenated and
+each ayah's start and end time is saved beside the file as a segment
+index, which lets the reader start playback at any ayah. Ayah files are
+kept in a ".parts" directory until the surah is complete, so a retry after
+a failed ayah fetches only what is still missing; when the ayahs cannot
+be had, a reciter's whole-surah recording is downloaded (and resumed)
+instead, without per-ayah timing.
+
+    python recitation.py --bench        # assemble, resume and evict against a local mock server
+    python recitation.py RECITER SURAH  # fetch one surah into the cache
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+import jobs
+import quran_store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+AUDIO_DIR = os.environ.get("JANNAHWAY_AUDIO", os.path.join(DATA_DIR, "audio"))
+MAX_CACHE_BYTES = int(os.environ.get("JANNAHWAY_AUDIO_CACHE_MB", "1024")) * 2 ** 20
+CHUNK = 256 * 1024
+AYAH_WORKERS = 8      # per-ayah downloads in flight while a surah is assembled
+
+Reciter = namedtuple("Reciter", ["id", "name", "surah_url", "ayah_url"])
+Segment = namedtuple("Segment", ["ayah", "start", "end"])  # seconds into the surah file
+
+EVERYAYAH = "https://everyayah.com/data/{folder}/{surah:03d}{ayah:03d}.mp3"
+RECITERS = OrderedDict((r.id, r) for r in (
+    Reciter("alafasy", "Mishary Rashid Alafasy", "https://server8.mp3quran.net/afs/{surah:03d}.mp3",
+            EVERYAYAH.replace("{folder}", "Alafasy_128kbps")),
+    Reciter("husary", "Mahmoud Khalil Al-Husary", "https://server13.mp3quran.net/husr/{surah:03d}.mp3",
+            EVERYAYAH.replace("{folder}", "Husary_128kbps")),
+    Reciter("minshawi", "Mohamed Siddiq Al-Minshawi", "https://server10.mp3quran.net/minsh/{surah:03d}.mp3",
+            EVERYAYAH.replace("{folder}", "Minshawy_Murattal_128kbps")),
+    Reciter("abdulbasit", "Abdul Basit Abdus Samad", "https://server7.mp3quran.net/basit/{surah:03d}.mp3",
+            EVERYAYAH.replace("{folder}", "Abdul_Basit_Murattal_192kbps")),
+    Reciter("sudais", "Abdur-Rahman As-Sudais", "https://server11.mp3quran.net/sds/{surah:03d}.mp3",
+            EVERYAYAH.replace("{folder}", "Abdurrahmaan_As-Sudais_192kbps")),
+))
+DEFAULT_RECITER = "alafasy"
+
+
+# --------------- MP3 frames ---------------
+
+_BITRATES = {1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+             2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _skip_tags(data):
+    """ (start, end) of data without the ID3v2 header and ID3v1 trailer """
+    start, end = 0, len(data)
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return start, end
+
+
+def mp3_audio(data):
+    """
+    (audio frames, seconds) of an MPEG Layer III file: the tags and the
+    Xing/Info header frame are dropped so files can be concatenated.
+    """
+    start, end = _skip_tags(data)
+    position, first, seconds = start, None, 0.0
+    while position + 4 <= end:
+        b1, b2 = data[position + 1], data[position + 2]
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if (data[position] != 0xFF or b1 & 0xE0 != 0xE0 or version == 1 or layer != 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            position += 1  # not a frame header: resynchronise
+            continue
+        mpeg1 = version == 3
+        bitrate = _BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+        if first is None:
+            header = data[position + 4:position + 40]
+            if b"Xing" in header or b"Info" in header or data[position + 36:position + 40] == b"VBRI":
+                position += length
+                first = position
+                continue
+            first = position
+        seconds += (1152 if mpeg1 else 576) / sample_rate
+        position += length
+    return data[first if first is not None else start:min(position, end)], seconds
+
+
+# --------------- Cache ---------------
+
+class AudioCache:
+    def __init__(self, directory=AUDIO_DIR, max_bytes=MAX_CACHE_BYTES, client=None, reciters=RECITERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.client = client or http_client.client
+        self.reciters = reciters
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._files = OrderedDict()  # recording path -> bytes with its segment index, least recently used first
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.endswith(".parts")]  # ayahs of unfinished surahs
+            for name in names:
+                if name.endswith(".mp3"):
+                    path = os.path.join(root, name)
+                    found.append((os.path.getmtime(path), path))
+        for _, path in sorted(found):
+            self._files[path] = _size(path)
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(self._files.values())
+
+    def _path(self, reciter_id, surah):
+        return os.path.join(self.directory, reciter_id, f"{surah:03d}.mp3")
+
+    def cached(self, reciter_id, surah):
+        """ Path of the cached surah recording, marked as just used; None if it isn't cached """
+        path = self._path(reciter_id, surah)
+        with self._lock:
+            if path not in self._files:
+                return None
+            self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._files.pop(path, None)
+            return None
+        return path
+
+    def segments(self, reciter_id, surah):
+        """ [Segment] of the cached surah, or None when it has no per-ayah timing """
+        try:
+            with open(self._path(reciter_id, surah) + ".json", encoding="utf-8") as f:
+                return [Segment(*segment) for segment in json.load(f)]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def fetch(self, reciter_id, surah, progress=None):
+        """
+        Path of the surah recording, downloading it first if needed. Only one
+        thread downloads a given file; the others wait and share it.
+        progress(done, total) counts ayahs, or bytes for whole-surah downloads.
+        """
+        reciter = self.reciters[reciter_id]
+        path = self._path(reciter_id, surah)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(path, threading.Lock())
+        with key_lock:
+            cached = self.cached(reciter_id, surah)
+            if cached:
+                return cached
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if reciter.ayah_url:
+                try:
+                    self._assemble(reciter, surah, path, progress)
+                except OSError:
+                    if not reciter.surah_url:
+                        raise
+                    # Ayahs fetched so far stay in the parts directory for the next assembly
+                    self.download(reciter.surah_url.format(surah=surah), path, progress)
+                    shutil.rmtree(path + ".parts", ignore_errors=True)
+            else:
+                self.download(reciter.surah_url.format(surah=surah), path, progress)
+            self._added(path)
+            return path
+
+    def download(self, url, path, progress=None):
+        """ Streams url to path, resuming a ".part" file left by an earlier attempt """
+        part = path + ".part"
+        have = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={have}-"} if have else {}
+        with self.client.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:  # the part is complete, or stale: start over
+                os.remove(part)
+                return self.download(url, path, progress)
+            response.raise_for_status()
+            resumed = response.status_code == 206
+            total = int(response.headers.get("Content-Length") or 0) + (have if resumed else 0)
+            done = have if resumed else 0
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(CHUNK):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total or None)
+        if total and done < total:
+            raise IOError(f"{url}: connection closed after {done} of {total} bytes")
+        os.replace(part, path)
+
+    def _assemble(self, reciter, surah, path, progress):
+        """
+        Joins the per-ayah recordings into one file and writes its segment
+        index. Ayah files already in the parts directory are not fetched again.
+        """
+        count = quran_store.AYAH_COUNTS[surah - 1]
+        parts = path + ".parts"
+        os.makedirs(parts, exist_ok=True)
+        ayah_paths = [os.path.join(parts, f"{ayah:03d}.mp3") for ayah in range(1, count + 1)]
+        missing = [(reciter.ayah_url.format(surah=surah, ayah=ayah), ayah_path)
+                   for ayah, ayah_path in enumerate(ayah_paths, start=1) if not os.path.exists(ayah_path)]
+        done = count - len(missing)
+        if progress:
+            progress(done, count)
+        # Leaving the pool waits for every download, so one failure doesn't waste the others
+        with ThreadPoolExecutor(max_workers=AYAH_WORKERS, thread_name_prefix="recitation") as pool:
+            for _ in pool.map(lambda ayah: self.download(*ayah), missing):
+                done += 1
+                if progress:
+                    progress(done, count)
+        segments, position = [], 0.0
+        with open(path + ".part", "wb") as out:
+            for ayah, ayah_path in enumerate(ayah_paths, start=1):
+                with open(ayah_path, "rb") as f:
+                    audio, seconds = mp3_audio(f.read())
+                out.write(audio)
+                segments.append((ayah, round(position, 3), round(position + seconds, 3)))
+                position += seconds
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(segments, f)
+        os.replace(path + ".part", path)
+        shutil.rmtree(parts, ignore_errors=True)
+
+    def _added(self, path):
+        """ Records a new recording and evicts the least recently used ones beyond max_bytes """
+        evict = []
+        with self._lock:
+            self._files[path] = _size(path)
+            total = sum(self._files.values())
+            while total > self.max_bytes and len(self._files) > 1:
+                victim, size = self._files.popitem(last=False)
+                total -= size
+                evict.append(victim)
+        for victim in evict:
+            for name in (victim, victim + ".json"):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+        return evict
+
+
+def _size(path):
+    """ Bytes of a recording and its segment index """
+    return os.path.getsize(path) + (os.path.getsize(path + ".json") if os.path.exists(path + ".json") else 0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """ Process-wide recitation cache """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache()
+        return _cache
+
+
+def run_fetch_job(params, progress):
+    """ jobs handler: downloads one surah recording into the cache """
+    path = get_cache().fetch(params["reciter"], params["surah"], progress)
+    return jobs.Result(summary={"path": path, "bytes": os.path.getsize(path)})
+
+
+jobs.register("recitation", "recitation:run_fetch_job")
+
+
+def start_fetch(reciter_id, surah, owner=None):
+    """ Queues a download, or returns the job already fetching it; None once the surah is cached """
+    if get_cache().cached(reciter_id, surah):
+        return None
+    params = {"reciter": reciter_id, "surah": surah}
+    job = jobs.get_queue().submit("recitation", params, owner=owner, total=quran_store.AYAH_COUNTS[surah - 1])
+    if job.finished:  # an earlier download whose file has since been evicted
+        job = jobs.get_queue().submit("recitation", params, owner=owner,
+                                      total=quran_store.AYAH_COUNTS[surah - 1], reuse=False)
+    return job
+
+
+# --------------- Benchmark ---------------
+
+def _sample_mp3(seconds, tagged=True):
+    """ A silent 128 kbit/s, 44.1 kHz MPEG-1 Layer III file with a Xing frame and tags """
+    frames = round(seconds * 44100 / 1152)
+    frame = b"\xff\xfb\x90\x00" + bytes(413)
+    xing = b"\xff\xfb\x90\x00" + bytes(32) + b"Xing" + bytes(377)
+    data = xing + frame * frames
+    return (b"ID3\x03\x00\x00\x00\x00\x00\x10" + bytes(16) if tagged else b"") + data + b"TAG" + bytes(125)
+
+
+def _start_mock_server(latency, drop_after=None):
+    """ Serves synthetic recordings with Range support; drop_after cuts the first full download short """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    dropped = []
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            name = self.path.rsplit("/", 1)[-1]
+            whole = "/surah/" in self.path
+            body = _sample_mp3(60 if whole else 1 + int(name[3:6]) % 3)
+            start = 0
+            if self.headers.get("Range"):
+                start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(body) - start))
+            self.end_headers()
+            if whole and drop_after and not start and not dropped:
+                dropped.append(name)
+                self.wfile.write(body[:drop_after])
+                self.close_connection = True
+                return
+            self.wfile.write(body[start:])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(latency=0.02):
+    server = _start_mock_server(latency, drop_after=300000)
+    base = f"http://127.0.0.1:{server.server_port}"
+    reciters = {"mock": Reciter("mock", "Mock", None, base + "/ayah/{surah:03d}{ayah:03d}.mp3"),
+                "whole": Reciter("whole", "Whole", base + "/surah/{surah:03d}.mp3", None)}
+    client = http_client.HttpClient(retries=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AudioCache(tmp, max_bytes=16 * 2 ** 20, client=client, reciters=reciters)
+        print(f"mock latency {latency * 1000:.0f} ms")
+        started = time.perf_counter()
+        cache.fetch("mock", 2)
+        segments = cache.segments("mock", 2)
+        print(f"  surah 2 from {len(segments)} ayah files: {time.perf_counter() - started:.2f} s, "
+              f"{os.path.getsize(cache.cached('mock', 2)) / 2**20:.1f} MiB, ends at {segments[-1].end:.0f} s")
+        started = time.perf_counter()
+        cache.fetch("mock", 2)
+        print(f"  again, from the cache: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        try:
+            cache.fetch("whole", 1)
+        except IOError as e:
+            print(f"  whole-surah download interrupted: {e}")
+        part = cache._path("whole", 1) + ".part"
+        kept = os.path.getsize(part)
+        cache.fetch("whole", 1)
+        print(f"  resumed from byte {kept:,}: {os.path.getsize(cache.cached('whole', 1)):,} bytes, "
+              f"frames intact: {mp3_audio(open(cache.cached('whole', 1), 'rb').read())[1]:.1f} s")
+
+        for surah in range(60, quran_store.SURAH_COUNT + 1):
+            cache.fetch("mock", surah)
+        print(f"  after surahs 60-114: {cache.size / 2**20:.1f} MiB cached (limit {cache.max_bytes / 2**20:.0f}), "
+              f"surah 2 {'kept' if cache.cached('mock', 2) else 'evicted'}")
+    server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("reciter", nargs="?", choices=list(RECITERS))
+    parser.add_argument("surah", nargs="?", type=int)
+    parser.add_argument("--bench", action="store_true")
+    args = parser.parse_args(argv)
+    if args.bench:
+        bench()
+        return 0
+    if not args.reciter or not args.surah:
+        parser.error("RECITER and SURAH are required")
+    path = get_cache().fetch(args.reciter, args.surah,
+                             lambda done, total: print(f"\r{done}/{total or '?'}", end="", flush=True))
+    print(f"\n{path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
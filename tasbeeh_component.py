@@ -0,0 +1,45 @@
+"""
+Browser-side tasbeeh tap counter.
+
+Taps are counted in the browser and sent to the server in batches (after a
+pause in tapping, at least every few seconds while tapping continues, and
+when the page is hidden), so a hundred taps cost a handful of reruns instead
+of a hundred. Each batch carries an id; the server applies a batch once and
+echoes its id back as `acked_batch` so the component knows it has landed.
+"""
+import os
+
+import streamlit.components.v1 as components
+
+_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "tasbeeh_counter")
+_tasbeeh_counter = components.declare_component("tasbeeh_counter", path=_COMPONENT_DIR)
+
+
+def tasbeeh_counter(dhikr, count, acked_batch=None, sync_idle_ms=3000, sync_max_ms=10000, key=None):
+    """
+    Renders the tap counter for one dhikr. Returns the last batch sent by the
+    browser, {"batch": id, "deltas": {dhikr: taps}}, or None.
+    """
+    return _tasbeeh_counter(dhikr=dhikr, count=count, acked_batch=acked_batch,
+                            sync_idle_ms=sync_idle_ms, sync_max_ms=sync_max_ms,
+                            key=key, default=None)
+
+
+def apply_batch(batch, state, apply_delta):
+    """
+    Applies a batch from tasbeeh_counter once. `state` is a dict-like (the
+    session state) used to remember the last applied batch and tap/sync
+    totals; apply_delta(dhikr, taps) persists each delta. Returns True if the
+    batch was new.
+    """
+    if not batch or batch.get("batch") == state.get("tap_acked_batch"):
+        return False
+    taps = 0
+    for dhikr, delta in batch.get("deltas", {}).items():
+        if delta > 0:
+            apply_delta(dhikr, delta)
+            taps += delta
+    state["tap_acked_batch"] = batch["batch"]
+    state["tap_total"] = state.get("tap_total", 0) + taps
+    state["tap_syncs"] = state.get("tap_syncs", 0) + 1
+    return True
@@ -0,0 +1,31 @@
+import sqlite3
+import time
+
+import counter_store
+
+
+class FailsOnce(counter_store.SQLiteCounterBackend):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.failures = 0
+
+    def apply_batch(self, ops):
+        if not self.failures:
+            self.failures += 1
+            raise sqlite3.OperationalError("database is locked")
+        super().apply_batch(ops)
+
+
+def test_flusher_survives_a_failed_write():
+    backend = FailsOnce()
+    store = counter_store.CounterStore(backend, flush_interval=0.01)
+    store.increment("u1", "SubhanAllah", 3)
+    deadline = time.monotonic() + 5
+    while backend.failures == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.increment("u1", "SubhanAllah", 2)
+    while backend.get_counts("u1") != {"SubhanAllah": 5} and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend.get_counts("u1") == {"SubhanAllah": 5}
+    assert store._thread.is_alive()
+    store.close()
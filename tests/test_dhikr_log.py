@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import dhikr_log
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def _log():
+    return dhikr_log.DhikrLog(":memory:", background=False)
+
+
+def _ts(day, hour=12, zone=None):
+    return int(datetime(day.year, day.month, day.day, hour, tzinfo=zone).timestamp())
+
+
+def test_reads_include_buffered_events_without_flushing():
+    log = _log()
+    today = date.today()
+    log.record("u1", "SubhanAllah", 33, _ts(today - timedelta(days=1)))
+    log.flush()
+    log.record("u1", "SubhanAllah", 10, _ts(today))
+    log.record("u1", "Alhamdulillah", 50, _ts(today))
+    flushes = log.flushes
+
+    assert log.series("u1", dhikr_log.DAY, 2, today=today) == [(today - timedelta(days=1), 33), (today, 60)]
+    assert log.totals("u1", dhikr="Alhamdulillah") == {today: 50}
+    assert log.dhikr_names("u1") == ["Alhamdulillah", "SubhanAllah"]
+    assert log.streak("u1", today) == (2, 2, 2)
+    ts, ids, deltas = log.columns("u1")
+    assert int(deltas.sum()) == 93 and 0 in ids.tolist()
+    assert log.flushes == flushes
+
+    log.flush()
+    assert log.series("u1", dhikr_log.DAY, 2, today=today) == [(today - timedelta(days=1), 33), (today, 60)]
+    assert log.streak("u1", today) == (2, 2, 2)
+
+
+def test_concurrent_flushes_keep_every_day_of_the_streak():
+    log = _log()
+    first = date.today() - timedelta(days=199)
+    threads = []
+    for i in range(200):
+        log.record("u1", "SubhanAllah", 1, _ts(first + timedelta(days=i)))
+        threads.append(threading.Thread(target=log.flush))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    log.flush()
+    assert log.streak("u1") == (200, 200, 200)
+
+
+def test_hour_profile_uses_each_events_own_offset():
+    log = _log()
+    now = datetime.now(NEW_YORK)
+    # Eight in the morning New York time, every week for a year: both DST changes fall in between
+    for days in range(1, 365, 7):
+        day = (now - timedelta(days=days)).date()
+        log.record("u1", "SubhanAllah", 1, _ts(day, 8, NEW_YORK))
+    profile = log.hour_profile("u1", days=400, tz="America/New_York")
+    assert profile[8] == 52 and sum(profile) == 52
+    assert _log().hour_profile("nobody") == [0] * 24
+
+
+def test_flusher_survives_a_failed_write(monkeypatch):
+    log = _log()
+    append = log._append
+    failures = []
+
+    def fails_once(user_id, events):
+        if not failures:
+            failures.append(user_id)
+            raise dhikr_log.sqlite3.OperationalError("database is locked")
+        return append(user_id, events)
+
+    monkeypatch.setattr(log, "_append", fails_once)
+    log.record("u1", "SubhanAllah", 33, _ts(date.today()))
+    thread = threading.Thread(target=log._run, args=(0.01,), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while log.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert failures == ["u1"]
+    assert log.flushes == 1 and thread.is_alive()
+    assert log.totals("u1") == {date.today(): 33}
+    log.close()
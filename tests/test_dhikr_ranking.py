@@ -0,0 +1,46 @@
+import counter_store
+import dhikr_ranking
+
+
+def test_recount_after_reset_is_ranked_once():
+    index = dhikr_ranking.RankIndex()
+    index.add("A")
+    index.set("A", 0)
+    index.add("A")
+    index.add("B", 5)
+    assert index.top(10) == [("B", 5), ("A", 1)]
+    assert index.total == 6
+
+
+def test_stale_entries_survive_rebuild():
+    index = dhikr_ranking.RankIndex()
+    for i in range(200):
+        index.set("A", i % 3)
+        index.add("B")
+    assert index.top(10) == [("B", 200), ("A", 199 % 3)]
+    assert index.argmax() == ("B", 200)
+
+
+def test_rankings_follow_the_counter_store():
+    store = counter_store.CounterStore(counter_store.SQLiteCounterBackend(":memory:"), background=False)
+    store.increment("u1", "SubhanAllah", 3)
+    store.flush()
+    store.increment("u2", "SubhanAllah", 2)
+    rankings = dhikr_ranking.Rankings(store, public={"SubhanAllah", "Alhamdulillah"})
+    store.increment("u1", "Alhamdulillah", 4)
+    store.reset("u1", "SubhanAllah")
+    store.increment("u1", "SubhanAllah")
+    assert rankings.top("u1") == [("Alhamdulillah", 4), ("SubhanAllah", 1)]
+    assert rankings.total("u1") == 5
+    assert rankings.top_global() == [("Alhamdulillah", 4), ("SubhanAllah", 3)]
+
+
+def test_global_ranking_hides_custom_dhikr_text():
+    store = counter_store.CounterStore(counter_store.SQLiteCounterBackend(":memory:"), background=False)
+    store.increment("u1", "my private note", 7)
+    store.flush()
+    rankings = dhikr_ranking.Rankings(store, public={"SubhanAllah"})
+    store.increment("u2", "another note", 2)
+    store.increment("u2", "SubhanAllah", 5)
+    assert rankings.top_global() == [(dhikr_ranking.CUSTOM, 9), ("SubhanAllah", 5)]
+    assert rankings.top("u1") == [("my private note", 7)]
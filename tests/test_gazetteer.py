@@ -0,0 +1,76 @@
+import heapq
+import random
+import struct
+from zoneinfo import ZoneInfo
+
+import gazetteer
+
+
+def _geonames_line(geoname_id, name, country, population, tz):
+    row = [str(geoname_id), name, name, "", "24.0", "67.0", "P", "PPL", country] + [""] * 5 + [str(population)]
+    return "\t".join(row + ["", "", tz, "2024-01-01"]) + "\n"
+
+
+def test_rows_without_time_zone_take_their_countrys_zone(tmp_path):
+    lines = [
+        _geonames_line(1, "Karachi", "PK", 15000000, "Asia/Karachi"),
+        _geonames_line(2, "Lahore", "PK", 11000000, "Asia/Karachi"),
+        _geonames_line(3, "Kotri", "PK", 70000, ""),
+        _geonames_line(4, "Nowhere", "ZZ", 5000, ""),
+    ]
+    path = str(tmp_path / "g.idx")
+    assert gazetteer.build_gazetteer(gazetteer.read_geonames_rows(lines), path) == 3
+    index = gazetteer.Gazetteer(path)
+    try:
+        place, = index.suggest("kotri")
+        assert place.timezone == "Asia/Karachi"
+        assert ZoneInfo(place.timezone)
+        assert index.suggest("nowhere") == []
+    finally:
+        index.close()
+
+
+def test_largest_matches_a_full_scan(tmp_path):
+    rng = random.Random(7)
+    countries = ["PK", "SA", "AE", "GB", "US"]
+    rows = [(f"City {i}", [], 0.0, 0.0, rng.choice(countries), rng.randrange(1000), "UTC") for i in range(2000)]
+    path = str(tmp_path / "g.idx")
+    gazetteer.build_gazetteer(iter(rows), path)
+    index = gazetteer.Gazetteer(path)
+    try:
+        for country in countries + ["XX"]:
+            ids = [i for i, row in enumerate(rows) if row[4] == country]
+            expected = heapq.nlargest(30, ids, key=lambda i: rows[i][5])
+            assert [p.name for p in index.largest(country, limit=30)] == [rows[i][0] for i in expected]
+    finally:
+        index.close()
+
+
+def test_walking_the_population_order_finds_the_same_cities_as_ranking(tmp_path):
+    rng = random.Random(11)
+    countries = ["PK", "SA", "GB"]
+    rows = [(f"Sa{rng.choice('lmnrt')}{i}", [f"Alt{i}"], 0.0, 0.0, rng.choice(countries), rng.randrange(10 ** 6),
+             "UTC") for i in range(3000)]
+    path = str(tmp_path / "g.idx")
+    gazetteer.build_gazetteer(iter(rows), path)
+    index = gazetteer.Gazetteer(path)
+    try:
+        for text, country in [("s", None), ("sa", b"PK"), ("sal", b"GB"), ("sam1", None), ("alt2", b"SA")]:
+            key = gazetteer.normalize(text).encode("utf-8")
+            lo, hi = index.keys.lower_bound(key), index.keys.lower_bound(key + b"\xff")
+            walked = index._walk_prefix(lo, hi, country, 8)
+            assert walked == index._rank_prefix(lo, hi, country, 8) == index.prefix(text, country, limit=8)
+            assert [index.populations[c] for c in walked] == sorted((index.populations[c] for c in walked), reverse=True)
+    finally:
+        index.close()
+
+
+def test_index_from_another_version_is_rebuilt(tmp_path, monkeypatch):
+    path = tmp_path / "g.idx"
+    path.write_bytes(gazetteer.MAGIC + struct.pack("<IIIIIIIII", gazetteer.FORMAT_VERSION - 1, *[0] * 8))
+    monkeypatch.setattr(gazetteer, "GAZETTEER_PATH", str(path))
+    monkeypatch.setattr(gazetteer, "_gazetteer", None)
+    index = gazetteer.get_gazetteer()
+    assert index.n_cities > 0
+    assert index.suggest("karachi")[0].timezone == "Asia/Karachi"
+    index.close()
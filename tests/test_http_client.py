@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+import http_client
+
+
+def scripted(stub_server, script):
+    """ Answers each path with its listed statuses in turn, then with 200s """
+    def respond(path):
+        statuses = script.get(path, [])
+        status = statuses.pop(0) if statuses else 200
+        headers = {"Retry-After": "0"} if status == 429 else {}
+        return status, b"ok" if status == 200 else b"busy", headers
+    stub_server.respond = respond
+
+
+def test_retries_5xx_and_429_until_success(stub_server):
+    client = http_client.HttpClient(retries=3, backoff_factor=0)
+    scripted(stub_server, {"/flaky": [503, 500], "/limited": [429]})
+    assert client.get(stub_server.url + "/flaky").status_code == 200
+    assert stub_server.hits("/flaky") == 3
+    assert client.get(stub_server.url + "/limited").status_code == 200
+    assert stub_server.hits("/limited") == 2
+
+
+def test_circuit_opens_then_half_opens_for_one_probe(stub_server):
+    client = http_client.HttpClient(retries=0, failure_threshold=2, reset_after=0.2)
+    scripted(stub_server, {"/down": [500, 500, 500]})
+    for _ in range(2):
+        assert client.get(stub_server.url + "/down").status_code == 500
+    host = stub_server.url.split("//")[1]
+    assert client.circuit_states()[host] == "open"
+    with pytest.raises(http_client.CircuitOpenError):
+        client.get(stub_server.url + "/down")
+    assert stub_server.hits("/down") == 2
+
+    time.sleep(0.25)
+    assert client.circuit_states()[host] == "half-open"
+    assert client.get(stub_server.url + "/down").status_code == 500   # the probe fails: open again
+    assert client.circuit_states()[host] == "open"
+    time.sleep(0.25)
+    assert client.get(stub_server.url + "/down").status_code == 200   # the next probe succeeds: closed
+    assert client.circuit_states()[host] == "closed"
+
+
+def test_connections_are_reused(stub_server):
+    client = http_client.HttpClient(retries=0)
+    for i in range(5):
+        assert client.get(f"{stub_server.url}/page/{i}").text == "ok"
+    assert len({port for _, port in stub_server.requests}) == 1
+
+
+def test_full_pool_does_not_block(stub_server):
+    client = http_client.HttpClient(retries=0, pool_maxsize=1)
+    held = client.get(stub_server.url + "/held", stream=True)   # keeps the only pooled connection
+    done = []
+    worker = threading.Thread(target=lambda: done.append(client.get(stub_server.url + "/next").text))
+    worker.start()
+    worker.join(timeout=5)
+    held.close()
+    assert done == ["ok"]
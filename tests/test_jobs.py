@@ -0,0 +1,66 @@
+import threading
+import time
+
+import jobs
+
+runs = []
+started = threading.Event()
+
+
+def record(params, progress):
+    runs.append(params["n"])
+    return jobs.Result(summary={"n": params["n"]})
+
+
+def wait_for_release(params, progress):
+    started.set()
+    time.sleep(params["seconds"])
+    return jobs.Result(summary={"slept": params["seconds"]})
+
+
+jobs.register("test-record", "test_jobs:record")
+jobs.register("test-wait", "test_jobs:wait_for_release")
+
+
+def _queue(tmp_path):
+    return jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "artifacts"), threads=2, processes=1)
+
+
+def _insert(table, job_id, kind, n, status, heartbeat):
+    table.insert(job_id, kind, jobs.KINDS[kind].target, False, job_id, {"n": n}, None, None)
+    table.update(job_id, status=status, worker="elsewhere:1", heartbeat=heartbeat)
+
+
+def _wait(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job.finished:
+            return job
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_only_queued_and_stale_jobs_are_resumed(tmp_path):
+    table = jobs.JobTable(str(tmp_path / "jobs.sqlite3"))
+    runs.clear()
+    _insert(table, "live", "test-record", 1, jobs.RUNNING, time.time())
+    _insert(table, "stale", "test-record", 2, jobs.RUNNING, time.time() - jobs.STALE_AFTER - 1)
+    _insert(table, "waiting", "test-record", 3, jobs.QUEUED, None)
+    queue = _queue(tmp_path)
+    assert _wait(queue, "stale").status == jobs.DONE
+    assert _wait(queue, "waiting").status == jobs.DONE
+    assert queue.get("live").status == jobs.RUNNING
+    assert sorted(runs) == [2, 3]
+    queue.close()
+
+
+def test_a_running_job_is_not_run_again_by_a_second_queue(tmp_path):
+    first = _queue(tmp_path)
+    job = first.submit("test-wait", {"seconds": 0.3})
+    assert started.wait(2)
+    second = _queue(tmp_path)  # another app process starting up while the job runs
+    assert not jobs.run_job(second.path, second.artifacts_dir, job.id)
+    done = _wait(first, job.id)
+    assert done.status == jobs.DONE and done.summary == {"slept": 0.3}
+    first.close()
+    second.close()
@@ -0,0 +1,25 @@
+from datetime import date
+
+import pytest
+
+import prayer_times
+import timetable
+
+TROMSO = (69.65, 18.96, "Europe/Oslo")
+
+
+def test_matches_the_recorded_api_fixtures():
+    checked, mismatches = prayer_times.validate()
+    assert checked > 0
+    assert mismatches == []
+
+
+@pytest.mark.parametrize("day, missing", [
+    (date(2025, 6, 21), {"Imsak", "Fajr", "Sunrise", "Sunset", "Maghrib", "Isha", "Midnight"}),  # polar day
+    (date(2025, 12, 21), {"Sunrise", "Sunset", "Maghrib", "Midnight"}),  # polar night
+])
+def test_polar_days_leave_undefined_times_blank(day, missing):
+    timings = prayer_times.timings(day, *TROMSO)
+    assert {name for name, value in timings.items() if value == "-----"} == missing
+    vectorized = timetable.format_times(timetable.compute([day], [TROMSO[0]], [TROMSO[1]], [TROMSO[2]]))[0, 0]
+    assert timings == dict(zip(prayer_times.TIMING_NAMES, vectorized))
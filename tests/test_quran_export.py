@@ -0,0 +1,23 @@
+import pdf_report
+import quran_export
+
+AYAH = "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ"
+
+
+def test_shaped_lines_are_reused_by_a_later_process(tmp_path, monkeypatch):
+    path = str(tmp_path / "shaped.sqlite3")
+    shaped = []
+    shape_arabic = pdf_report.shape_arabic
+    monkeypatch.setattr(pdf_report, "shape_arabic", lambda *args: shaped.append(args) or shape_arabic(*args))
+
+    first = quran_export.ShapedLines(path)
+    lines = first.get(AYAH, 300)
+    assert first.get(AYAH, 300) == lines
+    assert len(shaped) == 1
+    assert first.flush() == 1
+
+    second = quran_export.ShapedLines(path)  # as in the next export job's process
+    assert second.get(AYAH, 300) == lines
+    assert len(shaped) == 1
+    second.get(AYAH, 200)
+    assert len(shaped) == 2
@@ -0,0 +1,73 @@
+from array import array
+
+import pytest
+
+import quran_nav
+import quran_store
+
+EDITION = quran_store.DEFAULT_EDITIONS[0]
+
+
+def _synthetic_units():
+    """ Evenly spread quarters, pages and rukus, as in the module's bench """
+    units = {division: array("H", (1 + i * quran_nav.UNITS[division] // quran_store.AYAH_TOTAL
+                                   for i in range(quran_store.AYAH_TOTAL)))
+             for division in (quran_nav.QUARTER, quran_nav.PAGE, quran_nav.RUKU)}
+    units[quran_nav.JUZ] = quran_nav._units_from_starts(quran_nav.JUZ_STARTS)
+    units[quran_nav.MANZIL] = quran_nav._units_from_starts(quran_nav.MANZIL_STARTS)
+    return units
+
+
+def _fill(store, surahs):
+    for payload in quran_nav._payloads(_synthetic_units())[:surahs]:
+        payload["edition"] = {"identifier": EDITION}
+        store.save_verses(payload["number"], [payload])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return quran_store.QuranStore(str(tmp_path / "store.sqlite3"))
+
+
+def test_built_in_juz_and_manzil():
+    index = quran_nav.built_in()
+    assert index.divisions == (quran_nav.JUZ, quran_nav.MANZIL)
+    assert index.unit(quran_nav.JUZ, 2, 141) == 1
+    assert index.unit(quran_nav.JUZ, 2, 142) == 2
+    assert index.bounds(quran_nav.JUZ, 30) == ((78, 1), (114, 6))
+    assert index.spans(quran_nav.JUZ, 29)[:2] == [(67, 1, 30), (68, 1, 52)]
+    assert index.locate(50, 1) == {quran_nav.JUZ: 26, quran_nav.MANZIL: 7}
+
+
+def test_build_index_uses_store_metadata_only_when_complete(store):
+    _fill(store, quran_store.SURAH_COUNT - 1)
+    assert quran_nav.build_index(store).divisions == (quran_nav.JUZ, quran_nav.MANZIL)
+    _fill(store, quran_store.SURAH_COUNT)
+    index = quran_nav.build_index(store)
+    assert index.divisions == quran_nav.DIVISIONS
+    assert index.count(quran_nav.PAGE) == 604
+    assert index.count(quran_nav.HIZB) == 60
+
+
+def test_save_and_load_round_trip(store, tmp_path):
+    _fill(store, quran_store.SURAH_COUNT)
+    index = quran_nav.build_index(store)
+    index.save(str(tmp_path / "nav.bin"))
+    loaded = quran_nav.NavIndex.load(str(tmp_path / "nav.bin"))
+    assert loaded.divisions == index.divisions
+    assert all(loaded.locate(*quran_nav.ref(i)) == index.locate(*quran_nav.ref(i)) for i in range(0, 6236, 97))
+
+
+def test_get_index_rebuilds_the_fallback_once_the_store_fills(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(quran_nav, "NAV_PATH", str(tmp_path / "nav.bin"))
+    monkeypatch.setattr(quran_nav, "_index", None)
+    monkeypatch.setattr(quran_nav, "_index_surahs", None)
+    monkeypatch.setattr(quran_store, "get_store", lambda: store)
+    fallback = quran_nav.get_index()
+    assert fallback.divisions == (quran_nav.JUZ, quran_nav.MANZIL)
+    assert quran_nav.get_index() is fallback
+    assert not (tmp_path / "nav.bin").exists()
+
+    _fill(store, quran_store.SURAH_COUNT)
+    assert quran_nav.get_index().divisions == quran_nav.DIVISIONS
+    assert (tmp_path / "nav.bin").exists()
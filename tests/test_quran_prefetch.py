@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+import quran_prefetch
+import quran_store
+
+MALFORMED = {
+    2: b'{"code": 200}',  # no "data"
+    3: b"<html>Bad gateway</html>",  # not JSON
+    4: json.dumps({"code": 200, "data": [{"number": 4, "ayahs": []}]}).encode("utf-8"),  # no "edition"
+}
+
+
+def respond(path):
+    parts = path.strip("/").split("/")
+    if parts[-1] == "surah":
+        data = [{"number": n, "englishName": f"Surah {n}", "name": "", "revelationType": "meccan"}
+                for n in range(1, quran_store.SURAH_COUNT + 1)]
+        return 200, json.dumps({"code": 200, "data": data}).encode("utf-8")
+    surah_number, edition = int(parts[-3]), parts[-1]
+    return 200, MALFORMED.get(surah_number) or json.dumps({"code": 200, "data": [
+        {"edition": {"identifier": edition}, "number": surah_number,
+         "ayahs": [{"numberInSurah": 1, "text": "x"}]}]}).encode("utf-8")
+
+
+@pytest.fixture
+def base_url(stub_server):
+    stub_server.respond = respond
+    return stub_server.url + "/v1"
+
+
+def test_malformed_payloads_fail_only_their_pair(tmp_path, base_url):
+    store = quran_store.QuranStore(str(tmp_path / "store.sqlite3"))
+    reported = []
+    result = quran_prefetch.prefetch_sync(
+        [1, 2, 3, 4, 5], ("quran-uthmani",), store=store, rate=1000, base_url=base_url,
+        progress=lambda done, total, surah, edition, ok: reported.append((surah, ok)))
+    assert result["done"] == 2
+    assert sorted(result["failed"]) == [(2, "quran-uthmani"), (3, "quran-uthmani"), (4, "quran-uthmani")]
+    assert sorted(reported) == [(1, True), (2, False), (3, False), (4, False), (5, True)]
+    assert sorted(store.missing_verses(("quran-uthmani",), [1, 2, 3, 4, 5])) == [
+        (2, "quran-uthmani"), (3, "quran-uthmani"), (4, "quran-uthmani")]
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import quran_search
+import quran_store
+
+AYAHS = [
+    ("بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ", "In the name of God, the Most Gracious, the Dispenser of Grace"),
+    ("قُلْ هُوَ ٱللَّهُ أَحَدٌ", "Say: He is the One God"),
+    ("ٱهْدِنَا ٱلصِّرَٰطَ ٱلْمُسْتَقِيمَ", "Guide us the straight way"),
+    ("صِرَٰطَ ٱلَّذِينَ أَنْعَمْتَ عَلَيْهِمْ", "the way of those upon whom Thou hast bestowed Thy blessings, not the straight"),
+    ("رَحْمَةٌ", "mercy upon mercy, and mercy for the merciful"),
+    ("وَرَحْمَةٌ", "and mercy for those who believe in the path"),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    store = quran_store.QuranStore(str(tmp_path / "store.sqlite3"))
+    store.save_verses(1, [{"edition": {"identifier": field}, "number": 1,
+                           "ayahs": [{"numberInSurah": i, "text": texts[column]}
+                                     for i, texts in enumerate(AYAHS, start=1)]}
+                          for column, field in enumerate(quran_search.FIELDS)])
+    path = str(tmp_path / "search.idx")
+    assert quran_search.build_index(path, store) == len(AYAHS)
+    index = quran_search.QuranSearchIndex(path)
+    yield index
+    index.close()
+
+
+def ayahs(results):
+    return [ayah for _, ayah, _ in results]
+
+
+def test_bm25_ranks_more_frequent_terms_first(index):
+    results = index.search("mercy")
+    assert ayahs(results) == [5, 6]
+    assert results[0][2] > results[1][2] > 0
+
+
+def test_phrase_needs_consecutive_terms(index):
+    assert sorted(ayahs(index.search("straight way"))) == [3, 4]
+    assert ayahs(index.search('"straight way"')) == [3]
+
+
+def test_prefix_expands_to_every_matching_term(index):
+    assert sorted(ayahs(index.search("merc*"))) == [5, 6]
+    assert ayahs(index.search("bless*")) == [4]
+
+
+def test_arabic_ignores_diacritics_and_letter_forms(index):
+    assert ayahs(index.search("الرحمن")) == [1]
+    assert ayahs(index.search("احد")) == [2]
+    assert sorted(ayahs(index.search("رحمه"))) == [5]
+    assert ayahs(index.search("صِرَٰطَ")) == [4]
+
+
+def test_incomplete_corpus_is_not_written_when_a_full_index_is_required(tmp_path):
+    store = quran_store.QuranStore(str(tmp_path / "store.sqlite3"))
+    path = str(tmp_path / "search.idx")
+    with pytest.raises(ValueError):
+        quran_search.build_index(path, store, complete=True)
+    assert not os.path.exists(path)
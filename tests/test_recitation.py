@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import http_client
+import recitation
+
+
+@pytest.fixture
+def server(stub_server):
+    """ Serves ayah and surah recordings; paths in `failing` answer 500 until removed """
+    def respond(path):
+        if path in stub_server.failing:
+            return 500, b""
+        return 200, recitation._sample_mp3(30 if "/surah/" in path else 1)
+    stub_server.failing = set()
+    stub_server.respond = respond
+    return stub_server
+
+
+def _cache(tmp_path, server, surah_url=True):
+    reciter = recitation.Reciter("mock", "Mock", server.url + "/surah/{surah:03d}.mp3" if surah_url else None,
+                                 server.url + "/ayah/{surah:03d}{ayah:03d}.mp3")
+    return recitation.AudioCache(str(tmp_path), client=http_client.HttpClient(retries=0),
+                                 reciters={"mock": reciter})
+
+
+def test_retry_fetches_only_the_missing_ayahs(tmp_path, server):
+    cache = _cache(tmp_path, server, surah_url=False)
+    server.failing.add("/ayah/103002.mp3")
+    with pytest.raises(OSError):
+        cache.fetch("mock", 103)
+    assert sorted(os.listdir(cache._path("mock", 103) + ".parts")) == ["001.mp3", "003.mp3"]
+
+    server.failing.clear()
+    server.requests.clear()
+    path = cache.fetch("mock", 103)
+    assert server.paths() == ["/ayah/103002.mp3"]
+    assert [s.ayah for s in cache.segments("mock", 103)] == [1, 2, 3]
+    assert not os.path.exists(path + ".parts")
+
+
+def test_falls_back_to_the_whole_surah(tmp_path, server):
+    cache = _cache(tmp_path, server)
+    server.failing.add("/ayah/103002.mp3")
+    path = cache.fetch("mock", 103)
+    assert server.hits("/surah/103.mp3") == 1
+    assert cache.segments("mock", 103) is None
+    assert round(recitation.mp3_audio(open(path, "rb").read())[1]) == 30
+    assert not os.path.exists(path + ".parts")
+    assert recitation.AudioCache(str(tmp_path)).cached("mock", 103) == path
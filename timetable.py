@@ -0,0 +1,261 @@
+"""
+Batch prayer timetables: many dates for many places in one NumPy pass.
+
+The same solar formulas as prayer_times.compute, evaluated on a
+(places x days) grid with array arithmetic instead of a loop per day, so
+a month for hundreds of cities costs about as much as a handful of
+single-day lookups. Ramadan calendars use the tabular Islamic calendar;
+the actual start can differ by a day with the moon sighting.
+
+    python timetable.py               # cities x days throughput benchmark
+"""
+import csv
+import io
+import math
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import prayer_times
+from prayer_times import ASR_FACTORS, DEFAULT_HIGH_LAT_RULE, DEFAULT_METHOD, HIGH_LAT_RULES, IMSAK_MINUTES, METHODS
+
+TIMING_NAMES = prayer_times.TIMING_NAMES
+ISLAMIC_EPOCH = 1948439.5  # Julian day of 1 Muharram 1 AH
+RAMADAN = 9
+
+
+# --------------- Calendar ---------------
+
+def hijri_to_date(year, month, day):
+    """ Gregorian date of a Hijri date in the tabular Islamic calendar """
+    jd = day + math.ceil(29.5 * (month - 1)) + (year - 1) * 354 + (3 + 11 * year) // 30 + ISLAMIC_EPOCH - 1
+    return date.fromordinal(int(jd - 1721424.5))
+
+
+def date_to_hijri(day):
+    """ (year, month, day) in the tabular Islamic calendar """
+    jd = day.toordinal() + 1721424.5
+    year = (30 * (jd - ISLAMIC_EPOCH) + 10646) // 10631
+    start = hijri_to_date(int(year), 1, 1).toordinal()
+    month = min(12, math.ceil((day.toordinal() - 29 - start) / 29.5) + 1)
+    return int(year), month, day.toordinal() - hijri_to_date(int(year), month, 1).toordinal() + 1
+
+
+def month_dates(year, month):
+    first = date(year, month, 1)
+    return [first + timedelta(days=i) for i in range((date(year + month // 12, month % 12 + 1, 1) - first).days)]
+
+
+def ramadan_dates(hijri_year):
+    start = hijri_to_date(hijri_year, RAMADAN, 1)
+    return [start + timedelta(days=i) for i in range(30)]
+
+
+def next_ramadan_year(today=None):
+    """ Hijri year of the current Ramadan, or the next one if it's over """
+    year, month, _ = date_to_hijri(today or date.today())
+    return year if month <= RAMADAN else year + 1
+
+
+# --------------- Vectorized engine ---------------
+
+def _sun_position(jd):
+    """ (declination in degrees, equation of time in hours) for an array of Julian days """
+    d = jd - 2451545.0
+    g = np.radians(np.mod(357.529 + 0.98560028 * d, 360))
+    q = np.mod(280.459 + 0.98564736 * d, 360)
+    ecliptic_longitude = np.radians(np.mod(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g), 360))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    right_ascension = np.mod(np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude),
+                                                   np.cos(ecliptic_longitude))) / 15, 24)
+    declination = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude)))
+    return declination, q / 15 - right_ascension
+
+
+def _mid_day(jd, t):
+    return np.mod(12 - _sun_position(jd + t)[1], 24)
+
+
+def _sun_angle_time(jd, lat, angle, t, before_noon=False):
+    declination = np.radians(_sun_position(jd + t)[0])
+    lat = np.radians(lat)
+    cos_hour = (-np.sin(np.radians(angle)) - np.sin(declination) * np.sin(lat)) / (np.cos(declination) * np.cos(lat))
+    with np.errstate(invalid="ignore"):
+        hour_angle = np.where(np.abs(cos_hour) <= 1, np.degrees(np.arccos(cos_hour)) / 15, np.nan)
+    noon = _mid_day(jd, t)
+    return noon - hour_angle if before_noon else noon + hour_angle
+
+
+def _asr_time(jd, lat, factor, t):
+    declination = _sun_position(jd + t)[0]
+    angle = -np.degrees(np.arctan(1 / (factor + np.tan(np.radians(np.abs(lat - declination))))))
+    return _sun_angle_time(jd, lat, angle, t)
+
+
+def _adjust_high_lat(value, base, angle, night, rule, before_base):
+    if rule == "AngleBased":
+        portion = angle / 60 * night
+    elif rule == "OneSeventh":
+        portion = night / 7
+    else:
+        portion = night / 2
+    diff = np.mod(base - value if before_base else value - base, 24)
+    with np.errstate(invalid="ignore"):
+        outside = np.isnan(value) | (diff > portion)
+    return np.where(outside, base - portion if before_base else base + portion, value)
+
+
+def utc_offsets(timezones, days):
+    """ (places x days) hours east of UTC; each distinct zone is resolved once per day """
+    offsets = np.empty((len(timezones), len(days)))
+    resolved = {}
+    for i, tz in enumerate(timezones):
+        if tz not in resolved:
+            resolved[tz] = [prayer_times.utc_offset(tz, day) for day in days]
+        offsets[i] = resolved[tz]
+    return offsets
+
+
+def compute(days, latitudes, longitudes, timezones, method=DEFAULT_METHOD, asr="Standard",
+            high_lat=DEFAULT_HIGH_LAT_RULE, elevation=0):
+    """
+    Timings for every place on every day as fractional local hours, shape
+    (places, days, len(TIMING_NAMES)); NaN where a time is undefined.
+    Timezones are IANA names or UTC offsets in hours, one per place.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown calculation method {method!r}; expected one of {sorted(METHODS)}")
+    if asr not in ASR_FACTORS:
+        raise ValueError(f"unknown Asr option {asr!r}; expected one of {sorted(ASR_FACTORS)}")
+    if high_lat not in HIGH_LAT_RULES:
+        raise ValueError(f"unknown high-latitude rule {high_lat!r}; expected one of {HIGH_LAT_RULES}")
+    params = METHODS[method]
+    lat = np.asarray(latitudes, dtype=float)[:, None]
+    lng = np.asarray(longitudes, dtype=float)[:, None]
+    day_jd = np.array([prayer_times.julian_day(d.year, d.month, d.day) for d in days])
+    jd = day_jd[None, :] - lng / (15 * 24)
+    rise_set_angle = 0.833 + 0.0347 * math.sqrt(elevation)
+
+    fajr = _sun_angle_time(jd, lat, params.fajr_angle, 5 / 24, before_noon=True)
+    sunrise = _sun_angle_time(jd, lat, rise_set_angle, 6 / 24, before_noon=True)
+    dhuhr = _mid_day(jd, 12 / 24)
+    asr_time = _asr_time(jd, lat, ASR_FACTORS[asr], 13 / 24)
+    sunset = _sun_angle_time(jd, lat, rise_set_angle, 18 / 24)
+    if params.isha_minutes is None:
+        isha = _sun_angle_time(jd, lat, params.isha_angle, 18 / 24)
+
+    shift = utc_offsets(list(timezones), days) - lng / 15
+    fajr, sunrise, dhuhr, asr_time, sunset = fajr + shift, sunrise + shift, dhuhr + shift, asr_time + shift, sunset + shift
+    night = np.mod(sunrise - sunset, 24)
+    if high_lat != "None":
+        fajr = _adjust_high_lat(fajr, sunrise, params.fajr_angle, night, high_lat, before_base=True)
+    if params.isha_minutes is None:
+        isha = isha + shift
+        if high_lat != "None":
+            isha = _adjust_high_lat(isha, sunset, params.isha_angle, night, high_lat, before_base=False)
+    else:
+        isha = sunset + params.isha_minutes / 60
+
+    return np.stack([fajr - IMSAK_MINUTES / 60, fajr, sunrise, dhuhr, asr_time, sunset, sunset, isha,
+                     sunset + night / 2], axis=-1)
+
+
+def format_times(hours):
+    """ Array of "HH:MM" strings, same rounding as prayer_times.format_time """
+    minutes = np.floor(np.mod(np.nan_to_num(hours, nan=0.0) + 0.5 / 60, 24) * 60).astype(int)
+    text = np.char.add(np.char.add(np.char.zfill((minutes // 60).astype(str), 2), ":"),
+                       np.char.zfill((minutes % 60).astype(str), 2))
+    return np.where(np.isnan(hours), "-----", text)
+
+
+# --------------- Exports ---------------
+
+CALENDAR_COLUMNS = ("Date", "Hijri", "Suhoor ends", "Fajr", "Sunrise", "Dhuhr", "Asr", "Iftar (Maghrib)", "Isha")
+_CALENDAR_TIMES = [TIMING_NAMES.index(name) for name in ("Imsak", "Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha")]
+
+
+def date_columns(days):
+    """ [(date label, Hijri date label)] for the first two calendar columns """
+    columns = []
+    for day in days:
+        hijri_year, hijri_month, hijri_day = date_to_hijri(day)
+        columns.append((day.strftime("%a %d %b %Y"), f"{hijri_day}/{hijri_month}/{hijri_year}"))
+    return columns
+
+
+def calendar_rows(days, times, dates=None):
+    """ Table rows for one place: times is that place's (days, timings) slice """
+    dates = dates or date_columns(days)
+    return [[*labels, *day_times] for labels, day_times in zip(dates, format_times(times[:, _CALENDAR_TIMES]).tolist())]
+
+
+def to_csv(places, days, times):
+    """ One CSV for many places: a Place column followed by the calendar columns """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(("Place",) + CALENDAR_COLUMNS)
+    dates = date_columns(days)
+    for place, place_times in zip(places, times):
+        writer.writerows([place, *row] for row in calendar_rows(days, place_times, dates))
+    return out.getvalue().encode("utf-8")
+
+
+def pdf_report_for(title, places, days, times):
+    """ A pdf_report.Report with a page-aligned calendar table per place """
+    from reportlab.lib.pagesizes import A4, landscape
+
+    import pdf_report
+
+    dates = date_columns(days)
+    sections = [pdf_report.Section(place, CALENDAR_COLUMNS, calendar_rows(days, place_times, dates),
+                                   highlight=(2, 7), new_page=True)
+                for place, place_times in zip(places, times)]
+    return pdf_report.Report(title, sections, pagesize=landscape(A4))
+
+
+def calendar_report(title, places, days, method=DEFAULT_METHOD, asr="Standard"):
+    """
+    pdf_report builder for a "pdf-report" job: places is [(label, latitude,
+    longitude, timezone)] and days ISO dates, so the job carries only these
+    and the timings and rows are worked out in the worker.
+    """
+    days = [date.fromisoformat(day) for day in days]
+    labels, latitudes, longitudes, timezones = zip(*places)
+    times = compute(days, latitudes, longitudes, timezones, method=method, asr=asr)
+    return pdf_report_for(title, labels, days, times)
+
+
+# --------------- Benchmark ---------------
+
+def bench(n_places=500, n_days=30):
+    rng = np.random.default_rng(1)
+    latitudes = rng.uniform(-50, 60, n_places)
+    longitudes = rng.uniform(-180, 180, n_places)
+    zones = [round(lng / 15) for lng in longitudes]  # offsets in hours: no zone database in the loop
+    days = ramadan_dates(next_ramadan_year(date(2026, 1, 1)))[:n_days]
+
+    started = time.perf_counter()
+    grid = compute(days, latitudes, longitudes, zones)
+    vectorized = time.perf_counter() - started
+
+    sample = min(n_places, 20)
+    started = time.perf_counter()
+    for i in range(sample):
+        for day in days:
+            prayer_times.compute(day, latitudes[i], longitudes[i], zones[i])
+    per_day_loop = (time.perf_counter() - started) * n_places / sample
+
+    check = prayer_times.compute(days[-1], latitudes[0], longitudes[0], zones[0])
+    worst = max(abs(grid[0, -1, i] - check[name]) * 3600 for i, name in enumerate(TIMING_NAMES))
+    cells = n_places * n_days
+    print(f"{n_places} places x {n_days} days = {cells} place-days")
+    print(f"  vectorized:   {vectorized * 1000:8.1f} ms  ({cells / vectorized:,.0f} place-days/s)")
+    print(f"  per-day loop: {per_day_loop * 1000:8.1f} ms  ({cells / per_day_loop:,.0f} place-days/s, "
+          f"extrapolated from {sample} places)")
+    print(f"  largest difference from prayer_times.compute: {worst:.2g} s")
+
+
+if __name__ == "__main__":
+    bench(*(int(arg) for arg in sys.argv[1:3]))
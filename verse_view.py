@@ -0,0 +1,122 @@
+"""
+HTML for the Quran verse viewer.
+
+Verses are rendered one page at a time into a single HTML string, styled by
+one shared stylesheet instead of an inline style block per ayah. Keeping
+this free of Streamlit calls lets app.py cache the rendered pages and lets
+`python verse_view.py` measure them.
+"""
+import html
+import sys
+import time
+
+PAGE_SIZES = [10, 20, 50]
+DEFAULT_PAGE_SIZE = 20
+RTL = " dir='rtl'"
+
+VERSE_CSS = """
+<style>
+    .verse-card { background-color: #f8f9fa; padding: 15px; border-radius: 10px; margin-bottom: 15px; }
+    .verse-card .verse-number { font-weight: bold; margin-bottom: 5px; color: #0066cc; }
+    .verse-card .verse-arabic { font-size: 24px; margin-bottom: 10px; color: black; }
+    .verse-card .verse-english { font-size: 16px; margin-top: 10px; color: #333; }
+    .verse-card .verse-english[dir='rtl'] { font-size: 20px; }
+    .verse-card .verse-edition { font-size: 12px; color: #888; margin-bottom: 2px; }
+    .verse-card.dark { background-color: #333; }
+    .verse-card.dark .verse-number { color: #FFD700; }
+    .verse-card.dark .verse-arabic { color: white; }
+    .verse-card.dark .verse-english { color: #E5E5E5; }
+</style>
+"""
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_bounds(total, page, page_size):
+    """ Clamps page into range and returns (page, start, end) as list indexes """
+    page = min(max(1, page), page_count(total, page_size))
+    start = (page - 1) * page_size
+    return page, start, min(start + page_size, total)
+
+
+def render_verse(label, arabic, translations, dark_mode=False):
+    """ translations: [(edition name, text, rtl)]; names are shown once there is more than one """
+    named = len(translations) > 1
+    return (
+        f"<div class='verse-card{' dark' if dark_mode else ''}'>"
+        f"<p class='verse-number'>{html.escape(label)}</p>"
+        f"<div dir='rtl' class='verse-arabic'>{html.escape(arabic)}</div>"
+        + "".join(
+            f"<div class='verse-english'{RTL if rtl else ''}>"
+            + (f"<div class='verse-edition'>{html.escape(name)}</div>" if named else "")
+            + f"{html.escape(text)}</div>"
+            for name, text, rtl in translations
+        )
+        + "</div>"
+    )
+
+
+def render_verses(arabic, translations, start, end, dark_mode=False):
+    """
+    One HTML string for ayahs start..end-1 (0-based) so a page is a single
+    markdown element. arabic is a sequence of ayah texts indexed by ayah
+    number - 1, translations a list of (edition name, texts, rtl) aligned the same way.
+    """
+    return "".join(
+        render_verse(f"Verse {i + 1}", arabic[i], [(name, texts[i], rtl) for name, texts, rtl in translations],
+                     dark_mode)
+        for i in range(start, min(end, len(arabic)))
+    )
+
+
+# ---- benchmark: old per-ayah inline markup vs paged shared-class markup ----
+def _legacy_verse(verse, eng_verse, dark_mode):
+    # The per-verse block quran_section used to emit, one st.markdown call each
+    return f"""
+                <div style='background-color: {"#333" if dark_mode else "#f8f9fa"};
+                           padding: 15px;
+                           border-radius: 10px;
+                           margin-bottom: 15px;'>
+                    <p style='font-weight: bold; margin-bottom: 5px; color: {"#FFD700" if dark_mode else "#0066cc"};'>
+                        Verse {verse['numberInSurah']}
+                    </p>
+                    <div dir='rtl' style='font-size: 24px; margin-bottom: 10px; color: {"white" if dark_mode else "black"};'>
+                        {verse['text']}  <!-- عربی متن -->
+                    </div>
+                    <div style='font-size: 16px; margin-top: 10px; color: {"#E5E5E5" if dark_mode else "#333"};'>
+                        {eng_verse['text']}  <!-- انگریزی ترجمہ -->
+                    </div>
+                </div>
+                """
+
+
+def bench(ayah_count=286, page_size=DEFAULT_PAGE_SIZE, rounds=200):
+    # Al-Baqarah sized surah with typical ayah lengths
+    arabic = [{"numberInSurah": i, "text": "بِسْمِ اللَّهِ الرَّحْمَٰنِ الرَّحِيمِ " * 6} for i in range(1, ayah_count + 1)]
+    english = [{"numberInSurah": i, "text": "In the name of God, the Most Gracious, the Dispenser of Grace. " * 4}
+               for i in range(1, ayah_count + 1)]
+    translations = [("Muhammad Asad", [eng["text"] for eng in english], False)]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        legacy = [_legacy_verse(v, e, True) for v, e in zip(arabic, english)]
+    legacy_ms = (time.perf_counter() - started) * 1000 / rounds
+    legacy_bytes = sum(len(block.encode("utf-8")) for block in legacy)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        paged = render_verses([verse["text"] for verse in arabic], translations, 0, page_size, True)
+    paged_ms = (time.perf_counter() - started) * 1000 / rounds
+    paged_bytes = len(paged.encode("utf-8")) + len(VERSE_CSS.encode("utf-8"))
+
+    print(f"{ayah_count} ayahs, page size {page_size}")
+    print(f"before: {len(legacy)} markdown elements, {legacy_bytes / 1024:.1f} KiB, {legacy_ms:.2f} ms to build")
+    print(f"after:  2 markdown elements, {paged_bytes / 1024:.1f} KiB, {paged_ms:.2f} ms to build "
+          f"(0 ms when the page is served from cache)")
+
+
+if __name__ == "__main__":
+    bench()
+    sys.exit(0)